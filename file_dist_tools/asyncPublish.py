@@ -0,0 +1,284 @@
+#=============================================================================
+# asyncio publishing engine
+#   - AsyncTokenProvider: awaitable access token on top of rdpToken
+#   - AsyncHttpClient: aiohttp session with a connection limit
+#   - publish_chunks_async: semaphore-bounded fan-out of bulk-publish calls,
+#     one event loop keeps hundreds of publishes in flight without a thread per request
+#   - BlockingIO: journal, publish cache, result file and manifest reads on their
+#     own threads, the event loop only waits for their results
+# Results are printed and reported the same way as the synchronous publish_file
+#=============================================================================
+import asyncio
+import time
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+import rdpToken
+import rateLimiter
+import circuitBreaker
+import publishMetrics
+import publishJournal
+from loggingFileDist import get_app_logger, get_error_logger
+from exceptions import *
+from publishFile import (PublishReport, create_payload, split_chunks, iter_files, update_report, get_retry_config,
+                         get_publish_url, get_publish_headers, handle_publish_response, create_payload_header,
+                         create_file_entry_key, record_response_metrics, chunk_trace_args, encode_body)
+
+app_logger = get_app_logger("app_info")
+error_logger = get_error_logger("app_error")
+
+
+# -----------------------------------------------------------
+# Awaitable access token, refresh runs on a worker thread
+# -----------------------------------------------------------
+class AsyncTokenProvider:
+    def __init__(self):
+        self._lock = asyncio.Lock()
+
+    async def get_token(self):
+        # fast path: valid token in memory, no await
+        tknObject = rdpToken._tokenCache
+        if rdpToken._isTokenValid(tknObject):
+            return tknObject["access_token"]
+
+        # only one coroutine waits for the refresh, the others wait for this lock
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, rdpToken.getToken)
+
+    async def renew_rejected_token(self, access_token):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, rdpToken.renewRejectedToken, access_token)
+
+
+# -----------------------------------------------------------
+# HTTP client with a limited number of connections
+# -----------------------------------------------------------
+class AsyncHttpClient:
+    def __init__(self, connection_limit):
+        if aiohttp is None:
+            raise ImportError("asyncio engine requires aiohttp, please run: python -m pip install aiohttp")
+        self.connection_limit = connection_limit
+        self._session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.connection_limit)
+        self._session = aiohttp.ClientSession(connector=connector)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self._session.close()
+
+    async def post_json(self, url, body, headers):
+        async with self._session.post(url, data=body, headers=headers) as response:
+            return response.status, await response.text(), response.headers
+
+
+# -----------------------------------------------------------
+# Disk and SQLite calls of the engine, run on their own threads
+#   a slow journal, publish cache, result file or manifest read would otherwise
+#   stall every coroutine of the event loop
+# -----------------------------------------------------------
+class BlockingIO:
+    def __init__(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        # one writer thread keeps the journal updates of a chunk in order
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="AsyncPublishWriter")
+        # manifest, local file digests and skip checks of journal and publish cache
+        self._reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="AsyncPublishReader")
+
+    async def write(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._writer, function, *args)
+
+    async def read(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._reader, function, *args)
+
+    def close(self):
+        self._reader.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+
+
+# -----------------------------------------------------------
+# Make a request to publish file, retry on CFSServerException
+# -----------------------------------------------------------
+async def publish_file_async(client, token_provider, payload, outcome=None):
+    start_time = time.perf_counter()
+    try:
+        json_response = await _publish_file_async(client, token_provider, payload, outcome)
+    except Exception:
+        publishMetrics.inc("publish_failures_total")
+        raise
+    finally:
+        publishMetrics.record_phase("publish_file", start_time, time.perf_counter())
+    publishMetrics.inc("publish_success_total")
+    publishMetrics.inc("published_files_total", len(payload.files))
+    return json_response
+
+
+async def _publish_file_async(client, token_provider, payload, outcome=None):
+    retry_limit, delay, retry_backoff = get_retry_config()
+    # large chunks take milliseconds to encode, the event loop keeps serving other requests
+    body = await asyncio.get_running_loop().run_in_executor(None, encode_body, payload)
+    retry_budget = circuitBreaker.get_retry_budget()
+    if retry_budget is not None:
+        retry_budget.on_request()
+    for attempt in range(1, retry_limit + 1):
+        if outcome is not None:
+            outcome["attempts"] = attempt
+        try:
+            app_logger.info("Publishing file . . .")
+            access_token = await token_provider.get_token()
+            rate_limiter = rateLimiter.get_rate_limiter()
+            circuit_breaker = circuitBreaker.get_circuit_breaker()
+            if circuit_breaker is not None:
+                with publishMetrics.timer("circuit_breaker_wait"):
+                    await circuit_breaker.acquire_async()
+            with publishMetrics.timer("rate_limit_wait"):
+                await rate_limiter.acquire_async()
+            with publishMetrics.timer("http_request"):
+                try:
+                    status_code, response_text, headers = await client.post_json(get_publish_url(), body,
+                                                                                 get_publish_headers(access_token))
+                    if status_code == 401:
+                        # token revoked or expired early, sent once more with a renewed token
+                        access_token = await token_provider.renew_rejected_token(access_token)
+                        status_code, response_text, headers = await client.post_json(
+                            get_publish_url(), body, get_publish_headers(access_token))
+                except Exception:
+                    if circuit_breaker is not None:
+                        circuit_breaker.on_response(None)
+                    raise
+            record_response_metrics(status_code, len(body))
+            if outcome is not None:
+                outcome["status_code"] = status_code
+            rate_limiter.on_response(status_code, headers)
+            if circuit_breaker is not None:
+                circuit_breaker.on_response(status_code)
+            try:
+                return handle_publish_response(status_code, response_text, payload, body)
+            except CFSServerException as err:
+                err.throttled = circuitBreaker.is_throttled(status_code, headers)
+                raise
+        except CFSServerException as err:
+            if attempt == retry_limit:
+                raise
+            if retry_budget is not None and not err.throttled and not retry_budget.try_retry():
+                raise RetryBudgetExhaustedException(err) from err
+            publishMetrics.inc("publish_retries_total")
+            app_logger.warning("{}, retrying in {} seconds...".format(str(err).splitlines()[0], delay))
+            with publishMetrics.timer("retry_sleep"):
+                await asyncio.sleep(delay)
+            delay *= retry_backoff
+
+
+async def publish_chunk_async(client, token_provider, blocking_io, chunk_id, user_request, files, journal_run=None,
+                              publish_cache=None, result_sink=None):
+    chunk_request = dict(user_request)
+    chunk_request["files"] = files
+    result = {
+        "chunk": chunk_id,
+        "files": len(files),
+        "status": "success",
+        "duration": 0.0,
+        "error": "",
+        "status_code": None,
+        "attempts": 0
+    }
+    json_response = None
+
+    start_time = time.perf_counter()
+    try:
+        app_logger.info("Publishing chunk {} ({} files) . . .".format(chunk_id, len(files)))
+        if journal_run is not None:
+            await blocking_io.write(journal_run.update_chunk, chunk_id, publishJournal.IN_FLIGHT)
+        json_response = await publish_file_async(client, token_provider, create_payload(chunk_request), result)
+        if journal_run is not None:
+            await blocking_io.write(journal_run.update_chunk, chunk_id, publishJournal.PUBLISHED, json_response)
+        if publish_cache is not None:
+            await blocking_io.write(_mark_published, publish_cache, user_request, files)
+    except Exception as err:
+        error_logger.error(err, exc_info=True)
+        result["status"] = "failed"
+        result["error"] = "{}: {}".format(type(err).__name__, str(err).splitlines()[0])
+        if journal_run is not None:
+            await blocking_io.write(journal_run.update_chunk, chunk_id, publishJournal.FAILED,
+                                    getattr(err, "result", None) or result["error"])
+    end_time = time.perf_counter()
+    result["duration"] = end_time - start_time
+    publishMetrics.record_phase("publish_chunk", start_time, end_time, chunk_trace_args(result, files))
+    if result_sink is not None:
+        await blocking_io.write(result_sink.add_chunk, user_request["filesetname"], result, files, json_response)
+    return result
+
+
+def _mark_published(publish_cache, user_request, files):
+    payload_header = create_payload_header(user_request)
+    publish_cache.mark_published([create_file_entry_key(payload_header, file_input) for file_input in files])
+
+
+# -----------------------------------------------------------
+# Publish files in chunks, at most max_concurrency requests in flight
+# -----------------------------------------------------------
+async def publish_chunks_async(user_request, chunk_size, max_concurrency, journal_run=None, publish_cache=None,
+                               result_sink=None):
+    token_provider = AsyncTokenProvider()
+    # fetch the token once before the fan-out
+    await token_provider.get_token()
+
+    report = PublishReport()
+    app_logger.info("Chunk report {:<8} {:<8} {:<10} {:<10} {}".format("chunk", "files", "status", "duration", "error"))
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tasks = set()
+    # every running chunk takes a free slot, used as timeline lane of its phases
+    free_slots = list(range(max_concurrency, 0, -1))
+
+    async def run_chunk(chunk_id, files):
+        slot = free_slots.pop()
+        publishMetrics.current_lane.set("chunk slot {}".format(slot))
+        try:
+            report.add(await publish_chunk_async(client, token_provider, blocking_io, chunk_id, user_request, files,
+                                                 journal_run, publish_cache, result_sink))
+        finally:
+            free_slots.append(slot)
+            semaphore.release()
+
+    blocking_io = BlockingIO()
+    try:
+        async with AsyncHttpClient(max_concurrency) as client:
+            try:
+                # chunks are read only when a slot is free, so files can be a generator
+                chunks = split_chunks(iter_files(user_request, journal_run, publish_cache, result_sink),
+                                     chunk_size)
+                chunk_id = 0
+                while True:
+                    await semaphore.acquire()
+                    files = await blocking_io.read(next, chunks, None)
+                    if files is None:
+                        semaphore.release()
+                        break
+                    chunk_id += 1
+                    if journal_run is not None:
+                        await blocking_io.write(journal_run.add_chunk, chunk_id, files)
+                    task = asyncio.ensure_future(run_chunk(chunk_id, files))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            finally:
+                # let chunks in flight finish, also when reading the manifest failed
+                if len(tasks) > 0:
+                    await asyncio.gather(*tasks)
+    finally:
+        blocking_io.close()
+        update_report(report, journal_run, publish_cache)
+        report.print_report()
+    return report
+
+
+def run_publish_chunks(user_request, chunk_size, max_concurrency, journal_run=None, publish_cache=None,
+                       result_sink=None):
+    return asyncio.run(publish_chunks_async(user_request, chunk_size, max_concurrency, journal_run, publish_cache,
+                                            result_sink))
@@ -0,0 +1,285 @@
+#=============================================================================
+# End-to-end benchmark suite against the local mock server
+#   - token: rdpToken.getToken called from concurrent threads
+#   - publish: publishFile.publish_file called from concurrent threads
+#   - pipeline: publishFile.read_args with a manifest, one child process per
+#     manifest size, concurrency, engine and number of --workers, so peak RSS
+#     is measured per run
+# Throughput, p50/p95/p99 latency and peak RSS are reported, --save writes the
+# results and --baseline fails (exit code 1) on a throughput regression
+#   cd file_dist_tools
+#   python -m benchmarks.e2e --sizes 1000,10000 --concurrency 4,16 --latency 0.02
+#=============================================================================
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(sorted_values, percent):
+    if len(sorted_values) == 0:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percent / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def summarize(scenario, engine, items, concurrency, elapsed, durations, rss_mb, failed=0):
+    durations = sorted(durations)
+    return {
+        "scenario": scenario,
+        "engine": engine,
+        "items": items,
+        "concurrency": concurrency,
+        "throughput": items / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(durations, 50) * 1000,
+        "p95_ms": percentile(durations, 95) * 1000,
+        "p99_ms": percentile(durations, 99) * 1000,
+        "rss_mb": rss_mb,
+        "failed": failed
+    }
+
+
+# -----------------------------------------------------------
+# Working directory with global.ini pointing at the benchmark settings
+# -----------------------------------------------------------
+def create_work_dir(rate):
+    import configparser
+
+    work_dir = tempfile.mkdtemp(prefix="file_dist_e2e_")
+    config = configparser.ConfigParser()
+    config.optionxform = str
+    config.read(os.path.join(TOOLS_DIR, "global.ini"))
+    # every run publishes the same manifests, measure publishing instead of cache hits
+    config["CACHE_CONFIG"]["ENABLED"] = "false"
+    # the client-side rate limit would cap throughput at RATE requests per second
+    config["RATE_LIMIT_CONFIG"]["RATE"] = str(rate)
+    config["RATE_LIMIT_CONFIG"]["MAX_RATE"] = str(rate)
+    with open(os.path.join(work_dir, "global.ini"), "w") as gf:
+        config.write(gf)
+    return work_dir
+
+
+def write_manifest(manifest_file, rows):
+    with open(manifest_file, "w") as mf:
+        mf.write("FileName,S3Url,FileSizeInBytes\n")
+        for i in range(rows):
+            mf.write("file_{0}.csv,https://bucket.s3.amazonaws.com/prefix/file_{0}.csv,{1}\n".format(i, i * 7))
+
+
+def run_threads(function, calls, concurrency):
+    from concurrent.futures import ThreadPoolExecutor
+
+    def timed_call(call_id):
+        start_time = time.perf_counter()
+        function(call_id)
+        return time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        durations = list(executor.map(timed_call, range(calls)))
+    return time.perf_counter() - start_time, durations
+
+
+# -----------------------------------------------------------
+# In-process scenarios, run from the working directory
+# -----------------------------------------------------------
+def bench_token(calls, concurrency):
+    import rdpToken
+
+    rdpToken.invalidateToken()
+    rdpToken.tokenStore.remove()
+    elapsed, durations = run_threads(lambda _: rdpToken.getToken(), calls, concurrency)
+    return summarize("getToken", "thread", calls, concurrency, elapsed, durations, peak_rss_mb())
+
+
+def bench_publish(calls, concurrency, files_per_call):
+    import publishFile
+    from fileEntry import FileEntry
+
+    payload = publishFile.create_payload({
+        "filesetname": "benchmark",
+        "bucketname": "benchmark-bucket",
+        "packageid": "benchmark-package",
+        "files": [FileEntry(filename="file_{}.csv".format(i),
+                            s3url="https://bucket.s3.amazonaws.com/file_{}.csv".format(i))
+                  for i in range(files_per_call)]
+    })
+    elapsed, durations = run_threads(lambda _: publishFile.publish_file(payload), calls, concurrency)
+    return summarize("publish_file", "thread", calls * files_per_call, concurrency, elapsed, durations,
+                     peak_rss_mb())
+
+
+def bench_pipeline(url, manifest_file, rows, concurrency, engine, work_dir, workers=1):
+    result_file = os.path.join(work_dir, "pipeline_result.json")
+    command = [sys.executable, "-m", "benchmarks.e2e", "--child", "--url", url, "--manifest", manifest_file,
+               "--concurrency", str(concurrency), "--engine", engine, "--workers", str(workers),
+               "--result", result_file]
+    environment = dict(os.environ, PYTHONPATH=TOOLS_DIR)
+    subprocess.run(command, cwd=work_dir, env=environment, stdout=subprocess.DEVNULL, check=True)
+    with open(result_file) as rf:
+        child_result = json.load(rf)
+    scenario = "read_args {} files".format(rows) if workers <= 1 else "read_args {} files w{}".format(rows, workers)
+    return summarize(scenario, engine, rows, concurrency, child_result["elapsed"], child_result["durations"],
+                     child_result["rss_mb"], child_result["failed"])
+
+
+# -----------------------------------------------------------
+# Child process running the full CLI pipeline on one manifest
+# -----------------------------------------------------------
+def run_child(args):
+    import rdpToken
+    import publishFile
+    import loggingFileDist
+
+    durations = []
+    failed_chunks = []
+    report_add = publishFile.PublishReport.add
+
+    def add(report, result):
+        durations.append(result["duration"])
+        if result["status"] != "success":
+            failed_chunks.append(result["chunk"])
+        report_add(report, result)
+
+    publishFile.PublishReport.add = add
+    rdpToken.base_URL = args.url
+    cli_args = argparse.Namespace(config=None, manifest=args.manifest, filesetname="benchmark", filename=None,
+                                  s3url=None, rolearn=None, attributes=None, contentfrom=None, contentto=None,
+                                  availablefrom=None, availableto=None, description=None, filesizeinbytes=None,
+                                  maxconcurrency=str(args.concurrency), asyncio=args.engine == "asyncio",
+                                  journal=None, resume=False, forcerepublish=False, daemon=False, spool=None,
+                                  profile=None, localdir=None, workers=str(args.workers), results=None,
+                                  metrics=None)
+    start_time = time.perf_counter()
+    publishFile.read_args(cli_args)
+    elapsed = time.perf_counter() - start_time
+    loggingFileDist.shutdown_logging()
+
+    with open(args.result, "w") as rf:
+        json.dump({"elapsed": elapsed, "durations": durations, "failed": len(failed_chunks),
+                   "rss_mb": peak_rss_mb()}, rf)
+
+
+def print_results(results):
+    header = "{:<28} {:>8} {:>8} {:>5} {:>10} {:>9} {:>9} {:>9} {:>8} {:>7}"
+    row = "{:<28} {:>8} {:>8} {:>5} {:>10.1f} {:>9.2f} {:>9.2f} {:>9.2f} {:>8.1f} {:>7}"
+    print(header.format("scenario", "engine", "items", "conc", "items/s", "p50 ms", "p95 ms", "p99 ms", "RSS MB",
+                        "failed"))
+    for result in results:
+        print(row.format(result["scenario"], result["engine"], result["items"], result["concurrency"],
+                         result["throughput"], result["p50_ms"], result["p95_ms"], result["p99_ms"],
+                         result["rss_mb"], result["failed"]))
+
+
+def compare_baseline(results, baseline_file, tolerance):
+    with open(baseline_file) as bf:
+        baseline = {(result["scenario"], result["engine"], result["concurrency"]): result for result in json.load(bf)}
+
+    regressions = []
+    for result in results:
+        previous = baseline.get((result["scenario"], result["engine"], result["concurrency"]))
+        if previous is not None and result["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append("{} {} concurrency {}: {:.1f} items/s, baseline {:.1f} items/s".format(
+                result["scenario"], result["engine"], result["concurrency"], result["throughput"],
+                previous["throughput"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark suite against the local mock server")
+    parser.add_argument("--sizes", default="1000,10000", help="comma separated manifest sizes of pipeline runs")
+    parser.add_argument("--concurrency", default="4,16", help="comma separated concurrency levels")
+    parser.add_argument("--engines", default="thread", help="comma separated engines: thread, asyncio")
+    parser.add_argument("--workers", default="1", help="comma separated numbers of worker processes (--workers)")
+    parser.add_argument("--calls", type=int, default=200, help="number of getToken and publish_file calls")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every server response")
+    parser.add_argument("--error-rate-429", type=float, default=0.0, help="share of publish requests answered 429")
+    parser.add_argument("--error-rate-5xx", type=float, default=0.0, help="share of publish requests answered 503")
+    parser.add_argument("--token-expires-in", type=int, default=300,
+                        help="token lifetime in seconds, should be above 10 (tokens are renewed 10 seconds early)")
+    parser.add_argument("--rate", type=float, default=10000, help="client-side RATE and MAX_RATE of the runs")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare throughput with results saved by --save")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed throughput drop against baseline")
+    # child process options
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    parser.add_argument("--manifest", help=argparse.SUPPRESS)
+    parser.add_argument("--engine", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.concurrency = int(args.concurrency)
+        args.workers = int(args.workers)
+        return run_child(args)
+
+    from benchmarks.mock_server import start_server, server_url
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    concurrency_levels = [int(concurrency) for concurrency in args.concurrency.split(",")]
+    engines = args.engines.split(",")
+    worker_counts = [int(workers) for workers in args.workers.split(",")]
+
+    server = start_server(latency=args.latency, error_rate_429=args.error_rate_429,
+                          error_rate_5xx=args.error_rate_5xx, token_expires_in=args.token_expires_in,
+                          verify_token=True, seed=1)
+    url = server_url(server)
+    work_dir = create_work_dir(args.rate)
+    current_dir = os.getcwd()
+    results = []
+    try:
+        # configuration, token and log files are read relative to the working directory
+        os.chdir(work_dir)
+        import rdpToken
+        import publishFile
+        import logging
+
+        rdpToken.base_URL = url
+        publishFile.app_logger.setLevel(logging.WARNING)
+        for concurrency in concurrency_levels:
+            results.append(bench_token(args.calls, concurrency))
+            results.append(bench_publish(args.calls, concurrency, publishFile.get_publish_config()[0]))
+
+        for rows in sizes:
+            manifest_file = os.path.join(work_dir, "manifest_{}.csv".format(rows))
+            write_manifest(manifest_file, rows)
+            for engine in engines:
+                for concurrency in concurrency_levels:
+                    for workers in worker_counts:
+                        results.append(bench_pipeline(url, manifest_file, rows, concurrency, engine, work_dir,
+                                                      workers))
+    finally:
+        os.chdir(current_dir)
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_results(results)
+    print("server: {}".format(", ".join("{}={}".format(key, value) for key, value in sorted(server.stats.items()))))
+
+    if args.save:
+        with open(args.save, "w") as sf:
+            json.dump(results, sf, indent=2)
+    if args.baseline:
+        regressions = compare_baseline(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print("REGRESSION: " + regression)
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#=============================================================================
+# Benchmark requests per second of bulk-publish calls with and without pooling
+#   cd file_dist_tools
+#   python -m benchmarks.http_pool --requests 1000 --concurrency 4 --handshake-latency 0.02
+#=============================================================================
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import httpSession
+from benchmarks.mock_server import start_server, server_url, PUBLISH_PATH
+
+PAYLOAD = {
+    "filesetName": "benchmark",
+    "bucketName": "benchmark-bucket",
+    "packageId": "benchmark-package",
+    "files": [{
+        "fileType": "file",
+        "storageLocation": {"url": "https://s3.amazonaws.com/bucket/file.json", "@type": "s3"},
+        "filename": "file.json"
+    }]
+}
+
+
+def run(post, url, total_requests, concurrency):
+    def send(_):
+        response = post(url, json=PAYLOAD, headers={"Content-Type": "application/json"})
+        response.raise_for_status()
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, range(total_requests)))
+    return total_requests / (time.perf_counter() - start_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP connection pooling benchmark")
+    parser.add_argument("--requests", type=int, default=1000, help="number of requests per run")
+    parser.add_argument("--concurrency", type=int, default=4, help="number of concurrent requests")
+    parser.add_argument("--handshake-latency", type=float, default=0.02,
+                        help="seconds added to every new connection to emulate TLS handshake to a remote API")
+    args = parser.parse_args()
+
+    server = start_server(handshake_latency=args.handshake_latency)
+    url = server_url(server) + PUBLISH_PATH
+    try:
+        # one connection per request, like module-level requests.post
+        without_pool = run(requests.post, url, args.requests, args.concurrency)
+
+        session = httpSession.create_session(pool_size=args.concurrency)
+        with_pool = run(session.post, url, args.requests, args.concurrency)
+        session.close()
+    finally:
+        server.shutdown()
+
+    print("{:<20} {:>12}".format("mode", "requests/s"))
+    print("{:<20} {:>12.1f}".format("requests.post", without_pool))
+    print("{:<20} {:>12.1f}".format("pooled session", with_pool))
+    print("{:<20} {:>11.2f}x".format("speedup", with_pool / without_pool))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#=============================================================================
+# Local stand-in for the RDP token and File Distribution bulk-publish endpoints
+# Used by the benchmarks, so the tools can be measured without api.refinitiv.com
+#   - latency added to every request, handshake latency to every new connection
+#   - 429 (with Retry-After) and 503 responses injected at a given rate
+#   - access tokens expire after token_expires_in seconds, expired tokens get 401
+#=============================================================================
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+
+TOKEN_PATH = "/auth/oauth2/v1/token"
+PUBLISH_PATH = "/file-store/v1/bulk-publish"
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    # keep connections open between requests like the real API
+    protocol_version = "HTTP/1.1"
+    # send headers and body in one segment, avoid delayed ACK stalls on reused connections
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def setup(self):
+        super().setup()
+        self.server.count("connections")
+        # emulate TCP/TLS handshake round trips of a new connection
+        if self.server.handshake_latency > 0:
+            time.sleep(self.server.handshake_latency)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status_code, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.server.latency > 0:
+            time.sleep(self.server.latency)
+        if self.path == TOKEN_PATH:
+            self._handle_token(parse_qs(body.decode("utf-8")))
+        elif self.path == PUBLISH_PATH:
+            self._handle_publish(body)
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def _handle_token(self, form):
+        server = self.server
+        server.count("token_requests")
+        grant_type = form.get("grant_type", [""])[0]
+        if grant_type == "refresh_token" and not server.is_refresh_token(form.get("refresh_token", [""])[0]):
+            return self._send_json(400, {"error": "invalid_grant"})
+        access_token, refresh_token = server.issue_token()
+        self._send_json(200, {
+            "access_token": access_token,
+            "refresh_token": refresh_token,
+            "expires_in": str(server.token_expires_in)
+        })
+
+    def _handle_publish(self, body):
+        server = self.server
+        server.count("publish_requests")
+        authorization = self.headers.get("Authorization", "")
+        if server.verify_token and not server.is_access_token(authorization[len("Bearer "):]):
+            server.count("rejected_tokens")
+            return self._send_json(401, {"error": {"message": "Invalid or expired token"}})
+
+        injected_error = server.inject_error()
+        if injected_error == 429:
+            server.count("injected_429")
+            return self._send_json(429, {"error": {"message": "Too many requests"}},
+                                   {"Retry-After": str(server.retry_after)})
+        if injected_error == 503:
+            server.count("injected_5xx")
+            return self._send_json(503, {"error": {"message": "Service unavailable"}})
+
+        payload = json.loads(body)
+        server.count("published_files", len(payload["files"]))
+        self._send_json(201, {
+            "filesetId": "mock-fileset-id",
+            "files": ["mock-file-id-{}".format(idx) for idx in range(len(payload["files"]))]
+        })
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, server_address, handshake_latency=0.0, latency=0.0, error_rate_429=0.0, error_rate_5xx=0.0,
+                 retry_after=1, token_expires_in=300, verify_token=False, seed=None):
+        super().__init__(server_address, MockRequestHandler)
+        self.handshake_latency = handshake_latency
+        self.latency = latency
+        self.error_rate_429 = error_rate_429
+        self.error_rate_5xx = error_rate_5xx
+        self.retry_after = retry_after
+        self.token_expires_in = token_expires_in
+        self.verify_token = verify_token
+        self.stats = {}
+        self._tokens = {}
+        self._refresh_tokens = set()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.stats[name] = self.stats.get(name, 0) + value
+
+    def issue_token(self):
+        with self._lock:
+            token_id = len(self._tokens) + 1
+            access_token = "mock-access-token-{}".format(token_id)
+            refresh_token = "mock-refresh-token-{}".format(token_id)
+            self._tokens[access_token] = time.time() + self.token_expires_in
+            self._refresh_tokens.add(refresh_token)
+        return access_token, refresh_token
+
+    def is_access_token(self, access_token):
+        with self._lock:
+            return self._tokens.get(access_token, 0) > time.time()
+
+    def is_refresh_token(self, refresh_token):
+        with self._lock:
+            return refresh_token in self._refresh_tokens
+
+    def inject_error(self):
+        with self._lock:
+            value = self._random.random()
+        if value < self.error_rate_429:
+            return 429
+        if value < self.error_rate_429 + self.error_rate_5xx:
+            return 503
+        return None
+
+
+# -----------------------------------------------------------
+# Start mock server on a background thread
+# -----------------------------------------------------------
+def start_server(host="127.0.0.1", port=0, **options):
+    server = MockServer((host, port), **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def server_url(server):
+    host, port = server.server_address[:2]
+    return "http://{}:{}".format(host, port)
@@ -0,0 +1,170 @@
+#=============================================================================
+# Benchmark memory and time of file entries and bulk-publish payloads
+#   - legacy: one dict per manifest row, payload files built with deepcopy of a
+#     template dict and encoded with json.dumps, as before fileEntry
+#   - model: FileEntry per row, FilesetRequest written directly as JSON
+#   - orjson: FileEntry per row, FilesetRequest encoded with orjson when installed
+#   cd file_dist_tools
+#   python -m benchmarks.payload_build --files 100000 --chunk-size 10
+#=============================================================================
+import argparse
+import copy
+import gc
+import json
+import time
+import tracemalloc
+
+from fileEntry import FileEntry, FilesetRequest, get_encoder
+
+COLUMN_LIST = ["filename", "s3url", "rolearn", "description", "filesizeinbytes"]
+USER_REQUEST = {
+    "filesetname": "benchmark",
+    "bucketname": "benchmark-bucket",
+    "packageid": "benchmark-package",
+    "availablefrom": "2022-03-21T11:47:11Z",
+    "attributes": [{"name": "source", "value": "benchmark"}]
+}
+LEGACY_FILE_PAYLOAD = {
+    "fileType": "file",
+    "storageLocation": {
+        "url": "",
+        "@type": "s3",
+        "roleArn": ""
+    },
+    "filename": "",
+    "description": "",
+    "fileSizeInBytes": 0
+}
+
+
+def manifest_rows(files):
+    # new strings on every row, like values parsed from a manifest file
+    for i in range(files):
+        yield ["file_{}.csv".format(i), "https://bucket.s3.amazonaws.com/prefix/file_{}.csv".format(i),
+               "".join(["arn:aws:iam::123456789012:role/", "EdsCfsS3Access_role"]),
+               "".join(["Daily ", "file"]), str(i * 7)]
+
+
+# -----------------------------------------------------------
+# Former file dicts and payload building
+# -----------------------------------------------------------
+def legacy_entries(files):
+    entries = []
+    for file_list in manifest_rows(files):
+        file_input = {}
+        for field_name, field_value in zip(COLUMN_LIST, file_list):
+            if len(field_value) > 0:
+                file_input[field_name] = field_value
+        entries.append(file_input)
+    return entries
+
+
+def legacy_create_file_request(file_input, file_payload):
+    file_request = copy.deepcopy(file_payload)
+    file_request["storageLocation"]["url"] = file_input["s3url"]
+    file_request["filename"] = file_input["filename"]
+    if "rolearn" in file_input:
+        file_request["storageLocation"]["roleArn"] = file_input["rolearn"]
+    else:
+        del file_request["storageLocation"]["roleArn"]
+    if "description" in file_input:
+        file_request["description"] = file_input["description"]
+    else:
+        del file_request["description"]
+    if "filesizeinbytes" in file_input:
+        file_request["fileSizeInBytes"] = int(file_input["filesizeinbytes"])
+    else:
+        del file_request["fileSizeInBytes"]
+    return file_request
+
+
+def legacy_payload(files):
+    payload = {
+        "filesetName": USER_REQUEST["filesetname"],
+        "bucketName": USER_REQUEST["bucketname"],
+        "packageId": USER_REQUEST["packageid"],
+        "availableFrom": USER_REQUEST["availablefrom"],
+        "attributes": USER_REQUEST["attributes"]
+    }
+    file_payload = copy.deepcopy(LEGACY_FILE_PAYLOAD)
+    payload["files"] = [legacy_create_file_request(file_input, file_payload) for file_input in files]
+    return json.dumps(payload).encode("utf-8")
+
+
+# -----------------------------------------------------------
+# FileEntry and FilesetRequest
+# -----------------------------------------------------------
+def model_entries(files):
+    return [FileEntry.from_row(COLUMN_LIST, file_list) for file_list in manifest_rows(files)]
+
+
+def model_payload(files, encode=get_encoder("json")):
+    return encode(FilesetRequest.from_user_request(USER_REQUEST, files))
+
+
+def split_chunks(entries, chunk_size):
+    return [entries[index:index + chunk_size] for index in range(0, len(entries), chunk_size)]
+
+
+# -----------------------------------------------------------
+# Memory kept by file entries, time and allocations of payload building
+# -----------------------------------------------------------
+def measure(name, create_entries, create_payload, files, chunk_size):
+    gc.collect()
+    tracemalloc.start()
+    entries = create_entries(files)
+    snapshot = tracemalloc.take_snapshot()
+    entries_bytes = sum(stat.size for stat in snapshot.statistics("filename"))
+    entries_blocks = sum(stat.count for stat in snapshot.statistics("filename"))
+    chunks = split_chunks(entries, chunk_size)
+    del snapshot
+
+    tracemalloc.reset_peak()
+    baseline_bytes = tracemalloc.get_traced_memory()[0]
+    start_time = time.perf_counter()
+    payload_bytes = 0
+    for chunk in chunks:
+        payload_bytes += len(create_payload(chunk))
+    traced_elapsed = time.perf_counter() - start_time
+    peak_bytes = tracemalloc.get_traced_memory()[1] - baseline_bytes
+    tracemalloc.stop()
+
+    # time without tracemalloc overhead
+    start_time = time.perf_counter()
+    for chunk in chunks:
+        create_payload(chunk)
+    elapsed = time.perf_counter() - start_time
+
+    print("{:<8} {:>12.1f} {:>14,} {:>12.3f} {:>14.3f} {:>14.1f} {:>12.1f}".format(
+        name, entries_bytes / 1024 / 1024, entries_blocks, elapsed, traced_elapsed, peak_bytes / 1024,
+        payload_bytes / 1024 / 1024))
+    return entries, payload_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="File entry memory and payload building benchmark")
+    parser.add_argument("--files", type=int, default=100000, help="number of file entries")
+    parser.add_argument("--chunk-size", type=int, default=10, help="files per bulk-publish payload")
+    args = parser.parse_args()
+
+    print("{} files, chunks of {} files".format(args.files, args.chunk_size))
+    print("{:<8} {:>12} {:>14} {:>12} {:>14} {:>14} {:>12}".format(
+        "model", "entries MB", "entry blocks", "payload s", "traced s", "peak KB", "payload MB"))
+    legacy, legacy_bytes = measure("legacy", legacy_entries, legacy_payload, args.files, args.chunk_size)
+    del legacy
+    model, model_bytes = measure("model", model_entries, model_payload, args.files, args.chunk_size)
+    del model[1:]
+    try:
+        orjson_encode = get_encoder("orjson")
+        measure("orjson", model_entries, lambda files: model_payload(files, orjson_encode), args.files,
+                args.chunk_size)
+    except ImportError:
+        print("orjson   not installed")
+
+    # both payloads carry the same JSON text
+    if legacy_bytes != model_bytes or legacy_payload(legacy_entries(1)) != model_payload(model[:1]):
+        raise RuntimeError("model payload differs from legacy payload")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#=============================================================================
+# Benchmark cold-start time of the CLI
+#   - import time of publishFile measured with python -X importtime
+#   - wall time of "python publishFile.py -h" compared to an empty interpreter
+# Exit code is 1 when the median import time is above the target
+#   cd file_dist_tools
+#   python -m benchmarks.startup_time --runs 10 --target-ms 50
+#=============================================================================
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time_ms(module_name):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import {}".format(module_name)],
+                            cwd=TOOLS_DIR, capture_output=True, text=True, check=True)
+    # line format: "import time: self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == module_name:
+            return int(fields[1]) / 1000
+    raise RuntimeError("No import time found for {}".format(module_name))
+
+
+def wall_time_ms(command):
+    start_time = time.perf_counter()
+    subprocess.run(command, cwd=TOOLS_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return (time.perf_counter() - start_time) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLI cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=10, help="number of runs, median is reported")
+    parser.add_argument("--target-ms", type=float, default=50.0, help="maximum median import time of publishFile")
+    args = parser.parse_args()
+
+    import_times = [import_time_ms("publishFile") for _ in range(args.runs)]
+    help_times = [wall_time_ms([sys.executable, "publishFile.py", "-h"]) for _ in range(args.runs)]
+    empty_times = [wall_time_ms([sys.executable, "-c", "pass"]) for _ in range(args.runs)]
+
+    import_median = statistics.median(import_times)
+    print("{:<32} {:>10}".format("measure", "median ms"))
+    print("{:<32} {:>10.1f}".format("import publishFile", import_median))
+    print("{:<32} {:>10.1f}".format("python publishFile.py -h", statistics.median(help_times)))
+    print("{:<32} {:>10.1f}".format("python -c pass", statistics.median(empty_times)))
+    print("{:<32} {:>10.1f}".format("target import publishFile", args.target_ms))
+
+    if import_median > args.target_ms:
+        print("FAILED: import time is above target")
+        sys.exit(1)
+    print("PASSED")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#=============================================================================
+# Benchmark manifest validation throughput on a synthetic manifest
+#   - legacy: row by row validation with uncompiled regex, as before the batch engine
+#   - batch: validator.validate_manifest in a single process and on a process pool
+#   - read: streaming read of validated manifest used while publishing
+#   cd file_dist_tools
+#   python -m benchmarks.validator_throughput --rows 1000000 --workers 4
+#=============================================================================
+import argparse
+import os
+import re
+import tempfile
+import time
+
+import validator
+
+LEGACY_SPLIT_REGEX = r",(?=(?:[^\"]*\"[^\"]*\")*[^\"]*$)"
+
+
+def write_manifest(manifest_file, rows):
+    with open(manifest_file, "w") as mf:
+        mf.write("FileName,S3Url,RoleArn,Description,FileSizeInBytes\n")
+        for i in range(rows):
+            mf.write("file_{0}.csv,https://bucket.s3.amazonaws.com/prefix/file_{0}.csv,"
+                     "arn:aws:iam::123456789012:role/EdsCfsS3Access_role,\"File {0}, daily\",{1}\n".format(i, i * 7))
+
+
+def legacy_validate(manifest_file):
+    # per-row behaviour of validate_config before precompiled patterns and column mapping
+    rows = 0
+    with open(manifest_file) as mf:
+        column_list = validator.map_column_list(next(mf).strip())
+        for line in mf:
+            file_list = re.split(LEGACY_SPLIT_REGEX, line.rstrip("\n"))
+            file_name = file_list[column_list.index("filename")]
+            for i in range(0, len(file_list)):
+                field_name = column_list[i]
+                field_value = file_list[i].replace("\"", "")
+                if field_name not in validator.CFS_FILES_FIELD_LIST:
+                    raise ValueError(field_name)
+                if field_name == "filesizeinbytes" and len(field_value) > 0:
+                    int(field_value)
+                if field_name == "s3url" and re.match(validator.S3_URL_REGEX, field_value) is None:
+                    raise ValueError(file_name)
+                if field_name == "rolearn" and re.match(validator.ROLEARN_REGEX, field_value) is None:
+                    raise ValueError(file_name)
+            rows += 1
+    return rows
+
+
+def streaming_read(manifest_file):
+    rows = 0
+    for _ in validator.read_manifest(manifest_file, validate=False):
+        rows += 1
+    return rows
+
+
+def measure(name, function, rows):
+    start_time = time.perf_counter()
+    counted_rows = function()
+    elapsed = time.perf_counter() - start_time
+    if counted_rows != rows:
+        raise RuntimeError("{} counted {} rows, expected {}".format(name, counted_rows, rows))
+    print("{:<28} {:>10.2f} {:>14,.0f}".format(name, elapsed, rows / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manifest validation throughput benchmark")
+    parser.add_argument("--rows", type=int, default=1000000, help="number of rows of synthetic manifest")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="validation processes")
+    parser.add_argument("--skip-legacy", action="store_true", help="do not run the legacy validation")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        manifest_file = os.path.join(temp_dir, "manifest.csv")
+        write_manifest(manifest_file, args.rows)
+        print("manifest: {} rows, {:.1f} MB".format(args.rows, os.path.getsize(manifest_file) / 1024 / 1024))
+        print("{:<28} {:>10} {:>14}".format("validation", "seconds", "rows/s"))
+
+        if not args.skip_legacy:
+            measure("legacy row by row", lambda: legacy_validate(manifest_file), args.rows)
+        measure("batch, 1 process",
+                lambda: validator.validate_manifest(manifest_file, workers=1), args.rows)
+        measure("batch, {} processes".format(args.workers),
+                lambda: validator.validate_manifest(manifest_file, workers=args.workers, parallel_min_bytes=0),
+                args.rows)
+        measure("streaming read, no checks", lambda: streaming_read(manifest_file), args.rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+#=============================================================================
+# Circuit breaker and retry budget shared by all concurrent publish workers
+#   - circuit breaker: FAILURE_THRESHOLD consecutive failed bulk-publish requests
+#     (5xx responses, connection errors) open the circuit, requests then fail fast,
+#     or wait with OPEN_ACTION = wait, until OPEN_SECONDS have passed
+#   - half-open: HALF_OPEN_REQUESTS probe requests are let through, a successful
+#     probe closes the circuit, a failed probe opens it again
+#   - retry budget: every first attempt adds RETRY_BUDGET_RATIO tokens (at most
+#     RETRY_BUDGET_TOKENS), every retry after a 5xx response or connection error
+#     takes one, so an outage costs a bounded number of extra requests instead of
+#     RETRY_LIMIT times the number of chunks, throttled retries (429, Retry-After)
+#     are slowed down by the rate limiter and do not use the budget
+#=============================================================================
+import threading
+import time
+
+import publishMetrics
+from exceptions import CircuitOpenException
+from globalConfig import get_config
+from loggingFileDist import get_app_logger
+
+app_logger = get_app_logger("app_info")
+
+CIRCUIT_BREAKER_CONFIG_KEY = "CIRCUIT_BREAKER_CONFIG"
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+# values of the circuit_breaker_state gauge
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+# seconds between two checks of waiting requests while a probe is in flight
+PROBE_WAIT = 1.0
+FAIL = "fail"
+WAIT = "wait"
+
+_circuit_breaker = None
+_retry_budget = None
+# configuration the shared circuit breaker and retry budget were created with
+_guard_config = None
+_guard_lock = threading.Lock()
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, open_seconds=30.0, half_open_requests=1, open_action=FAIL,
+                 max_wait=300.0):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.half_open_requests = half_open_requests
+        self.open_action = open_action
+        self.max_wait = max_wait
+        self.state = CLOSED
+        self._failures = 0
+        self._probes = 0
+        # end of the open period, or deadline of the probes sent while half-open
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+        publishMetrics.set_gauge("circuit_breaker_state", STATE_VALUES[CLOSED])
+
+    def _change_state(self, state, reason):
+        app_logger.warning("Circuit breaker {} -> {}, {}".format(self.state, state, reason))
+        self.state = state
+        publishMetrics.set_gauge("circuit_breaker_state", STATE_VALUES[state])
+        if state == OPEN:
+            publishMetrics.inc("circuit_breaker_opened_total")
+
+    def _open(self, now, reason):
+        self._open_until = now + self.open_seconds
+        self._change_state(OPEN, "{}, requests paused for {:.1f}s".format(reason, self.open_seconds))
+
+    # -----------------------------------------------------------
+    # Let a request through, return seconds the caller should wait otherwise
+    # -----------------------------------------------------------
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now >= self._open_until:
+                self._probes = 0
+                self._change_state(HALF_OPEN, "sending {} probe requests".format(self.half_open_requests))
+            if self.state == CLOSED:
+                return 0.0
+            if self.state == HALF_OPEN:
+                # probes without an answer, e.g. token request failed, are replaced after OPEN_SECONDS
+                if self._probes >= self.half_open_requests and now >= self._open_until:
+                    self._probes = 0
+                if self._probes < self.half_open_requests:
+                    self._probes += 1
+                    self._open_until = now + self.open_seconds
+                    return 0.0
+                return PROBE_WAIT
+            return self._open_until - now
+
+    def acquire(self):
+        waited = 0.0
+        wait_time = self.reserve()
+        while wait_time > 0:
+            self._check_wait(wait_time, waited)
+            time.sleep(wait_time)
+            waited += wait_time
+            wait_time = self.reserve()
+
+    async def acquire_async(self):
+        # asyncio is only imported by the asyncio engine
+        import asyncio
+
+        waited = 0.0
+        wait_time = self.reserve()
+        while wait_time > 0:
+            self._check_wait(wait_time, waited)
+            await asyncio.sleep(wait_time)
+            waited += wait_time
+            wait_time = self.reserve()
+
+    def _check_wait(self, wait_time, waited):
+        if self.open_action != WAIT or waited + wait_time > self.max_wait:
+            publishMetrics.inc("circuit_breaker_rejected_total")
+            raise CircuitOpenException(wait_time)
+
+    # -----------------------------------------------------------
+    # Count the outcome of a request, status_code None is a connection error
+    # -----------------------------------------------------------
+    def on_response(self, status_code):
+        if status_code is None or status_code >= 500:
+            self.on_failure()
+        else:
+            self.on_success()
+
+    def on_success(self):
+        with self._lock:
+            self._failures = 0
+            if self.state == HALF_OPEN:
+                self._change_state(CLOSED, "probe request succeeded")
+
+    def on_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                self._open(now, "probe request failed")
+            elif self.state == CLOSED:
+                self._failures += 1
+                if self._failures >= self.failure_threshold:
+                    self._open(now, "{} consecutive failed requests".format(self._failures))
+
+
+class RetryBudget:
+    def __init__(self, ratio=0.2, tokens=10.0):
+        self.ratio = ratio
+        self.max_tokens = tokens
+        self._tokens = tokens
+        self._lock = threading.Lock()
+
+    def on_request(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    # -----------------------------------------------------------
+    # Take a token for a retry, False when the budget is used up
+    # -----------------------------------------------------------
+    def try_retry(self):
+        with self._lock:
+            if self._tokens < 1:
+                publishMetrics.inc("retry_budget_exhausted_total")
+                return False
+            self._tokens -= 1
+            return True
+
+
+def is_throttled(status_code, headers):
+    return status_code == 429 or headers.get("Retry-After") is not None
+
+
+# -----------------------------------------------------------
+# Get the shared circuit breaker and retry budget, None when disabled
+#   created on first use and when their settings changed
+# -----------------------------------------------------------
+def get_circuit_breaker():
+    return _get_guards()[0]
+
+
+def get_retry_budget():
+    return _get_guards()[1]
+
+
+def _get_guards():
+    global _circuit_breaker, _retry_budget, _guard_config
+
+    config = get_config()
+    if _guard_config is not config:
+        with _guard_lock:
+            if _guard_config is not config:
+                settings = _load_circuit_breaker_config(config)
+                # other settings of global.ini do not reset the circuit state
+                if _guard_config is None or settings != _load_circuit_breaker_config(_guard_config):
+                    breaker_settings, budget_enabled, budget_settings = settings
+                    _circuit_breaker = CircuitBreaker(**breaker_settings) \
+                        if breaker_settings["failure_threshold"] > 0 else None
+                    _retry_budget = RetryBudget(**budget_settings) if budget_enabled else None
+                _guard_config = config
+    return _circuit_breaker, _retry_budget
+
+
+def _load_circuit_breaker_config(config):
+    open_action = config.get(CIRCUIT_BREAKER_CONFIG_KEY, "OPEN_ACTION", fallback=FAIL).strip().lower()
+    return {
+        "failure_threshold": config.getint(CIRCUIT_BREAKER_CONFIG_KEY, "FAILURE_THRESHOLD", fallback=5),
+        "open_seconds": config.getfloat(CIRCUIT_BREAKER_CONFIG_KEY, "OPEN_SECONDS", fallback=30.0),
+        "half_open_requests": config.getint(CIRCUIT_BREAKER_CONFIG_KEY, "HALF_OPEN_REQUESTS", fallback=1),
+        # requests fail fast unless waiting is asked for
+        "open_action": WAIT if open_action == WAIT else FAIL,
+        "max_wait": config.getfloat(CIRCUIT_BREAKER_CONFIG_KEY, "MAX_WAIT", fallback=300.0)
+    }, config.getboolean(CIRCUIT_BREAKER_CONFIG_KEY, "RETRY_BUDGET", fallback=True), {
+        "ratio": config.getfloat(CIRCUIT_BREAKER_CONFIG_KEY, "RETRY_BUDGET_RATIO", fallback=0.2),
+        "tokens": config.getfloat(CIRCUIT_BREAKER_CONFIG_KEY, "RETRY_BUDGET_TOKENS", fallback=10.0)
+    }
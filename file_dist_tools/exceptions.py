@@ -24,17 +24,89 @@ class InvalidConfigurationException(Exception):
         super().__init__(self.message)
 
 
-class CFSServerException(Exception):
-    def __init__(self, message, payload, result=None):
+# characters of request body and API result kept in publish exception messages
+MAX_MESSAGE_TEXT = 512
+
+
+def truncate_text(text, max_length=MAX_MESSAGE_TEXT):
+    if text is None or len(text) <= max_length:
+        return text
+    return f"{text[:max_length]}... ({len(text)} characters)"
+
+
+# -----------------------------------------------------------
+# Failed bulk-publish request, payload text is built when the message is used
+# -----------------------------------------------------------
+class PublishRequestException(Exception):
+    def __init__(self, message, payload, result=None, body=None):
         self.result = result
         self.payload = payload
-        self.message = f"{message}\n  payload={payload}\n result={result}"
+        self.body = body
+        self._message = message
+        self._full_message = None
+        super().__init__(message)
+
+    @property
+    def message(self):
+        if self._full_message is None:
+            self._full_message = f"{self._message}\n  payload={self.describe_payload()}\n  " \
+                                 f"result={truncate_text(self.result)}"
+        return self._full_message
+
+    def describe_payload(self):
+        # file count and hash identify the request, only the start of the body is kept
+        import hashlib
+        body = self.body if self.body is not None else str(self.payload).encode("utf-8")
+        files = getattr(self.payload, "files", None)
+        summary = f"<{len(files) if files is not None else '?'} files, {len(body)} bytes, " \
+                  f"sha256 {hashlib.sha256(body).hexdigest()[:16]}>"
+        text = body[:MAX_MESSAGE_TEXT].decode("utf-8", errors="replace")
+        return f"{summary} {text}..." if len(body) > MAX_MESSAGE_TEXT else f"{summary} {text}"
+
+    def __str__(self):
+        return self.message
+
+
+class CFSServerException(PublishRequestException):
+    # 429 or Retry-After response, retried after the rate limiter pause without using the retry budget
+    throttled = False
+
+
+class CFSInvalidInputException(PublishRequestException):
+    pass
+
+
+class ManifestValidationException(InvalidConfigurationException):
+    def __init__(self, file_name, errors, error_count=None):
+        # errors are (record number, message) tuples, only the first ones may be kept on huge manifests
+        self.errors = errors
+        self.error_count = len(errors) if error_count is None else error_count
+        lines = [f"record {record_number}: {message}" for record_number, message in errors]
+        if self.error_count > len(errors):
+            lines.append(f"... and {self.error_count - len(errors)} more errors")
+        super().__init__(file_name, f"{self.error_count} invalid records\n  " + "\n  ".join(lines))
+
+
+class ShardFailedException(Exception):
+    def __init__(self, shard_id, message=""):
+        # errors of worker processes (--workers) are passed to the parent as text
+        self.shard_id = shard_id
+        self.message = f"Manifest shard {shard_id} failed, {message}"
         super().__init__(self.message)
 
 
-class CFSInvalidInputException(Exception):
-    def __init__(self, message, payload, result=None):
-        self.result = result
-        self.payload = payload
-        self.message = f"{message}\n  payload={payload}\n  result={result}"
-        super().__init__(self.message)
\ No newline at end of file
+class CircuitOpenException(Exception):
+    def __init__(self, retry_in, message="Circuit breaker is open, bulk-publish requests are paused"):
+        # seconds until the circuit breaker sends a probe request
+        self.retry_in = retry_in
+        self.message = f"{message}, next probe in {retry_in:.1f}s"
+        super().__init__(self.message)
+
+
+class RetryBudgetExhaustedException(Exception):
+    def __init__(self, error):
+        # CFSServerException of the attempt that was not retried, API result is kept for the journal
+        self.error = error
+        self.result = getattr(error, "result", None)
+        self.message = f"Retry budget exhausted, not retried: {str(error).splitlines()[0]}"
+        super().__init__(self.message)
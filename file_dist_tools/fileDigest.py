@@ -0,0 +1,167 @@
+#=============================================================================
+# MD5 and size of local copies of published files (--localdir)
+#   - files are hashed with chunked reads, on a process pool for batches of files
+#   - digests are kept in a SQLite cache keyed on (path, size, mtime), unchanged
+#     files are not hashed again on the next run
+#=============================================================================
+import hashlib
+import os
+import sqlite3
+import time
+
+import publishMetrics
+from exceptions import InvalidConfigurationException
+
+# bytes read at once while hashing a file
+READ_BYTES = 1024 * 1024
+
+
+# -----------------------------------------------------------
+# MD5 of a file as hex digest, read in chunks into one buffer
+# -----------------------------------------------------------
+def compute_md5(path, read_bytes=READ_BYTES):
+    md5 = hashlib.md5()
+    buffer = bytearray(read_bytes)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as local_file:
+        while True:
+            size = local_file.readinto(buffer)
+            if not size:
+                break
+            md5.update(view[:size])
+    return md5.hexdigest()
+
+
+def compute_md5_batch(paths, read_bytes=READ_BYTES):
+    return [compute_md5(path, read_bytes) for path in paths]
+
+
+# -----------------------------------------------------------
+# Digests of earlier runs
+# -----------------------------------------------------------
+class DigestCache:
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self._connection = sqlite3.connect(cache_file)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS digests (path TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+                                 "mtime_ns INTEGER NOT NULL, md5 TEXT NOT NULL, hashed_at REAL NOT NULL)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get(self, path, size, mtime_ns):
+        row = self._connection.execute("SELECT md5 FROM digests WHERE path = ? AND size = ? AND mtime_ns = ?",
+                                       (path, size, mtime_ns)).fetchone()
+        return row[0] if row is not None else None
+
+    def put_many(self, digests):
+        # digests are (path, size, mtime_ns, md5) tuples
+        now = time.time()
+        with self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO digests (path, size, mtime_ns, md5, hashed_at) "
+                                         "VALUES (?, ?, ?, ?, ?)",
+                                         [digest + (now,) for digest in digests])
+
+    def close(self):
+        self._connection.close()
+
+
+# -----------------------------------------------------------
+# Set md5 and filesizeinbytes of file entries from files of local_dir
+# -----------------------------------------------------------
+class FileDigests:
+    def __init__(self, local_dir, cache_file=None, workers=0, batch_size=1000, read_bytes=READ_BYTES):
+        self.local_dir = local_dir
+        self.workers = workers if workers > 0 else os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.read_bytes = read_bytes
+        self.hashed = 0
+        self.cached = 0
+        self.cache = DigestCache(cache_file) if cache_file else None
+        self._executor = None
+        # batches submitted to the process pool and not collected yet
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            # shutdown(cancel_futures=True) needs Python 3.9
+            for future in self._pending:
+                future.cancel()
+            self._executor.shutdown(wait=True)
+            self._pending = []
+            self._executor = None
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+    # -----------------------------------------------------------
+    # Yield file entries with digests, files are hashed one batch at a time
+    # -----------------------------------------------------------
+    def apply(self, files):
+        batch = []
+        for file_entry in files:
+            batch.append(file_entry)
+            if len(batch) >= self.batch_size:
+                yield from self._apply_batch(batch)
+                batch = []
+        if len(batch) > 0:
+            yield from self._apply_batch(batch)
+
+    def _apply_batch(self, files):
+        missing = []
+        for file_entry in files:
+            path = os.path.abspath(os.path.join(self.local_dir, file_entry.filename))
+            try:
+                stat = os.stat(path)
+            except OSError as err:
+                raise InvalidConfigurationException(self.local_dir, f"Local file of \"{file_entry.filename}\" "
+                                                                    f"cannot be read: {err}")
+            file_entry.filesizeinbytes = stat.st_size
+            file_entry.md5 = self.cache.get(path, stat.st_size, stat.st_mtime_ns) if self.cache else None
+            if file_entry.md5 is None:
+                missing.append((file_entry, path, stat.st_size, stat.st_mtime_ns))
+
+        self.cached += len(files) - len(missing)
+        publishMetrics.inc("digest_cache_hits_total", len(files) - len(missing))
+        if len(missing) > 0:
+            with publishMetrics.timer("file_digest"):
+                digests = self._compute([path for _, path, _, _ in missing])
+            for (file_entry, path, size, mtime_ns), md5 in zip(missing, digests):
+                file_entry.md5 = md5
+            self.hashed += len(missing)
+            publishMetrics.inc("files_hashed_total", len(missing))
+            if self.cache is not None:
+                self.cache.put_many([(path, size, mtime_ns, file_entry.md5)
+                                     for file_entry, path, size, mtime_ns in missing])
+        return files
+
+    def _compute(self, paths):
+        if self.workers == 1 or len(paths) == 1:
+            return [compute_md5(path, self.read_bytes) for path in paths]
+
+        if self._executor is None:
+            # deferred, runs only hashing files of the cache do not need the process pool
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # spawn as with --workers, forked children would inherit locks held by the log listener threads
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        chunksize = max(1, len(paths) // (self.workers * 4))
+        self._pending = [self._executor.submit(compute_md5_batch, paths[start:start + chunksize], self.read_bytes)
+                         for start in range(0, len(paths), chunksize)]
+        digests = []
+        for future in self._pending:
+            digests.extend(future.result())
+        self._pending = []
+        return digests
@@ -0,0 +1,191 @@
+#=============================================================================
+# File entries and file-set requests of the bulk-publish API
+#   - one slotted object per file instead of a dict, values repeated on every
+#     row (role ARN, description, file type) are interned and shared
+#   - the request body is written directly from the objects, only the fields
+#     present are written, no intermediate dicts are built
+#=============================================================================
+import sys
+from json import dumps
+from json.encoder import encode_basestring_ascii
+
+# manifest values usually identical on every row, kept once in memory
+INTERNED_FIELDS = frozenset(["filetype", "description", "rolearn"])
+
+
+# -----------------------------------------------------------
+# One file of a file-set, attributes are the manifest field names
+# position is the byte offset of the manifest record, it is not sent to the API
+# -----------------------------------------------------------
+class FileEntry:
+    __slots__ = ("filename", "s3url", "rolearn", "description", "filesizeinbytes", "md5", "filetype", "position")
+
+    def __init__(self, filename=None, s3url=None, rolearn=None, description=None, filesizeinbytes=None, md5=None,
+                 filetype=None, position=None):
+        self.filename = filename
+        self.s3url = s3url
+        self.rolearn = rolearn
+        self.description = description
+        self.filesizeinbytes = filesizeinbytes
+        self.md5 = md5
+        self.filetype = filetype
+        self.position = position
+
+    # -----------------------------------------------------------
+    # Create entry from manifest fields, empty values are omitted
+    # -----------------------------------------------------------
+    @classmethod
+    def from_row(cls, column_list, values):
+        entry = cls()
+        for field_name, field_value in zip(column_list, values):
+            if len(field_value) == 0:
+                continue
+            if field_name in INTERNED_FIELDS:
+                field_value = sys.intern(field_value)
+            elif field_name == "filesizeinbytes":
+                field_value = int(field_value)
+            setattr(entry, field_name, field_value)
+        return entry
+
+    def __reduce__(self):
+        # compact pickle, entries are sent from worker processes with --workers
+        return FileEntry, (self.filename, self.s3url, self.rolearn, self.description, self.filesizeinbytes, self.md5,
+                           self.filetype, self.position)
+
+    def __repr__(self):
+        return "FileEntry({})".format(", ".join("{}={!r}".format(field_name, getattr(self, field_name))
+                                               for field_name in self.__slots__
+                                               if getattr(self, field_name) is not None))
+
+    # -----------------------------------------------------------
+    # File entry of bulk-publish request
+    # -----------------------------------------------------------
+    def to_dict(self):
+        storage_location = {"url": self.s3url, "@type": "s3"}
+        if self.rolearn is not None:
+            storage_location["roleArn"] = self.rolearn
+        file_request = {"fileType": "file", "storageLocation": storage_location, "filename": self.filename}
+        if self.description is not None:
+            file_request["description"] = self.description
+        if self.filesizeinbytes is not None:
+            file_request["fileSizeInBytes"] = self.filesizeinbytes
+        if self.md5 is not None:
+            file_request["md5"] = self.md5
+        return file_request
+
+    def to_json(self):
+        # same text as json.dumps(self.to_dict())
+        parts = ['{"fileType": "file", "storageLocation": {"url": ', encode_basestring_ascii(self.s3url),
+                 ', "@type": "s3"']
+        if self.rolearn is not None:
+            parts.append(', "roleArn": ')
+            parts.append(encode_basestring_ascii(self.rolearn))
+        parts.append('}, "filename": ')
+        parts.append(encode_basestring_ascii(self.filename))
+        if self.description is not None:
+            parts.append(', "description": ')
+            parts.append(encode_basestring_ascii(self.description))
+        if self.filesizeinbytes is not None:
+            parts.append(', "fileSizeInBytes": ')
+            parts.append(str(self.filesizeinbytes))
+        if self.md5 is not None:
+            parts.append(', "md5": ')
+            parts.append(encode_basestring_ascii(self.md5))
+        parts.append("}")
+        return "".join(parts)
+
+
+# -----------------------------------------------------------
+# File-set fields and files of one bulk-publish request
+# -----------------------------------------------------------
+class FilesetRequest:
+    __slots__ = ("filesetname", "bucketname", "packageid", "rolearn", "availablefrom", "availableto",
+                 "contentfrom", "contentto", "attributes", "files")
+
+    def __init__(self, filesetname, bucketname, packageid, rolearn=None, availablefrom=None, availableto=None,
+                 contentfrom=None, contentto=None, attributes=None, files=()):
+        self.filesetname = filesetname
+        self.bucketname = bucketname
+        self.packageid = packageid
+        self.rolearn = rolearn
+        self.availablefrom = availablefrom
+        self.availableto = availableto
+        self.contentfrom = contentfrom
+        self.contentto = contentto
+        self.attributes = attributes
+        self.files = files
+
+    @classmethod
+    def from_user_request(cls, user_request, files=()):
+        return cls(user_request["filesetname"], user_request["bucketname"], user_request["packageid"],
+                   user_request.get("rolearn"), user_request.get("availablefrom"), user_request.get("availableto"),
+                   user_request.get("contentfrom"), user_request.get("contentto"), user_request.get("attributes"),
+                   files)
+
+    # -----------------------------------------------------------
+    # Fields present as a user request of the publish pipeline
+    # -----------------------------------------------------------
+    def to_user_request(self):
+        return {field_name: getattr(self, field_name) for field_name in self.__slots__
+                if getattr(self, field_name) is not None}
+
+    def __repr__(self):
+        # exception messages show the request as it is sent
+        return repr(self.to_dict())
+
+    # -----------------------------------------------------------
+    # File-set level fields of bulk-publish request
+    # -----------------------------------------------------------
+    def header(self):
+        header = {
+            "filesetName": self.filesetname,
+            "bucketName": self.bucketname,
+            "packageId": self.packageid
+        }
+
+        # Optional Field
+        if self.rolearn is not None:
+            header["rolearn"] = self.rolearn
+        if self.availablefrom is not None:
+            header["availableFrom"] = self.availablefrom
+        if self.availableto is not None:
+            header["availableTo"] = self.availableto
+        if self.contentfrom is not None:
+            header["contentFrom"] = self.contentfrom
+        if self.contentto is not None:
+            header["contentTo"] = self.contentto
+        if self.attributes is not None:
+            header["attributes"] = self.attributes
+        return header
+
+    def to_dict(self):
+        request = self.header()
+        request["files"] = [file_entry.to_dict() for file_entry in self.files]
+        return request
+
+    def to_json(self):
+        # same text as json.dumps(self.to_dict()), the header is small and encoded by json
+        return "{}, \"files\": [{}]}}".format(dumps(self.header())[:-1],
+                                              ", ".join([file_entry.to_json() for file_entry in self.files]))
+
+
+# -----------------------------------------------------------
+# Request body encoders, bytes sent to bulk-publish API
+# -----------------------------------------------------------
+def encode_json(request):
+    return request.to_json().encode("utf-8")
+
+
+def get_encoder(name="auto"):
+    # auto: orjson when installed, the JSON writer of FilesetRequest otherwise
+    if name in ("auto", "orjson"):
+        try:
+            import orjson
+        except ImportError:
+            if name == "orjson":
+                raise ImportError("orjson encoder requires orjson, please run: python -m pip install orjson")
+        else:
+            return lambda request: orjson.dumps(request.to_dict())
+    elif name != "json":
+        raise ValueError("Unknown JSON encoder \"{}\", should be auto, json or orjson".format(name))
+    return encode_json
@@ -0,0 +1,107 @@
+#=============================================================================
+# Global configuration file (global.ini) shared by every module of the tools
+#   - parsed once and cached, parsed again only when the file modification
+#     time changes, so daemon and library use pick up changes without restart
+#   - the modification time is checked at most once per CHECK_INTERVAL seconds,
+#     reading settings on the publish path never touches the file
+#=============================================================================
+import configparser
+import os
+import threading
+import time
+
+GLOBAL_CONFIG_FILE = "global.ini"
+RDP_KEY = "RDP"
+GLOBAL_KEY = "CFS_GLOBAL"
+RETRY_CONFIG_KEY = "RETRY_CONFIG"
+# seconds between two checks of the file modification time
+CHECK_INTERVAL = 1.0
+
+_config = None
+_next_check = 0.0
+_config_lock = threading.Lock()
+
+
+# -----------------------------------------------------------
+# RDP credentials, [RDP] section
+# -----------------------------------------------------------
+class RdpConfig:
+    __slots__ = ("username", "password", "client_id")
+
+    def __init__(self, username=None, password=None, client_id=None):
+        self.username = username
+        self.password = password
+        self.client_id = client_id
+
+
+# -----------------------------------------------------------
+# Bulk-publish retries, [RETRY_CONFIG] section
+# -----------------------------------------------------------
+class RetryConfig:
+    __slots__ = ("limit", "delay", "backoff")
+
+    def __init__(self, limit=3, delay=1, backoff=2):
+        self.limit = limit
+        self.delay = delay
+        self.backoff = backoff
+
+
+# -----------------------------------------------------------
+# Parsed global configuration file
+#   - typed settings of [RDP], [CFS_GLOBAL] and [RETRY_CONFIG]
+#   - other sections are read with the ConfigParser methods
+# -----------------------------------------------------------
+class GlobalConfig(configparser.ConfigParser):
+    def __init__(self, config_file=GLOBAL_CONFIG_FILE, mtime_ns=None):
+        super().__init__()
+        self.config_file = config_file
+        self.mtime_ns = mtime_ns
+        self.read(config_file)
+
+        if self.has_section(RDP_KEY):
+            rdp = self[RDP_KEY]
+            self.rdp = RdpConfig(rdp.get("username"), rdp.get("password"), rdp.get("clientId"))
+        else:
+            self.rdp = None
+        # bucketName, packageId and file-set defaults, keys in lower case
+        self.cfs_global = dict(self[GLOBAL_KEY]) if self.has_section(GLOBAL_KEY) else {}
+        self.retry = RetryConfig(self.getint(RETRY_CONFIG_KEY, "RETRY_LIMIT", fallback=3),
+                                 self.getint(RETRY_CONFIG_KEY, "RETRY_DELAY", fallback=1),
+                                 self.getint(RETRY_CONFIG_KEY, "RETRY_BACKOFF", fallback=2))
+
+
+def _get_mtime_ns(config_file):
+    try:
+        return os.stat(config_file).st_mtime_ns
+    except OSError:
+        return None
+
+
+# -----------------------------------------------------------
+# Get current configuration, parse the file again if it has changed
+#   callers keep the returned object for a consistent view of one operation
+# -----------------------------------------------------------
+def get_config():
+    global _config, _next_check
+
+    now = time.monotonic()
+    if _config is not None and now < _next_check:
+        return _config
+
+    with _config_lock:
+        if _config is None or now >= _next_check:
+            mtime_ns = _get_mtime_ns(GLOBAL_CONFIG_FILE)
+            if _config is None or _config.mtime_ns != mtime_ns:
+                _config = GlobalConfig(GLOBAL_CONFIG_FILE, mtime_ns)
+            _next_check = now + CHECK_INTERVAL
+    return _config
+
+
+# -----------------------------------------------------------
+# Parse the file on next get_config, e.g. after the working directory changed
+# -----------------------------------------------------------
+def reload_config():
+    global _config
+
+    with _config_lock:
+        _config = None
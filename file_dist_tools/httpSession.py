@@ -0,0 +1,73 @@
+#=============================================================================
+# Shared HTTP session with keep-alive connection pool
+# The session is created on first use and shared by every HTTP call of the tools
+# (token endpoint and bulk-publish), so TCP/TLS connections are reused
+#=============================================================================
+import threading
+
+from globalConfig import get_config
+
+HTTP_CONFIG_KEY = "HTTP_CONFIG"
+
+_session = None
+# configuration the shared session was created with
+_session_config = None
+_session_lock = threading.Lock()
+
+
+# -----------------------------------------------------------
+# Read connection pool settings from global configuration file
+# -----------------------------------------------------------
+def _loadHttpConfig(config):
+    pool_size = config.getint(HTTP_CONFIG_KEY, "POOL_SIZE", fallback=10)
+    max_retries = config.getint(HTTP_CONFIG_KEY, "MAX_RETRIES", fallback=3)
+    keep_alive = config.getboolean(HTTP_CONFIG_KEY, "KEEP_ALIVE", fallback=True)
+    return pool_size, max_retries, keep_alive
+
+
+# -----------------------------------------------------------
+# Create a new session with a sized connection pool
+# -----------------------------------------------------------
+def create_session(pool_size=10, max_retries=3, keep_alive=True):
+    # requests is imported on first HTTP call, it is the slowest import of the tools
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    # max_retries only retries failed connections, POST requests are never resent after they are sent
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=max_retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return session
+
+
+# -----------------------------------------------------------
+# Get the shared session, create it on first use and when the configuration changed
+# -----------------------------------------------------------
+def get_session():
+    global _session, _session_config
+
+    config = get_config()
+    if _session is None or _session_config is not config:
+        with _session_lock:
+            if _session is None or _session_config is not config:
+                settings = _loadHttpConfig(config)
+                # other settings of global.ini keep the pooled connections
+                if _session is None or settings != _loadHttpConfig(_session_config):
+                    _session = create_session(*settings)
+                _session_config = config
+    return _session
+
+
+# -----------------------------------------------------------
+# Close the shared session and its pooled connections
+# -----------------------------------------------------------
+def close_session():
+    global _session
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -1,11 +1,129 @@
 import logging
 import os, sys
-from pathlib import Path
+import threading
 
 formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
 
 app_loggers = {}
 error_loggers = {}
+_setup_lock = threading.Lock()
+# one queue listener per logger, file and console I/O run on the listener threads
+_listeners = []
+
+LOG_CONFIG_KEY = "LOG_CONFIG"
+_log_config = None
+
+# attributes of every LogRecord, the others are structured fields given with extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", logging.INFO, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+# -----------------------------------------------------------
+# Read log format and file rotation from global configuration file
+# handlers are created once, changes apply on next start
+# -----------------------------------------------------------
+def get_log_config():
+    global _log_config
+    if _log_config is None:
+        from globalConfig import get_config
+        config = get_config()
+        _log_config = {
+            "format": config.get(LOG_CONFIG_KEY, "FORMAT", fallback="text").lower(),
+            "max_bytes": config.getint(LOG_CONFIG_KEY, "MAX_BYTES", fallback=10 * 1024 * 1024),
+            "backup_count": config.getint(LOG_CONFIG_KEY, "BACKUP_COUNT", fallback=5),
+            "buffer_size": config.getint(LOG_CONFIG_KEY, "BUFFER_SIZE", fallback=64 * 1024)
+        }
+    return _log_config
+
+
+def is_json_format():
+    return get_log_config()["format"] == "json"
+
+
+# -----------------------------------------------------------
+# One JSON object per log record, extra= fields are kept as JSON values
+# -----------------------------------------------------------
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        import json
+        log_entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                log_entry[key] = value
+        if record.exc_info:
+            log_entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(log_entry, default=str)
+
+
+def _create_file_handler(log_file, log_config):
+    from logging.handlers import RotatingFileHandler
+
+    class BufferedRotatingFileHandler(RotatingFileHandler):
+        """Size-rotated log file written through a buffer, flushed when the log queue is empty"""
+
+        def __init__(self, filename, maxBytes, backupCount, bufferSize):
+            self.buffer_size = bufferSize
+            self.file_size = 0
+            super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount)
+
+        def _open(self):
+            stream = open(self.baseFilename, self.mode, buffering=self.buffer_size, encoding=self.encoding)
+            self.file_size = os.path.getsize(self.baseFilename)
+            self.stream_encoding = stream.encoding
+            return stream
+
+        def emit(self, record):
+            # track the file size instead of seek/tell, which would flush the buffer on every record
+            try:
+                msg = self.format(record) + self.terminator
+                # maxBytes is in bytes, file names and descriptions may hold non-ASCII characters
+                msg_size = len(msg) if msg.isascii() else len(msg.encode(self.stream_encoding, "replace"))
+                if 0 < self.maxBytes <= self.file_size + msg_size and self.file_size > 0:
+                    self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+                self.stream.write(msg)
+                self.file_size += msg_size
+            except Exception:
+                self.handleError(record)
+
+    return BufferedRotatingFileHandler(log_file, log_config["max_bytes"], log_config["backup_count"],
+                                       log_config["buffer_size"])
+
+
+def _create_listener(log_queue, handlers):
+    from logging.handlers import QueueListener
+
+    class FlushingQueueListener(QueueListener):
+        """Flushes the handlers before waiting on an empty queue, so buffered records are written when idle"""
+
+        def dequeue(self, block):
+            if block and self.queue.empty():
+                for handler in self.handlers:
+                    handler.flush()
+            return self.queue.get(block)
+
+    return FlushingQueueListener(log_queue, *handlers, respect_handler_level=True)
+
+
+def _create_queue_handler(log_queue):
+    from logging.handlers import QueueHandler
+
+    class RecordQueueHandler(QueueHandler):
+        """Queues records with their exception info, formatted by the handlers of the listener"""
+
+        def prepare(self, record):
+            # QueueHandler.prepare would format the traceback into msg and clear exc_info
+            record = logging.makeLogRecord(record.__dict__)
+            record.msg = record.getMessage()
+            record.args = None
+            return record
+
+    return RecordQueueHandler(log_queue)
 
 
 # -----------------------------------------------------------
@@ -13,28 +131,65 @@ error_loggers = {}
 # -----------------------------------------------------------
 def setup_logger(name, log_file, level=logging.INFO, log_sys_type=sys.stdout):
     """To setup as many loggers as you want"""
-    
-    log_path = Path(log_file)
-    log_dir = log_path.parent
-    print("log_path {}, log_dir {}".format(log_path, log_dir))
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
+    import queue
 
-    handler = logging.FileHandler(log_file)
-    handler.setFormatter(formatter)
+    log_config = get_log_config()
+    log_formatter = JsonFormatter() if log_config["format"] == "json" else formatter
 
+    log_dir = os.path.dirname(log_file)
+    if log_dir and not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+
+    handlers = [_create_file_handler(log_file, log_config)]
     if log_sys_type is not None:
-        sout_handler = logging.StreamHandler(log_sys_type)
-        sout_handler.setFormatter(formatter)
+        handlers.append(logging.StreamHandler(log_sys_type))
+    for handler in handlers:
+        handler.setFormatter(log_formatter)
+
+    # the logging thread only puts records on the queue
+    log_queue = queue.SimpleQueue()
+    listener = _create_listener(log_queue, handlers)
+    listener.start()
+    if len(_listeners) == 0:
+        import atexit
+        atexit.register(shutdown_logging)
+    _listeners.append(listener)
 
     logger = logging.getLogger(name)
     logger.setLevel(level)
-    logger.addHandler(handler)
-    if log_sys_type is not None:
-        logger.addHandler(sout_handler)
+    logger.addHandler(_create_queue_handler(log_queue))
 
     return logger
 
+
+# -----------------------------------------------------------
+# Write queued records and close log files
+# -----------------------------------------------------------
+def shutdown_logging():
+    while len(_listeners) > 0:
+        listener = _listeners.pop()
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+# -----------------------------------------------------------
+# Logger created on first use, importing a module has no side effect
+# -----------------------------------------------------------
+class LazyLogger:
+    def __init__(self, name, log_file, level=logging.INFO, log_sys_type=sys.stdout):
+        self._logger = None
+        self._setup_args = (name, log_file, level, log_sys_type)
+
+    def __getattr__(self, attr):
+        # only called for logger attributes, log directory and handlers are created here
+        if self._logger is None:
+            with _setup_lock:
+                if self._logger is None:
+                    self._logger = setup_logger(*self._setup_args)
+        return getattr(self._logger, attr)
+
+
 # -----------------------------------------------------------
 # Get logger info from global variables
 # -----------------------------------------------------------
@@ -44,7 +199,7 @@ def get_app_logger(logger_name, log_file="log/app.log"):
     if app_loggers.get(logger_name):
         return app_loggers.get(logger_name)
     else:
-        app_logger = setup_logger(logger_name, log_file)
+        app_logger = LazyLogger(logger_name, log_file)
         app_loggers[logger_name] = app_logger
         return app_logger
 
@@ -57,6 +212,6 @@ def get_error_logger(logger_name, log_file="log/error.log"):
     if error_loggers.get(logger_name):
         return error_loggers.get(logger_name)
     else:
-        error_logger = setup_logger(logger_name, log_file, level=logging.ERROR, log_sys_type=None)
+        error_logger = LazyLogger(logger_name, log_file, level=logging.ERROR, log_sys_type=None)
         error_loggers[logger_name] = error_logger
-        return error_logger
\ No newline at end of file
+        return error_logger
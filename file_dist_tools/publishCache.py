@@ -0,0 +1,83 @@
+#=============================================================================
+# Idempotency cache of published file entries
+#   - keys are content hashes of the normalized file entry sent to bulk-publish API
+#   - entries expire after TTL seconds, the oldest entries are dropped above MAX_ENTRIES
+#   - file entries already published are filtered out before any HTTP call, only keys of
+#     chunks accepted by the API count as published, a repeated entry is sent again while
+#     the chunk of its first copy is not confirmed
+#=============================================================================
+import sqlite3
+import threading
+import time
+
+import publishMetrics
+
+
+class PublishCache:
+    def __init__(self, cache_file, ttl=86400, max_entries=1000000, force=False):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.force = force
+        self.hits = 0
+        self.misses = 0
+        self._connection = sqlite3.connect(cache_file, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS published (key TEXT PRIMARY KEY, published_at REAL NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS published_at ON published (published_at)")
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def is_published(self, key):
+        with self._lock:
+            row = self._connection.execute("SELECT published_at FROM published WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] > time.time() - self.ttl
+
+    # -----------------------------------------------------------
+    # Yield items not published yet, key_function maps an item to its key
+    # each call is one publish run with its own counters, on_skipped is called with the skipped items
+    # -----------------------------------------------------------
+    def filter_published(self, items, key_function, on_skipped=None):
+        self.start_run()
+        for item in items:
+            if self.should_publish(key_function(item)):
+                yield item
+            elif on_skipped is not None:
+                on_skipped(item)
+
+    def start_run(self):
+        self.hits = 0
+        self.misses = 0
+
+    # -----------------------------------------------------------
+    # Check one key of the current run, keys computed elsewhere (--workers)
+    # -----------------------------------------------------------
+    def should_publish(self, key):
+        if not self.force and self.is_published(key):
+            self.hits += 1
+            publishMetrics.inc("cache_hits_total")
+            return False
+        self.misses += 1
+        publishMetrics.inc("cache_misses_total")
+        return True
+
+    def mark_published(self, keys):
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO published (key, published_at) VALUES (?, ?)",
+                                         [(key, now) for key in keys])
+
+    def close(self):
+        with self._lock:
+            # drop expired entries and keep at most max_entries newest entries
+            with self._connection:
+                self._connection.execute("DELETE FROM published WHERE published_at <= ?", (time.time() - self.ttl,))
+                self._connection.execute("DELETE FROM published WHERE key IN (SELECT key FROM published "
+                                         "ORDER BY published_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+            self._connection.close()
@@ -1,15 +1,21 @@
-import requests
 import os
 import rdpToken
-import copy
+import httpSession
+import rateLimiter
+import circuitBreaker
+import publishJournal
+import publishCache
+import publishMetrics
+import hashlib
 import argparse
 import json
-import configparser
+import time
 from json import JSONDecodeError
-from retry import retry
 
-from loggingFileDist import get_app_logger, get_error_logger
-from validator import validate_argument, validate_config, validate_global_config
+from fileEntry import FileEntry, FilesetRequest, get_encoder
+from globalConfig import get_config
+from loggingFileDist import get_app_logger, get_error_logger, is_json_format
+from validator import validate_argument, validate_config, validate_global_config, validate_manifest_argument
 from exceptions import *
 
 file_distribution_url = "file-store"
@@ -19,22 +25,61 @@ app_logger = get_app_logger("app_info")
 error_logger = get_error_logger("app_error")
 
 GLOBAL_CONFIG_FILE = "global.ini"
-RETRY_CONFIG_KEY = "RETRY_CONFIG"
-config = configparser.ConfigParser(defaults={
-    "RETRY_LIMIT": 3,
-    "RETRY_DELAY": 1,
-    "RETRY_BACKOFF": 2
-})
-config.read(GLOBAL_CONFIG_FILE)
-RETRY_LIMIT = int(config.get(RETRY_CONFIG_KEY, "RETRY_LIMIT"))
-RETRY_DELAY = int(config.get(RETRY_CONFIG_KEY, "RETRY_DELAY"))
-RETRY_BACKOFF = int(config.get(RETRY_CONFIG_KEY, "RETRY_BACKOFF"))
+PUBLISH_CONFIG_KEY = "PUBLISH_CONFIG"
+DAEMON_CONFIG_KEY = "DAEMON_CONFIG"
+JOURNAL_CONFIG_KEY = "JOURNAL_CONFIG"
+CACHE_CONFIG_KEY = "CACHE_CONFIG"
+METRICS_CONFIG_KEY = "METRICS_CONFIG"
+DIGEST_CONFIG_KEY = "DIGEST_CONFIG"
+RESULT_CONFIG_KEY = "RESULT_CONFIG"
+# reasons of the skipped records of the result file
+SKIPPED_BY_JOURNAL = "already published (journal)"
+SKIPPED_BY_CACHE = "already published (publish cache)"
+
+# encoder of request bodies and the configuration it was selected with
+_encode_body = None
+_encoder_config = None
+
+
+def get_retry_config():
+    retry = get_config().retry
+    return retry.limit, retry.delay, retry.backoff
+
+
+# -----------------------------------------------------------
+# Encode payload with JSON_ENCODER of global configuration file
+# -----------------------------------------------------------
+def encode_body(payload):
+    global _encode_body, _encoder_config
+
+    config = get_config()
+    if _encoder_config is not config:
+        encoder = config.get(PUBLISH_CONFIG_KEY, "JSON_ENCODER", fallback="auto").lower()
+        try:
+            _encode_body = get_encoder(encoder)
+        except ValueError as err:
+            raise InvalidConfigurationException(GLOBAL_CONFIG_FILE, str(err))
+        _encoder_config = config
+    with publishMetrics.timer("json_encode"):
+        return _encode_body(payload)
+
+
+def get_publish_config():
+    config = get_config()
+    # bulk-publish API accepts a limited number of files per request
+    chunk_size = int(config.get(PUBLISH_CONFIG_KEY, "CHUNK_SIZE", fallback=10))
+    max_concurrency = int(config.get(PUBLISH_CONFIG_KEY, "MAX_CONCURRENCY", fallback=4))
+    return chunk_size, max_concurrency
 
 
 # -----------------------------------------------------------
 #  Print JSON data with user friendly format
 # -----------------------------------------------------------
-def print_json_format(json_response):
+def print_json_format(json_response, message=""):
+    if is_json_format():
+        app_logger.info(message, extra={"fields": json_response})
+        return
+
     for key, value in json_response.items():
         if key == "error":
             for err_key, err_value in value.items():
@@ -59,165 +104,473 @@ def print_json_format(json_response):
 # -----------------------------------------------------------
 # Make a request to publish file to File Distribution API
 # -----------------------------------------------------------
-@retry(CFSServerException, tries=RETRY_LIMIT, delay=RETRY_DELAY, backoff=RETRY_BACKOFF)
-def publish_file(payload):
+def publish_file(payload, body=None, outcome=None):
+    # retry is imported on first publish, -h and validation only runs do not need it
+    from retry.api import retry_call
+
+    retry_limit, retry_delay, retry_backoff = get_retry_config()
+    # encoded once, every attempt sends the same bytes, --workers encodes in the worker processes
+    if body is None:
+        body = encode_body(payload)
+    # end time of the previous attempt, retry_call sleeps between attempts
+    attempt_end_times = []
+
+    # shared by every worker, retries of all chunks together are limited during an outage
+    retry_budget = circuitBreaker.get_retry_budget()
+    if retry_budget is not None:
+        retry_budget.on_request()
+
+    def publish_attempt():
+        if len(attempt_end_times) > 0:
+            publishMetrics.inc("publish_retries_total")
+            publishMetrics.record_phase("retry_sleep", attempt_end_times[-1], time.perf_counter())
+        if outcome is not None:
+            outcome["attempts"] = len(attempt_end_times) + 1
+        try:
+            return _publish_file(payload, body, outcome)
+        except CFSServerException as err:
+            # checked before retry_call sleeps, the error is then raised without retry
+            if len(attempt_end_times) + 1 < retry_limit and retry_budget is not None and not err.throttled and \
+                    not retry_budget.try_retry():
+                raise RetryBudgetExhaustedException(err) from err
+            raise
+        finally:
+            attempt_end_times.append(time.perf_counter())
+
+    try:
+        with publishMetrics.timer("publish_file"):
+            json_response = retry_call(publish_attempt, exceptions=CFSServerException,
+                                       tries=retry_limit, delay=retry_delay, backoff=retry_backoff)
+    except Exception:
+        publishMetrics.inc("publish_failures_total")
+        raise
+    publishMetrics.inc("publish_success_total")
+    publishMetrics.inc("published_files_total", len(payload.files))
+    return json_response
+
+
+def _publish_file(payload, body, outcome=None):
     app_logger.info("Publishing file . . .")
     access_token = rdpToken.getToken()
 
-    url = "{}/{}/{}/bulk-publish".format(rdpToken.base_URL, file_distribution_url, file_distribution_version)
+    # shared by every worker, waits while the server asks clients to slow down
+    rate_limiter = rateLimiter.get_rate_limiter()
+    # fails fast, or waits, while the API keeps failing
+    circuit_breaker = circuitBreaker.get_circuit_breaker()
+    if circuit_breaker is not None:
+        with publishMetrics.timer("circuit_breaker_wait"):
+            circuit_breaker.acquire()
+    with publishMetrics.timer("rate_limit_wait"):
+        rate_limiter.acquire()
+    with publishMetrics.timer("http_request"):
+        try:
+            response = httpSession.get_session().post(get_publish_url(),
+                                                      data=body,
+                                                      headers=get_publish_headers(access_token))
+            if response.status_code == 401:
+                # token revoked or expired early, sent once more with a renewed token
+                access_token = rdpToken.renewRejectedToken(access_token)
+                response = httpSession.get_session().post(get_publish_url(),
+                                                          data=body,
+                                                          headers=get_publish_headers(access_token))
+        except Exception:
+            if circuit_breaker is not None:
+                circuit_breaker.on_response(None)
+            raise
+    record_response_metrics(response.status_code, len(body))
+    if outcome is not None:
+        outcome["status_code"] = response.status_code
+    rate_limiter.on_response(response.status_code, response.headers)
+    if circuit_breaker is not None:
+        circuit_breaker.on_response(response.status_code)
+    try:
+        return handle_publish_response(response.status_code, response.text, payload, body)
+    except CFSServerException as err:
+        err.throttled = circuitBreaker.is_throttled(response.status_code, response.headers)
+        raise
+
+
+def record_response_metrics(status_code, body_size):
+    publishMetrics.inc("publish_requests_total")
+    publishMetrics.inc("bytes_sent_total", body_size)
+    if status_code == 429:
+        publishMetrics.inc("http_429_total")
+    elif status_code >= 500:
+        publishMetrics.inc("http_5xx_total")
 
-    headers = {
+
+def get_publish_url():
+    return "{}/{}/{}/bulk-publish".format(rdpToken.base_URL, file_distribution_url, file_distribution_version)
+
+
+def get_publish_headers(access_token):
+    return {
         "Authorization": "Bearer {}".format(access_token),
         "Content-Type": "application/json"
     }
-    response = requests.post(url,
-                             json=payload,
-                             headers=headers)
 
-    if response.status_code == 201:
-        json_response = json.loads(response.text)
+
+# -----------------------------------------------------------
+# Print publish result, raise exception when publish failed
+# -----------------------------------------------------------
+def handle_publish_response(status_code, response_text, payload, body=None):
+    if is_json_format():
+        return _handle_publish_response_json(status_code, response_text, payload, body)
+
+    if status_code == 201:
+        json_response = json.loads(response_text)
         app_logger.info("****************** Publish file successfully *******************")
         app_logger.info("------------------- File Publication Result --------------------")
         print_json_format(json_response)
         app_logger.info("----------------------------------------------------------------")
+        return json_response
     # 429: too many request | 500: internal error
-    elif response.status_code == 429 or response.status_code>= 500:
+    elif status_code == 429 or status_code >= 500:
         app_logger.info("-------------------- File Publication Error --------------------")
         app_logger.info("Failed to publish file, retry to publish again")
         try:
-            json_response = json.loads(response.text)
+            json_response = json.loads(response_text)
             print_json_format(json_response)
         except JSONDecodeError as e:
             # log in plain value
-            app_logger.error(f"Got status code {response.status_code}, message: {response.text}")
-            error_logger.error(f"Got status code {response.status_code}, message: {response.text}")
+            app_logger.error(f"Got status code {status_code}, message: {response_text}")
+            error_logger.error(f"Got status code {status_code}, message: {response_text}")
         finally:
             app_logger.info("----------------------------------------------------------------")
-            raise CFSServerException("Failed to publish file", payload, response.text)
+            raise CFSServerException("Failed to publish file", payload, response_text, body)
     else:
         app_logger.info("-------------------- File Publication Error --------------------")
-        app_logger.info("Failed to publish file, got status code {} !!!".format(response.status_code))
+        app_logger.info("Failed to publish file, got status code {} !!!".format(status_code))
         try:
-            json_response = json.loads(response.text)
+            json_response = json.loads(response_text)
             print_json_format(json_response)
         except JSONDecodeError as e:
             # log in plain value
-            app_logger.error(f"Got status code {response.status_code}, message: {response.text}")
-            error_logger.error(f"Got status code {response.status_code}, message: {response.text}")
+            app_logger.error(f"Got status code {status_code}, message: {response_text}")
+            error_logger.error(f"Got status code {status_code}, message: {response_text}")
         finally:
             app_logger.info("----------------------------------------------------------------")
-            raise CFSInvalidInputException("Failed to publish file", payload, response.text)
+            raise CFSInvalidInputException("Failed to publish file", payload, response_text, body)
 
 
 # -----------------------------------------------------------
-# Mapping user request to File request schema
+# Structured log format, one record per publish
 # -----------------------------------------------------------
-def modify_file_request(user_request):
-    files = []
-
-    file_payload = {
-        "fileType": "file",
-        "storageLocation": {
-            "url": "",
-            "@type": "s3",
-            "roleArn": ""
-        },
-        "filename": "",
-        "description": "",
-        "fileSizeInBytes": 0
-    }
+def _handle_publish_response_json(status_code, response_text, payload, body=None):
+    try:
+        json_response = json.loads(response_text)
+    except JSONDecodeError:
+        json_response = response_text
+    publish_record = {"status_code": status_code, "files": len(payload.files), "response": json_response}
+
+    if status_code == 201:
+        app_logger.info("Publish file successfully", extra={"publish": publish_record})
+        return json_response
+    # 429: too many request | 500: internal error
+    elif status_code == 429 or status_code >= 500:
+        app_logger.warning("Failed to publish file, retry to publish again", extra={"publish": publish_record})
+        raise CFSServerException("Failed to publish file", payload, response_text, body)
+    else:
+        app_logger.error("Failed to publish file", extra={"publish": publish_record})
+        error_logger.error("Failed to publish file", extra={"publish": publish_record})
+        raise CFSInvalidInputException("Failed to publish file", payload, response_text, body)
+
 
+# -----------------------------------------------------------
+# Mapping user request to file entries of File request schema
+# -----------------------------------------------------------
+def modify_file_request(user_request):
     if "files" in user_request:
-        for file_input in user_request["files"]:
-            file_request = copy.deepcopy(file_payload)
-            file_request["storageLocation"]["url"] = file_input["s3url"]
-            file_request["filename"] = file_input["filename"]
+        return user_request["files"]
 
-            if "rolearn" in file_input:
-                file_request["storageLocation"]["roleArn"] = file_input["rolearn"]
-            else:
-                del file_request["storageLocation"]["roleArn"]
+    files = [create_file_entry(user_request)]
+    if "localdir" in user_request:
+        files = list(iter_file_digests(files, user_request["localdir"]))
+    return files
 
-            if "description" in file_input:
-                file_request["description"] = file_input["description"]
-            else:
-                del file_request["description"]
 
-            if "filesizeinbytes" in file_input:
-                file_request["fileSizeInBytes"] = int(file_input["filesizeinbytes"])
-            else:
-                del file_request["fileSizeInBytes"]
+# -----------------------------------------------------------
+# File entry of single file arguments
+# -----------------------------------------------------------
+def create_file_entry(user_request):
+    filesizeinbytes = user_request.get("filesizeinbytes")
+    return FileEntry(filename=user_request["filename"],
+                     s3url=user_request["s3url"],
+                     rolearn=user_request.get("roleArn"),
+                     description=user_request.get("description"),
+                     filesizeinbytes=int(filesizeinbytes) if filesizeinbytes is not None else None)
 
-            files.append(file_request)
-    else:
-        file_payload["storageLocation"]["url"] = user_request["s3url"]
-        file_payload["filename"] = user_request["filename"]
 
-        if "roleArn" in user_request:
-            file_payload["storageLocation"]["roleArn"] = user_request["roleArn"]
-        else:
-            del file_payload["storageLocation"]["roleArn"]
+# -----------------------------------------------------------
+# Create payload from user request to publish file
+# -----------------------------------------------------------
+@publishMetrics.timer("create_payload")
+def create_payload(user_request):
+    return FilesetRequest.from_user_request(user_request, modify_file_request(user_request))
 
-        if "description" in user_request:
-            file_payload["description"] = user_request["description"]
-        else:
-            del file_payload["description"]
 
-        if "filesizeinbytes" in user_request:
-            file_payload["fileSizeInBytes"] = int(user_request["filesizeinbytes"])
+# -----------------------------------------------------------
+# File-set level fields of payload, shared by every file
+# -----------------------------------------------------------
+def create_payload_header(user_request):
+    return FilesetRequest.from_user_request(user_request).header()
+
+
+# -----------------------------------------------------------
+# Content hash of a file entry as it is sent to bulk-publish API
+# -----------------------------------------------------------
+def create_file_entry_key(payload_header, file_input):
+    file_entry = {"fileset": payload_header, "file": file_input.to_dict()}
+    canonical_entry = json.dumps(file_entry, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical_entry.encode("utf-8")).hexdigest()
+
+
+# -----------------------------------------------------------
+# Split file list into chunks accepted by bulk-publish API
+# -----------------------------------------------------------
+def split_chunks(files, chunk_size):
+    chunk = []
+    for file_input in files:
+        chunk.append(file_input)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+# -----------------------------------------------------------
+# Publish a chunk of files and measure the elapsed time
+# -----------------------------------------------------------
+def publish_chunk(chunk_id, user_request, files, journal_run=None, publish_cache=None, body=None, keys=None,
+                  result_sink=None):
+    chunk_request = dict(user_request)
+    chunk_request["files"] = files
+    result = {
+        "chunk": chunk_id,
+        "files": len(files),
+        "status": "success",
+        "duration": 0.0,
+        "error": "",
+        # status code of the last response and number of requests sent
+        "status_code": None,
+        "attempts": 0
+    }
+    json_response = None
+
+    start_time = time.perf_counter()
+    try:
+        app_logger.info("Publishing chunk {} ({} files) . . .".format(chunk_id, len(files)))
+        if journal_run is not None:
+            journal_run.update_chunk(chunk_id, publishJournal.IN_FLIGHT)
+        json_response = publish_file(create_payload(chunk_request), body, result)
+        if journal_run is not None:
+            journal_run.update_chunk(chunk_id, publishJournal.PUBLISHED, json_response)
+        if publish_cache is not None:
+            if keys is None:
+                payload_header = create_payload_header(user_request)
+                keys = [create_file_entry_key(payload_header, file_input) for file_input in files]
+            publish_cache.mark_published(keys)
+    except Exception as err:
+        error_logger.error(err, exc_info=True)
+        result["status"] = "failed"
+        result["error"] = "{}: {}".format(type(err).__name__, str(err).splitlines()[0])
+        if journal_run is not None:
+            journal_run.update_chunk(chunk_id, publishJournal.FAILED, getattr(err, "result", None) or result["error"])
+    end_time = time.perf_counter()
+    result["duration"] = end_time - start_time
+    publishMetrics.record_phase("publish_chunk", start_time, end_time, chunk_trace_args(result, files))
+    if result_sink is not None:
+        result_sink.add_chunk(user_request["filesetname"], result, files, json_response)
+    return result
+
+
+def chunk_trace_args(result, files):
+    return {"chunk": result["chunk"], "status": result["status"],
+            "files": [file_input.filename for file_input in files]}
+
+
+# -----------------------------------------------------------
+# Combined result of all published chunks
+# -----------------------------------------------------------
+class PublishReport:
+    """Keeps totals and failed chunks only, so memory does not grow with the manifest size"""
+
+    def __init__(self):
+        self.chunks = 0
+        self.succeeded_chunks = 0
+        self.published_files = 0
+        self.failed_results = []
+        self.skipped_files = 0
+        self.cache_hits = None
+        self.cache_misses = None
+        # shards prepared by worker processes (--workers)
+        self.shards = None
+        self.prepared_files = 0
+        self.start_time = time.perf_counter()
+
+    def add(self, result):
+        self.chunks += 1
+        if result["status"] == "success":
+            self.succeeded_chunks += 1
+            self.published_files += result["files"]
         else:
-            del file_payload["fileSizeInBytes"]
-        files.append(file_payload)
+            self.failed_results.append(result)
+        app_logger.info("Chunk report {:<8} {:<8} {:<10} {:<10} {}".format(
+            result["chunk"], result["files"], result["status"], "{:.3f}s".format(result["duration"]), result["error"]))
+
+    def print_report(self):
+        app_logger.info("------------------ Bulk Publication Report ---------------------")
+        app_logger.info("\t{:<15} : {}/{} succeeded, {} files published".format(
+            "chunks", self.succeeded_chunks, self.chunks, self.published_files))
+        if self.shards is not None:
+            app_logger.info("\t{:<15} : {} shards, {} files prepared".format("workers", self.shards,
+                                                                              self.prepared_files))
+        if self.skipped_files > 0:
+            app_logger.info("\t{:<15} : {} files already published".format("skipped", self.skipped_files))
+        if self.cache_hits is not None:
+            app_logger.info("\t{:<15} : {} hits (duplicate files not sent), {} misses".format(
+                "publish cache", self.cache_hits, self.cache_misses))
+            if self.cache_hits > 0 and self.published_files == 0:
+                app_logger.warning("\t{:<15} : every file was skipped by the publish cache, use --force-republish "
+                                   "to send them again".format("publish cache"))
+        app_logger.info("\t{:<15} : {:.3f}s".format("elapsed time", time.perf_counter() - self.start_time))
+        for result in sorted(self.failed_results, key=lambda failed_result: failed_result["chunk"]):
+            app_logger.info("\t{:<15} : chunk {} ({} files) {}".format(
+                "failed", result["chunk"], result["files"], result["error"]))
+        app_logger.info("----------------------------------------------------------------")
+
+
+# -----------------------------------------------------------
+# Publish files in chunks concurrently through a worker pool
+# -----------------------------------------------------------
+def publish_chunks(user_request, chunk_size=None, max_concurrency=None, journal_run=None, publish_cache=None,
+                   result_sink=None):
+    from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+    config_chunk_size, config_max_concurrency = get_publish_config()
+    chunk_size = chunk_size or config_chunk_size
+    max_concurrency = max_concurrency or config_max_concurrency
+
+    # fetch the token once, so workers do not race to request a new one
+    rdpToken.getToken()
+
+    report = PublishReport()
+    app_logger.info("Chunk report {:<8} {:<8} {:<10} {:<10} {}".format("chunk", "files", "status", "duration", "error"))
+    try:
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            pending = set()
+            # files can be a generator, chunks are read only when a worker is about to be free
+            files_to_publish = iter_files(user_request, journal_run, publish_cache, result_sink)
+            for chunk_id, files in enumerate(split_chunks(files_to_publish, chunk_size), start=1):
+                if len(pending) >= max_concurrency * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        report.add(future.result())
+                if journal_run is not None:
+                    journal_run.add_chunk(chunk_id, files)
+                pending.add(executor.submit(publish_chunk, chunk_id, user_request, files, journal_run, publish_cache,
+                                            result_sink=result_sink))
+            done, pending = wait(pending)
+            for future in done:
+                report.add(future.result())
+    finally:
+        update_report(report, journal_run, publish_cache)
+        report.print_report()
+    return report
+
+
+def update_report(report, journal_run=None, publish_cache=None):
+    if journal_run is not None:
+        report.skipped_files = journal_run.skipped_files
+    if publish_cache is not None:
+        report.cache_hits = publish_cache.hits
+        report.cache_misses = publish_cache.misses
+
+
+# -----------------------------------------------------------
+# Files of user request, without files already published
+# -----------------------------------------------------------
+def iter_files(user_request, journal_run=None, publish_cache=None, result_sink=None):
+    files = iter(user_request["files"])
+    # on resume, skip files confirmed in the journal
+    if journal_run is not None:
+        files = journal_run.filter_published(files, record_skipped(user_request, result_sink, SKIPPED_BY_JOURNAL))
+    # md5 and size of local copies, part of the publish cache key
+    if "localdir" in user_request:
+        files = iter_file_digests(files, user_request["localdir"])
+    # skip identical file entries published before
+    if publish_cache is not None:
+        payload_header = create_payload_header(user_request)
+        files = publish_cache.filter_published(files,
+                                               lambda file_input: create_file_entry_key(payload_header, file_input),
+                                               record_skipped(user_request, result_sink, SKIPPED_BY_CACHE))
     return files
 
 
 # -----------------------------------------------------------
-# Create payload from user request to publish file
+# Write the skipped record of a file to the result file, None without result file
 # -----------------------------------------------------------
-def create_payload(user_request):
-    
-    files = modify_file_request(user_request)
-    payload = {
-        "filesetName": user_request["filesetname"],
-        "bucketName": user_request["bucketname"],
-        "packageId": user_request["packageid"],
-        "files": files
-    }
+def record_skipped(user_request, result_sink, reason):
+    if result_sink is None:
+        return None
+    return lambda file_input: result_sink.add_skipped(user_request["filesetname"], file_input, reason)
+
+
+# -----------------------------------------------------------
+# Files with md5 and size of their local copy in local_dir
+# -----------------------------------------------------------
+def iter_file_digests(files, local_dir):
+    # deferred, only runs with --localdir hash files
+    import fileDigest
+
+    config = get_config()
+    cache_file = config.get(DIGEST_CONFIG_KEY, "CACHE_FILE", fallback="digest_cache.db")
+    with fileDigest.FileDigests(local_dir, cache_file=cache_file,
+                                workers=config.getint(DIGEST_CONFIG_KEY, "WORKERS", fallback=0),
+                                batch_size=config.getint(DIGEST_CONFIG_KEY, "BATCH_SIZE", fallback=1000),
+                                read_bytes=config.getint(DIGEST_CONFIG_KEY, "READ_BYTES",
+                                                         fallback=fileDigest.READ_BYTES)) as file_digests:
+        yield from file_digests.apply(files)
+        app_logger.info("Local file digests: {} files hashed, {} from digest cache".format(file_digests.hashed,
+                                                                                           file_digests.cached))
+
 
-    # Optional Field
-    if "rolearn" in user_request:
-        payload["rolearn"] = user_request["rolearn"]
-    if "availablefrom" in user_request:
-        payload["availableFrom"] = user_request["availablefrom"]
-    if "availableto" in user_request:
-        payload["availableTo"] = user_request["availableto"]
-    if "contentfrom" in user_request:
-        payload["contentFrom"] = user_request["contentfrom"]
-    if "contentto" in user_request:
-        payload["contentTo"] = user_request["contentto"]
-    if "attributes" in user_request:
-        payload["attributes"] = user_request["attributes"]
-    return payload
+# -----------------------------------------------------------
+# Open publish cache if enabled on global configuration file
+# -----------------------------------------------------------
+def create_publish_cache(force_republish=False):
+    config = get_config()
+    if not config.getboolean(CACHE_CONFIG_KEY, "ENABLED", fallback=False):
+        return None
+    return publishCache.PublishCache(config.get(CACHE_CONFIG_KEY, "CACHE_FILE", fallback="publish_cache.db"),
+                                     ttl=config.getfloat(CACHE_CONFIG_KEY, "TTL", fallback=86400),
+                                     max_entries=config.getint(CACHE_CONFIG_KEY, "MAX_ENTRIES", fallback=1000000),
+                                     force=force_republish)
+
+
+# -----------------------------------------------------------
+# Open result file, result_file overrides RESULT_FILE of global configuration file
+# -----------------------------------------------------------
+def create_result_sink(result_file=None):
+    config = get_config()
+    result_file = result_file or config.get(RESULT_CONFIG_KEY, "RESULT_FILE", fallback="")
+    if not result_file:
+        return None
+    # deferred, only runs writing a result file need it
+    import resultSink
+    return resultSink.ResultSink(result_file, config.get(RESULT_CONFIG_KEY, "RECORD", fallback="file").lower(),
+                                 flush_interval=config.getfloat(RESULT_CONFIG_KEY, "FLUSH_INTERVAL", fallback=1.0),
+                                 buffer_size=config.getint(RESULT_CONFIG_KEY, "BUFFER_SIZE", fallback=1024 * 1024))
 
 
 # -----------------------------------------------------------
 # Read current user from save to config file
 # -----------------------------------------------------------
 def load_current_user():
-    user_object = None
-    try:
-        '''
-        {
-            "username": "GE-XXX"
-        }
-        '''
-        # read the token from a file
-        tf = open("current_user.json", "r+")
-        user_object = json.load(tf)["username"]
-        tf.close()
+    user_object = rdpToken.tokenStore.readUser()
+    if user_object is not None:
         app_logger.info("successfully get current user: {}".format(user_object))
-    except Exception:
-        pass
 
     return user_object
 
@@ -225,11 +578,39 @@ def load_current_user():
 # -----------------------------------------------------------
 # Read user input and checking user option for publish file
 # -----------------------------------------------------------
-def read_args():
+def read_args(args=None):
+    try:
+        if args is not None and args.profile:
+            # imported on demand, cProfile and pstats are only needed for --profile
+            import publishProfiler
+            with publishProfiler.PublishProfiler(args.profile) as profiler:
+                with publishMetrics.timer("read_args"):
+                    _read_args(args)
+            app_logger.info("Profile written to {}".format(", ".join(profiler.output_files)))
+        else:
+            with publishMetrics.timer("read_args"):
+                _read_args(args)
+    finally:
+        write_metrics_snapshot(args.metrics if args is not None else None)
+
+
+def _read_args(args=None):
     try:
         app_logger.info("################################################################")
         # Read arguments from command line
-        args = parser.parse_args()
+        if args is None:
+            args = parser.parse_args()
+        chunk_size, max_concurrency = get_publish_config()
+        if args.maxconcurrency:
+            max_concurrency = int(args.maxconcurrency)
+
+        # daemon option
+        if args.daemon:
+            import publisherDaemon
+            spool_dir = args.spool if args.spool else get_config().get(DAEMON_CONFIG_KEY, "SPOOL_DIR", fallback="spool")
+            poll_interval = float(get_config().get(DAEMON_CONFIG_KEY, "POLL_INTERVAL", fallback=5))
+            publisherDaemon.run_daemon(spool_dir, max_concurrency, poll_interval)
+            return
 
         user_request = {}
         # Validate global file
@@ -237,8 +618,15 @@ def read_args():
         validate_global_config(user_request)
         app_logger.info("Validation result for {}  : passed".format(GLOBAL_CONFIG_FILE))
 
+        # manifest file option
+        if args.manifest:
+            # Validate require input, files are validated while they are published
+            app_logger.info("Validating user arguments for manifest {} . . .".format(args.manifest))
+            validate_manifest_argument(args, user_request)
+            app_logger.info("Validation result for {}  : passed".format("user arguments"))
+
         # file input option
-        if args.config:
+        elif args.config:
             # Validate require input
             app_logger.info("Validating {} . . .".format(args.config))
             validate_config(args.config, user_request)
@@ -251,14 +639,27 @@ def read_args():
             app_logger.info("Validation result for {}  : passed".format("user arguments"))
 
         app_logger.info("---------------- File Publication Request ----------------")
-        print_json_format(user_request)
+        request_summary = dict(user_request)
+        if args.manifest:
+            request_summary["files"] = "streamed from {}".format(args.manifest)
+        elif "files" in request_summary:
+            # large manifests are summarized instead of logging every file
+            request_summary["files"] = "{} files".format(len(user_request["files"]))
+        if args.localdir:
+            request_summary["localdir"] = args.localdir
+        print_json_format(request_summary, "File Publication Request")
         app_logger.info("----------------------------------------------------------")
 
-        app_logger.info("Creating user payload . . .")
-        payload = create_payload(user_request)
-        app_logger.info("User payload are created!!")
-
-        publish_file(payload)
+        # imported on demand, publisher imports this module
+        from publisher import Publisher
+        # md5 and size are computed from local copies while files are published
+        with Publisher(max_concurrency, chunk_size, "asyncio" if args.asyncio else "thread", args.journal,
+                       args.resume, args.forcerepublish, args.localdir,
+                       workers=int(args.workers) if args.workers else None, result_file=args.results) as publisher:
+            result = publisher.publish(user_request)
+        if result.error:
+            app_logger.info("program exit")
+            return
         app_logger.info("################################################################")
 
     except Exception as err:
@@ -267,6 +668,20 @@ def read_args():
         app_logger.info("program exit")
 
 
+# -----------------------------------------------------------
+# Write metrics of the run, snapshot_file overrides SNAPSHOT_FILE of global configuration file
+# -----------------------------------------------------------
+def write_metrics_snapshot(snapshot_file=None):
+    snapshot_file = snapshot_file or get_config().get(METRICS_CONFIG_KEY, "SNAPSHOT_FILE", fallback="")
+    if snapshot_file:
+        try:
+            publishMetrics.write_snapshot(snapshot_file)
+            app_logger.info("Metrics snapshot written to {}".format(snapshot_file))
+        except OSError as err:
+            app_logger.error(err, exc_info=True)
+            error_logger.error(err, exc_info=True)
+
+
 if __name__ == "__main__":
     description = """File Distribution Publication Tool description
     1) publish single file
@@ -286,6 +701,37 @@ if __name__ == "__main__":
 
     3) publish multiple file
     - python publishFile.py -c config.ini`
+
+    4) publish multiple file with 8 concurrent requests
+    - python publishFile.py -c config.ini -mc 8
+
+    5) publish multiple file from a large manifest file (.csv or .jsonl)
+    - python publishFile.py -fs <file-set name> -m files.csv
+
+    6) publish multiple file with the asyncio engine and 200 requests in flight
+    - python publishFile.py -fs <file-set name> -m files.csv -mc 200 --asyncio
+
+    7) run as daemon, publish every configuration file dropped into the spool directory
+    - python publishFile.py --daemon --spool spool
+
+    8) record a journal of the run, then resume it after an interruption
+    - python publishFile.py -fs <file-set name> -m files.csv -j journal.db
+    - python publishFile.py -fs <file-set name> -m files.csv -j journal.db --resume
+
+    9) profile a run, cProfile stats and Chrome trace timeline are written to the profile directory
+    - python publishFile.py -fs <file-set name> -m files.csv --profile profile
+
+    10) publish md5 and size of every file, computed from local copies in the data directory
+    - python publishFile.py -fs <file-set name> -m files.csv --localdir data
+
+    11) publish a large manifest file, parsed and encoded by 4 worker processes
+    - python publishFile.py -fs <file-set name> -m files.csv --workers 4
+
+    12) write the result of every published file to results.jsonl (or results.csv)
+    - python publishFile.py -fs <file-set name> -m files.csv --results results.jsonl
+
+    13) write the metrics of the run to metrics.prom (Prometheus text) or metrics.json
+    - python publishFile.py -fs <file-set name> -m files.csv --metrics metrics.prom
     """
 
     # Initialize parser
@@ -295,6 +741,8 @@ if __name__ == "__main__":
 
     parser.add_argument("-c", "--config", help="specify your configuration file")
 
+    parser.add_argument("-m", "--manifest", help="specify your manifest file (.csv or .jsonl) with one file per row")
+
     parser.add_argument("-fs", "--filesetname", help="specify file-set name")
 
     parser.add_argument("-fn", "--filename", help="specify file name")
@@ -317,19 +765,58 @@ if __name__ == "__main__":
 
     parser.add_argument("-sb", "--filesizeinbytes", help="specify file size in bytes")
 
+    parser.add_argument("-mc", "--maxconcurrency", help="specify maximum number of chunks published concurrently")
+
+    parser.add_argument("--asyncio", action="store_true",
+                        help="publish chunks with the asyncio engine (requires aiohttp), used with -c or -m")
+
+    parser.add_argument("-j", "--journal", help="specify journal file recording the state of every published file")
+
+    parser.add_argument("--resume", action="store_true",
+                        help="publish only files not confirmed as published in the journal, used with -c or -m")
+
+    parser.add_argument("--force-republish", dest="forcerepublish", action="store_true",
+                        help="publish file entries again even if the publish cache has them as published")
+
+    parser.add_argument("--profile", nargs="?", const="profile",
+                        help="profile the run, write cProfile stats and a Chrome trace timeline to this directory "
+                             "(default: profile)")
+
+    parser.add_argument("--localdir",
+                        help="compute md5 and file size of every file from its local copy in this directory")
+
+    parser.add_argument("-w", "--workers",
+                        help="specify number of worker processes parsing and encoding the manifest, used with -m")
+
+    parser.add_argument("--results",
+                        help="specify result file (.jsonl or .csv) receiving one record per published file")
+
+    parser.add_argument("--metrics",
+                        help="specify metrics snapshot file (.prom or .json) written when the run ends")
+
+    parser.add_argument("--daemon", action="store_true",
+                        help="stay resident and publish configuration files dropped into the spool directory")
+
+    parser.add_argument("--spool", help="specify spool directory of daemon mode, overrides SPOOL_DIR in global.ini")
+
+    # parse arguments before touching configuration or token files, -h exits here
+    args = parser.parse_args()
+
     try:
         username = rdpToken._loadCredentialsFromFile()
-        user_results = load_current_user()
-        if user_results is None or str(user_results).strip() == '' or str(user_results) != username:
-            if os.path.exists("token.txt"):
-                app_logger.info(
-                    "Remove token.txt because user_results {} match with criteria compare with {}".format(user_results,
-                                                                                                          username))
-                os.remove("token.txt")
+        # hold the token store lock, other processes may be saving a token right now
+        with rdpToken.tokenStore.lock():
+            user_results = load_current_user()
+            if user_results is None or str(user_results).strip() == '' or str(user_results) != username:
+                if os.path.exists(rdpToken.TOKEN_FILE):
+                    app_logger.info(
+                        "Remove token.txt because user_results {} match with criteria compare with {}".format(
+                            user_results, username))
+                    rdpToken.tokenStore.remove()
     except Exception as err:
         app_logger.error(err, exc_info=True)
         error_logger.error(err, exc_info=True)
 
-    read_args()
+    read_args(args)
 
 
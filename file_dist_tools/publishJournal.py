@@ -0,0 +1,166 @@
+#=============================================================================
+# Durable publish journal backed by SQLite
+#   - every chunk and file is recorded with its state: pending, in-flight, published or failed,
+#     the server response and a timestamp
+#   - files are keyed on bucket, package, file-set, file name, s3url and position, so a resumed run
+#     (--resume) only sends files which were not confirmed as published
+#   - position is the byte offset of the manifest record, the same with or without --workers,
+#     or the index of the file in the request, a file listed twice has two entries
+#   - a file whose position changed, e.g. the manifest was edited, is skipped when all its
+#     entries are published
+#=============================================================================
+import json
+import sqlite3
+import threading
+import time
+
+PENDING = "pending"
+IN_FLIGHT = "in-flight"
+PUBLISHED = "published"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_key TEXT NOT NULL,
+    resumed INTEGER NOT NULL,
+    started_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    run_id INTEGER NOT NULL,
+    chunk_no INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    file_count INTEGER NOT NULL,
+    response TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (run_id, chunk_no)
+);
+CREATE TABLE IF NOT EXISTS files (
+    run_key TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    s3url TEXT NOT NULL,
+    position INTEGER NOT NULL DEFAULT -1,
+    run_id INTEGER NOT NULL,
+    chunk_no INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (run_key, filename, s3url, position)
+);
+CREATE INDEX IF NOT EXISTS files_chunk ON files (run_id, chunk_no);
+"""
+
+# journals written before files had a position column, their files have no known position
+MIGRATE_FILES_POSITION = """
+ALTER TABLE files RENAME TO files_v1;
+DROP INDEX IF EXISTS files_chunk;
+{schema}
+INSERT OR REPLACE INTO files (run_key, filename, s3url, run_id, chunk_no, state, updated_at)
+    SELECT run_key, filename, s3url, run_id, chunk_no, state, updated_at FROM files_v1;
+DROP TABLE files_v1;
+"""
+
+
+class PublishJournal:
+    def __init__(self, journal_file):
+        self.journal_file = journal_file
+        # one connection shared by all workers, access is serialized with a lock
+        self._connection = sqlite3.connect(journal_file, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        columns = [row[1] for row in self._connection.execute("PRAGMA table_info(files)")]
+        if "position" not in columns:
+            self._connection.executescript(MIGRATE_FILES_POSITION.format(schema=SCHEMA))
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def start_run(self, user_request, resume=False):
+        run_key = "{}/{}/{}".format(user_request["bucketname"], user_request["packageid"],
+                                    user_request["filesetname"])
+        with self._lock, self._connection:
+            cursor = self._connection.execute("INSERT INTO runs (run_key, resumed, started_at) VALUES (?, ?, ?)",
+                                              (run_key, int(resume), time.time()))
+        return JournalRun(self, cursor.lastrowid, run_key, resume)
+
+    def _execute(self, statements):
+        with self._lock, self._connection:
+            for sql, parameters in statements:
+                if isinstance(parameters, list):
+                    self._connection.executemany(sql, parameters)
+                else:
+                    self._connection.execute(sql, parameters)
+
+    def _is_published(self, run_key, filename, s3url, position):
+        with self._lock:
+            rows = self._connection.execute("SELECT position, state FROM files WHERE run_key = ? AND filename = ? "
+                                            "AND s3url = ?", (run_key, filename, s3url)).fetchall()
+        for row_position, state in rows:
+            if row_position == position:
+                return state == PUBLISHED
+        # position unknown, the file is published when every entry of it is
+        return len(rows) > 0 and all(state == PUBLISHED for _, state in rows)
+
+
+# -----------------------------------------------------------
+# Journal entries of one publish run
+# -----------------------------------------------------------
+class JournalRun:
+    def __init__(self, journal, run_id, run_key, resume):
+        self.journal = journal
+        self.run_id = run_id
+        self.run_key = run_key
+        self.resume = resume
+        self.skipped_files = 0
+        # index in the request of files read without manifest position, kept until their chunk is added
+        self._positions = {}
+
+    def filter_published(self, files, on_skipped=None):
+        for index, file_input in enumerate(files):
+            position = file_input.position if file_input.position is not None else index
+            # on resume, files confirmed by an earlier run are not sent again
+            if self.resume and self.journal._is_published(self.run_key, file_input.filename, file_input.s3url,
+                                                          position):
+                self.skipped_files += 1
+                if on_skipped is not None:
+                    on_skipped(file_input)
+                continue
+            if file_input.position is None:
+                # replaces the entry of a dropped file whose object id is reused
+                self._positions[id(file_input)] = index
+            yield file_input
+
+    def _position(self, file_input):
+        if file_input.position is not None:
+            return file_input.position
+        return self._positions.pop(id(file_input), -1)
+
+    def add_chunk(self, chunk_no, files):
+        now = time.time()
+        self.journal._execute([
+            ("INSERT OR REPLACE INTO chunks (run_id, chunk_no, state, file_count, response, updated_at) "
+             "VALUES (?, ?, ?, ?, NULL, ?)", (self.run_id, chunk_no, PENDING, len(files), now)),
+            ("INSERT OR REPLACE INTO files (run_key, filename, s3url, position, run_id, chunk_no, state, "
+             "updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+             [(self.run_key, file_input.filename, file_input.s3url, self._position(file_input), self.run_id,
+               chunk_no, PENDING, now) for file_input in files])
+        ])
+
+    def update_chunk(self, chunk_no, state, response=None):
+        if response is not None and not isinstance(response, str):
+            response = json.dumps(response)
+        now = time.time()
+        self.journal._execute([
+            ("UPDATE chunks SET state = ?, response = COALESCE(?, response), updated_at = ? "
+             "WHERE run_id = ? AND chunk_no = ?", (state, response, now, self.run_id, chunk_no)),
+            ("UPDATE files SET state = ?, updated_at = ? WHERE run_id = ? AND chunk_no = ?",
+             (state, now, self.run_id, chunk_no))
+        ])
@@ -0,0 +1,247 @@
+#=============================================================================
+# Process-wide counters, gauges and latency histograms of the publishing tools
+#   - rendered in Prometheus text format, served on /metrics in daemon mode
+#   - written to a snapshot file at the end of a CLI run
+#=============================================================================
+import contextvars
+import functools
+import json
+import threading
+import time
+
+METRIC_PREFIX = "file_dist_"
+PHASE_HISTOGRAM = "phase_duration_seconds"
+# seconds, from in-memory phases (payload building) to slow HTTP round trips with retries
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# callables receiving (phase, start_time, end_time, args) of every measured phase, e.g. the profiler timeline
+_phase_listeners = []
+# timeline lane of the current asyncio task, threads use their own id when not set
+current_lane = contextvars.ContextVar("current_lane", default=None)
+
+COUNTERS = {
+    "publish_requests_total": "Bulk-publish HTTP requests sent",
+    "publish_success_total": "Bulk-publish requests accepted by the API",
+    "publish_failures_total": "Bulk-publish calls failed after retries",
+    "publish_retries_total": "Bulk-publish requests retried",
+    "published_files_total": "Files published",
+    "http_429_total": "Bulk-publish requests answered with 429 Too Many Requests",
+    "http_5xx_total": "Bulk-publish requests answered with a server error",
+    "bytes_sent_total": "Bytes of bulk-publish request bodies sent",
+    "token_requests_total": "OAuth token requests (password or refresh grant)",
+    "token_rejected_total": "Bulk-publish requests answered with 401, sent again with a renewed token",
+    "cache_hits_total": "File entries skipped by the publish cache",
+    "cache_misses_total": "File entries not found in the publish cache",
+    "files_hashed_total": "Local files hashed for md5 (--localdir)",
+    "digest_cache_hits_total": "Local files with md5 taken from the digest cache",
+    "circuit_breaker_opened_total": "Times the circuit breaker opened on bulk-publish failures",
+    "circuit_breaker_rejected_total": "Bulk-publish calls failed fast while the circuit breaker was open",
+    "retry_budget_exhausted_total": "Bulk-publish calls not retried because the retry budget was used up"
+}
+
+GAUGES = {
+    "circuit_breaker_state": "Circuit breaker state of the bulk-publish path, 0 closed, 1 half-open, 2 open"
+}
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.bucket_counts[index] += 1
+                break
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.gauges = dict.fromkeys(GAUGES, 0)
+        # phase name -> Histogram
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, phase, seconds):
+        with self._lock:
+            histogram = self.phases.get(phase)
+            if histogram is None:
+                histogram = self.phases[phase] = Histogram()
+            histogram.observe(seconds)
+
+    # -----------------------------------------------------------
+    # Add counters and phases of a snapshot taken in another process
+    # -----------------------------------------------------------
+    def merge(self, snapshot):
+        with self._lock:
+            for name, value in snapshot["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for phase, phase_snapshot in snapshot["phases"].items():
+                histogram = self.phases.get(phase)
+                if histogram is None:
+                    histogram = self.phases[phase] = Histogram()
+                histogram.count += phase_snapshot["count"]
+                histogram.sum += phase_snapshot["sum_seconds"]
+                for index, upper_bound in enumerate(histogram.buckets):
+                    histogram.bucket_counts[index] += phase_snapshot["buckets"].get(upper_bound, 0)
+
+    # -----------------------------------------------------------
+    # Prometheus text exposition format
+    # -----------------------------------------------------------
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                metric = METRIC_PREFIX + name
+                lines.append("# HELP {} {}".format(metric, COUNTERS.get(name, name)))
+                lines.append("# TYPE {} counter".format(metric))
+                lines.append("{} {}".format(metric, value))
+            for name, value in sorted(self.gauges.items()):
+                metric = METRIC_PREFIX + name
+                lines.append("# HELP {} {}".format(metric, GAUGES.get(name, name)))
+                lines.append("# TYPE {} gauge".format(metric))
+                lines.append("{} {}".format(metric, value))
+
+            metric = METRIC_PREFIX + PHASE_HISTOGRAM
+            lines.append("# HELP {} Duration of publishing phases".format(metric))
+            lines.append("# TYPE {} histogram".format(metric))
+            for phase, histogram in sorted(self.phases.items()):
+                cumulative_count = 0
+                for upper_bound, bucket_count in zip(histogram.buckets, histogram.bucket_counts):
+                    cumulative_count += bucket_count
+                    lines.append('{}_bucket{{phase="{}",le="{}"}} {}'.format(metric, phase, upper_bound,
+                                                                             cumulative_count))
+                lines.append('{}_bucket{{phase="{}",le="+Inf"}} {}'.format(metric, phase, histogram.count))
+                lines.append('{}_sum{{phase="{}"}} {}'.format(metric, phase, histogram.sum))
+                lines.append('{}_count{{phase="{}"}} {}'.format(metric, phase, histogram.count))
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "phases": {phase: {"count": histogram.count,
+                                   "sum_seconds": histogram.sum,
+                                   "buckets": dict(zip(histogram.buckets, histogram.bucket_counts))}
+                           for phase, histogram in self.phases.items()}
+            }
+
+
+registry = MetricsRegistry()
+
+
+def inc(name, value=1):
+    registry.inc(name, value)
+
+
+def set_gauge(name, value):
+    registry.set(name, value)
+
+
+def observe(phase, seconds):
+    registry.observe(phase, seconds)
+
+
+def merge(snapshot):
+    registry.merge(snapshot)
+
+
+def add_phase_listener(listener):
+    _phase_listeners.append(listener)
+
+
+def remove_phase_listener(listener):
+    _phase_listeners.remove(listener)
+
+
+# -----------------------------------------------------------
+# Record a phase measured with time.perf_counter, args are only given to listeners
+# -----------------------------------------------------------
+def record_phase(phase, start_time, end_time, args=None):
+    registry.observe(phase, end_time - start_time)
+    for listener in _phase_listeners:
+        listener(phase, start_time, end_time, args)
+
+
+# -----------------------------------------------------------
+# Measure a phase, as context manager or function decorator
+# -----------------------------------------------------------
+class PhaseTimer:
+    def __init__(self, phase, args=None):
+        self.phase = phase
+        self.args = args
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        record_phase(self.phase, self.start_time, time.perf_counter(), self.args)
+
+    def __call__(self, function):
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record_phase(self.phase, start_time, time.perf_counter())
+        return timed_function
+
+
+def timer(phase, args=None):
+    return PhaseTimer(phase, args)
+
+
+# -----------------------------------------------------------
+# Write metrics snapshot, Prometheus text for .prom files, JSON otherwise
+# -----------------------------------------------------------
+def write_snapshot(snapshot_file):
+    with open(snapshot_file, "w") as sf:
+        if snapshot_file.lower().endswith(".prom"):
+            sf.write(registry.render())
+        else:
+            json.dump(registry.snapshot(), sf, indent=2)
+
+
+# -----------------------------------------------------------
+# Serve /metrics on a background thread
+# -----------------------------------------------------------
+def start_http_server(port, host="127.0.0.1"):
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class MetricsRequestHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            data = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="MetricsServer", daemon=True).start()
+    return server
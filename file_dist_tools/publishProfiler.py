@@ -0,0 +1,146 @@
+#=============================================================================
+# Profiling mode of publishFile.py (--profile)
+#   - cProfile of the main and worker threads, saved as a pstats dump
+#     (snakeviz, flameprof or gprof2dot can render it as a flame graph)
+#   - text summary of the slowest functions
+#   - Chrome trace-event timeline of every measured phase: validation,
+#     payload build, token, HTTP request, retry sleeps, one span per chunk
+#     with its file names (open with chrome://tracing or ui.perfetto.dev)
+#=============================================================================
+import json
+import os
+import sys
+import threading
+import time
+
+import publishMetrics
+
+# timeline events kept in memory, later events are counted as dropped
+MAX_TRACE_EVENTS = 1000000
+# cProfile uses sys.monitoring from Python 3.12, one profile sees every thread and a second one cannot be enabled
+PROFILE_PER_THREAD = sys.version_info < (3, 12)
+
+
+# -----------------------------------------------------------
+# Collect phases as Chrome trace "complete" events
+# -----------------------------------------------------------
+class TraceRecorder:
+    def __init__(self, max_events=MAX_TRACE_EVENTS):
+        self.max_events = max_events
+        self.events = []
+        self.dropped_events = 0
+        self.lanes = {}
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def record(self, phase, start_time, end_time, args=None):
+        lane_name = publishMetrics.current_lane.get()
+        if lane_name is None:
+            lane = threading.get_ident()
+            lane_name = threading.current_thread().name
+        else:
+            lane = lane_name
+
+        event = {
+            "name": phase,
+            "ph": "X",
+            "ts": (start_time - self.origin) * 1000000,
+            "dur": (end_time - start_time) * 1000000,
+            "pid": self.pid,
+            "tid": lane
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            if lane not in self.lanes:
+                self.lanes[lane] = lane_name
+            if len(self.events) >= self.max_events:
+                self.dropped_events += 1
+                return
+            self.events.append(event)
+
+    def write(self, trace_file):
+        with self._lock:
+            # lanes are numbered for the viewers, named with thread names or chunk slots
+            lane_ids = {lane: lane_id for lane_id, lane in enumerate(self.lanes, start=1)}
+            metadata = [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": lane_ids[lane],
+                         "args": {"name": lane_name}} for lane, lane_name in self.lanes.items()]
+            with open(trace_file, "w") as tf:
+                tf.write('{"displayTimeUnit": "ms", "otherData": ')
+                json.dump({"dropped_events": self.dropped_events}, tf)
+                tf.write(', "traceEvents": [\n')
+                for index, event in enumerate(metadata + self.events):
+                    if index > 0:
+                        tf.write(",\n")
+                    json.dump(dict(event, tid=lane_ids.get(event["tid"], event["tid"])), tf)
+                tf.write("\n]}\n")
+
+
+# -----------------------------------------------------------
+# Profile a run, files are written to output_dir on stop
+# -----------------------------------------------------------
+class PublishProfiler:
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.name = time.strftime("publish_%Y%m%d_%H%M%S")
+        self.recorder = TraceRecorder()
+        self.output_files = []
+        self._profile = None
+        self._thread_profiles = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _profile_thread(self, frame, event, arg):
+        # first profile event of a new thread, replaced by the thread's own cProfile
+        import cProfile
+        profile = cProfile.Profile()
+        self._thread_profiles.append(profile)
+        profile.enable()
+
+    def start(self):
+        import cProfile
+
+        publishMetrics.add_phase_listener(self.recorder.record)
+        if PROFILE_PER_THREAD:
+            # threads started from now on are profiled too
+            threading.setprofile(self._profile_thread)
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def stop(self):
+        import pstats
+
+        self._profile.disable()
+        if PROFILE_PER_THREAD:
+            threading.setprofile(None)
+        publishMetrics.remove_phase_listener(self.recorder.record)
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        base_name = os.path.join(self.output_dir, self.name)
+        stats = None
+        for profile in [self._profile] + self._thread_profiles:
+            profile.create_stats()
+            # pstats cannot load a profile without any call
+            if len(profile.stats) == 0:
+                continue
+            if stats is None:
+                stats = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+        with open(base_name + "_stats.txt", "w") as sf:
+            if stats is not None:
+                stats.dump_stats(base_name + ".pstats")
+                stats.stream = sf
+                stats.sort_stats("cumulative").print_stats(50)
+            else:
+                sf.write("No profiled calls\n")
+        self.recorder.write(base_name + "_trace.json")
+        self.output_files = ([base_name + ".pstats"] if stats is not None else []) + \
+            [base_name + "_stats.txt", base_name + "_trace.json"]
+        return self.output_files
@@ -0,0 +1,276 @@
+#=============================================================================
+# Publisher, library interface of the publication tools
+#   - holds the HTTP session, the token provider and the global configuration
+#     for a series of publishes, used as a context manager
+#   - publish and validate return PublishResult and ValidationResult objects,
+#     publishFile.py and the daemon are thin wrappers around it
+#
+#   from publisher import Publisher
+#   with Publisher(max_concurrency=8) as publisher:
+#       validation = publisher.validate(manifest="files.csv", filesetname="daily")
+#       if validation.valid:
+#           result = publisher.publish(validation.request)
+#=============================================================================
+import os
+import time
+
+import httpSession
+import publishJournal
+import rdpToken
+from exceptions import InvalidConfigurationException, ManifestValidationException
+from fileEntry import FilesetRequest
+from globalConfig import get_config
+from loggingFileDist import get_app_logger, get_error_logger
+from publishFile import (JOURNAL_CONFIG_KEY, create_file_entry, create_publish_cache, create_result_sink,
+                         publish_chunks)
+from validator import ManifestFiles, validate_config, validate_global_config, validate_manifest
+
+app_logger = get_app_logger("app_info")
+error_logger = get_error_logger("app_error")
+
+ENGINES = ("thread", "asyncio")
+
+
+def _error_text(err):
+    return "{}: {}".format(type(err).__name__, str(err).splitlines()[0])
+
+
+# -----------------------------------------------------------
+# Result of one file-set publish
+# -----------------------------------------------------------
+class PublishResult:
+    def __init__(self, filesetname=None, chunks=0, succeeded_chunks=0, published_files=0, skipped_files=0,
+                 cached_files=0, failed_chunks=None, error="", duration=0.0):
+        self.filesetname = filesetname
+        self.chunks = chunks
+        self.succeeded_chunks = succeeded_chunks
+        self.published_files = published_files
+        self.skipped_files = skipped_files
+        self.cached_files = cached_files
+        # chunk results of failed chunks, with chunk id, number of files, duration and error
+        self.failed_chunks = failed_chunks if failed_chunks is not None else []
+        # error stopping the publish before every chunk was sent
+        self.error = error
+        self.duration = duration
+
+    @classmethod
+    def from_report(cls, filesetname, report, duration=0.0):
+        return cls(filesetname, report.chunks, report.succeeded_chunks, report.published_files, report.skipped_files,
+                   report.cache_hits or 0,
+                   sorted(report.failed_results, key=lambda failed_result: failed_result["chunk"]),
+                   duration=duration)
+
+    @property
+    def success(self):
+        return self.error == "" and len(self.failed_chunks) == 0
+
+    @property
+    def status(self):
+        return "success" if self.success else "failed"
+
+    def __repr__(self):
+        return "PublishResult({})".format(self.to_dict())
+
+    def to_dict(self):
+        return {
+            "filesetname": self.filesetname,
+            "status": self.status,
+            "chunks": self.chunks,
+            "succeeded_chunks": self.succeeded_chunks,
+            "published_files": self.published_files,
+            "skipped_files": self.skipped_files,
+            "cached_files": self.cached_files,
+            "failed_chunks": self.failed_chunks,
+            "error": self.error,
+            "duration": self.duration
+        }
+
+
+# -----------------------------------------------------------
+# Result of validating a file-set request
+# -----------------------------------------------------------
+class ValidationResult:
+    def __init__(self, request=None, records=0, errors=None, error_count=0, error=""):
+        # user request ready to publish, None when validation failed
+        self.request = request
+        self.records = records
+        # (record number, message) tuples of invalid manifest records, the first ones only on huge manifests
+        self.errors = errors if errors is not None else []
+        self.error_count = error_count
+        self.error = error
+
+    @property
+    def valid(self):
+        return self.error == ""
+
+    def __repr__(self):
+        return "ValidationResult(valid={}, records={}, error_count={}, error={!r})".format(
+            self.valid, self.records, self.error_count, self.error)
+
+    def to_dict(self):
+        return {
+            "valid": self.valid,
+            "records": self.records,
+            "errors": [{"record": record_number, "message": message} for record_number, message in self.errors],
+            "error_count": self.error_count,
+            "error": self.error
+        }
+
+
+# -----------------------------------------------------------
+# Publish file-sets with one session, token and configuration
+# -----------------------------------------------------------
+class Publisher:
+    def __init__(self, max_concurrency=None, chunk_size=None, engine="thread", journal_file=None, resume=False,
+                 force_republish=False, local_dir=None, keep_token_warm=False, workers=None, result_file=None):
+        if engine not in ENGINES:
+            raise ValueError("Unknown publish engine \"{}\", should be {}".format(engine, " or ".join(ENGINES)))
+        # None uses MAX_CONCURRENCY and CHUNK_SIZE of the configuration current at each publish
+        self.max_concurrency = max_concurrency
+        self.chunk_size = chunk_size
+        self.engine = engine
+        self.journal_file = journal_file
+        self.resume = resume
+        self.force_republish = force_republish
+        self.local_dir = local_dir
+        self.keep_token_warm = keep_token_warm
+        # manifests are parsed, hashed and encoded by this number of worker processes
+        self.workers = workers
+        # None uses RESULT_FILE of [RESULT_CONFIG], results of every publish are appended to the same file
+        self.result_file = result_file
+        self.session = None
+        # background token refresher used by this publisher, shared with the other publishers of the process
+        self.token_refresher = None
+        self.journal = None
+        self.publish_cache = None
+        self.result_sink = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def config(self):
+        # parsed global.ini, parsed again when the file changes
+        return get_config()
+
+    def open(self):
+        if self.local_dir is not None and not os.path.isdir(self.local_dir):
+            raise InvalidConfigurationException(self.local_dir, "Local directory does not exist")
+
+        self.session = httpSession.get_session()
+        # renew the token in background if enabled, publishes never wait on OAuth
+        self.token_refresher = rdpToken.startTokenRefresher(force=self.keep_token_warm)
+        try:
+            self.publish_cache = create_publish_cache(self.force_republish)
+            self.result_sink = create_result_sink(self.result_file)
+            if self.journal_file or self.resume:
+                journal_file = self.journal_file or self.config.get(JOURNAL_CONFIG_KEY, "JOURNAL_FILE",
+                                                                    fallback="publish_journal.db")
+                app_logger.info("Recording publish journal to {}{}".format(
+                    journal_file, ", resuming unpublished files" if self.resume else ""))
+                self.journal = publishJournal.PublishJournal(journal_file)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        if self.token_refresher is not None:
+            rdpToken.stopTokenRefresher()
+            self.token_refresher = None
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        if self.publish_cache is not None:
+            self.publish_cache.close()
+            self.publish_cache = None
+        if self.result_sink is not None:
+            self.result_sink.close()
+            self.result_sink = None
+        self.session = None
+
+    def get_token(self):
+        return rdpToken.getToken()
+
+    # -----------------------------------------------------------
+    # Validate a configuration file (config.ini format) or a manifest file
+    # -----------------------------------------------------------
+    def validate(self, config=None, manifest=None, filesetname=None, **fields):
+        user_request = {}
+        try:
+            validate_global_config(user_request)
+            # file-set fields override the defaults of global.ini
+            user_request.update(fields)
+            if config is not None:
+                validate_config(config, user_request)
+                records = len(user_request["files"])
+            elif manifest is not None:
+                if filesetname is None:
+                    raise InvalidConfigurationException(manifest, "filesetname is required to publish a manifest")
+                user_request["filesetname"] = filesetname
+                records = validate_manifest(manifest)
+                # files are read one by one while publishing, or by worker processes
+                user_request["manifest"] = manifest
+                user_request["files"] = ManifestFiles(manifest)
+            else:
+                raise ValueError("Please specify a configuration file or a manifest file to validate")
+        except ManifestValidationException as err:
+            return ValidationResult(errors=err.errors, error_count=err.error_count, error=_error_text(err))
+        except Exception as err:
+            return ValidationResult(error=_error_text(err))
+        return ValidationResult(user_request, records)
+
+    # -----------------------------------------------------------
+    # Publish a FilesetRequest or a user request dict, failures are kept in the result
+    # -----------------------------------------------------------
+    def publish(self, fileset_request):
+        start_time = time.perf_counter()
+        filesetname = fileset_request.filesetname if isinstance(fileset_request, FilesetRequest) \
+            else fileset_request.get("filesetname")
+        try:
+            user_request = self._create_user_request(fileset_request)
+            journal_run = self.journal.start_run(user_request, self.resume) if self.journal is not None else None
+            if self.workers is not None and self.workers > 1 and "manifest" in user_request:
+                # imported on demand, only --workers runs start worker processes
+                import shardedPublish
+                report = shardedPublish.publish_shards(user_request, self.workers, self.chunk_size,
+                                                       self.max_concurrency, journal_run, self.publish_cache,
+                                                       self.result_sink)
+            elif self.engine == "asyncio":
+                # imported on demand, asyncio engine needs the optional aiohttp library
+                import asyncPublish
+                report = asyncPublish.run_publish_chunks(user_request, self.chunk_size, self.max_concurrency,
+                                                         journal_run, self.publish_cache, self.result_sink)
+            else:
+                report = publish_chunks(user_request, self.chunk_size, self.max_concurrency, journal_run,
+                                        self.publish_cache, self.result_sink)
+        except Exception as err:
+            app_logger.error(err, exc_info=True)
+            error_logger.error(err, exc_info=True)
+            return PublishResult(filesetname, error=_error_text(err), duration=time.perf_counter() - start_time)
+        return PublishResult.from_report(filesetname, report, time.perf_counter() - start_time)
+
+    # -----------------------------------------------------------
+    # Publish file-sets one after the other, results in request order
+    # -----------------------------------------------------------
+    def publish_many(self, fileset_requests):
+        return [self.publish(fileset_request) for fileset_request in fileset_requests]
+
+    def _create_user_request(self, fileset_request):
+        if isinstance(fileset_request, FilesetRequest):
+            fileset_request = fileset_request.to_user_request()
+        user_request = {}
+        # bucket, package and file-set defaults of global.ini, overridden by the request
+        validate_global_config(user_request)
+        user_request.update(fileset_request)
+        if "files" not in user_request:
+            if "filename" not in user_request or "s3url" not in user_request:
+                raise ValueError("File-set request \"{}\" has no files".format(user_request.get("filesetname")))
+            # single file fields, published as a chunk of one file
+            user_request["files"] = [create_file_entry(user_request)]
+        if self.local_dir is not None and "localdir" not in user_request:
+            user_request["localdir"] = self.local_dir
+        return user_request
@@ -0,0 +1,182 @@
+#=============================================================================
+# Long-running publisher watching a spool directory for manifests
+#   - configuration files (.ini, same format as config.ini) dropped into the spool
+#     directory are published with the warm HTTP session and token of this process
+#   - each manifest is moved to <spool>/done or <spool>/failed with a <name>.result.json file
+#   - new files are detected with inotify on Linux, the directory is polled every
+#     POLL_INTERVAL seconds otherwise, and also with inotify in case an event was missed
+#   Write manifests under another name (eg. .tmp) and rename them to .ini when complete
+#=============================================================================
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import shutil
+import signal
+import sys
+import threading
+import time
+
+import publishMetrics
+from loggingFileDist import get_app_logger, get_error_logger
+from globalConfig import get_config
+from publisher import Publisher, PublishResult
+from publishFile import METRICS_CONFIG_KEY
+
+app_logger = get_app_logger("app_info")
+error_logger = get_error_logger("app_error")
+
+MANIFEST_EXTENSION = ".ini"
+DONE_DIR = "done"
+FAILED_DIR = "failed"
+# seconds between two checks of the stop event while waiting
+STOP_CHECK_INTERVAL = 1.0
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CLOEXEC = 0o2000000
+
+
+# -----------------------------------------------------------
+# Wait for changes on spool directory with inotify or polling
+# -----------------------------------------------------------
+class SpoolWatcher:
+    def __init__(self, spool_dir, poll_interval):
+        self.spool_dir = spool_dir
+        self.poll_interval = poll_interval
+        self._inotify_fd = self._init_inotify()
+
+    def _init_inotify(self):
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            inotify_fd = libc.inotify_init1(IN_CLOEXEC)
+            if inotify_fd < 0:
+                return None
+            if libc.inotify_add_watch(inotify_fd, os.fsencode(self.spool_dir), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+                os.close(inotify_fd)
+                return None
+            app_logger.info("Watching {} with inotify".format(self.spool_dir))
+            return inotify_fd
+        except (OSError, AttributeError):
+            return None
+
+    # -----------------------------------------------------------
+    # Wait until the spool directory changed or POLL_INTERVAL passed, or stop_event is set
+    # -----------------------------------------------------------
+    def wait(self, stop_event):
+        deadline = time.monotonic() + self.poll_interval
+        while not stop_event.is_set():
+            timeout = min(deadline - time.monotonic(), STOP_CHECK_INTERVAL)
+            if timeout <= 0:
+                return
+            if self._inotify_fd is None:
+                stop_event.wait(timeout)
+                continue
+            readable, _, _ = select.select([self._inotify_fd], [], [], timeout)
+            if readable:
+                # events are not parsed, spool directory is scanned again
+                os.read(self._inotify_fd, 65536)
+                return
+
+    def close(self):
+        if self._inotify_fd is not None:
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+
+
+# -----------------------------------------------------------
+# Publish one manifest file and return its result
+# -----------------------------------------------------------
+def publish_manifest(manifest_file, publisher):
+    started = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    start_time = time.perf_counter()
+    validation = publisher.validate(config=manifest_file)
+    if validation.valid:
+        publish_result = publisher.publish(validation.request)
+    else:
+        app_logger.error(validation.error)
+        error_logger.error(validation.error)
+        publish_result = PublishResult(error=validation.error)
+
+    result = {"manifest": os.path.basename(manifest_file), "started": started}
+    result.update(publish_result.to_dict())
+    result["duration"] = time.perf_counter() - start_time
+    return result
+
+
+def _move_manifest(manifest_file, result):
+    target_dir = os.path.join(os.path.dirname(manifest_file), DONE_DIR if result["status"] == "success" else FAILED_DIR)
+    base_name = os.path.basename(manifest_file)
+    target_file = os.path.join(target_dir, base_name)
+    # keep earlier manifests with the same name
+    if os.path.exists(target_file):
+        base_name = "{}.{}".format(time.strftime("%Y%m%d%H%M%S"), base_name)
+        target_file = os.path.join(target_dir, base_name)
+    shutil.move(manifest_file, target_file)
+    with open(os.path.join(target_dir, base_name + ".result.json"), "w") as rf:
+        json.dump(result, rf, indent=2)
+    return target_file
+
+
+def _list_manifests(spool_dir):
+    manifests = []
+    for file_name in sorted(os.listdir(spool_dir)):
+        manifest_file = os.path.join(spool_dir, file_name)
+        if file_name.lower().endswith(MANIFEST_EXTENSION) and os.path.isfile(manifest_file):
+            manifests.append(manifest_file)
+    return manifests
+
+
+# -----------------------------------------------------------
+# Serve Prometheus metrics if HTTP_PORT is set on global configuration file
+# -----------------------------------------------------------
+def start_metrics_server():
+    config = get_config()
+    port = config.getint(METRICS_CONFIG_KEY, "HTTP_PORT", fallback=0)
+    if port <= 0:
+        return None
+    host = config.get(METRICS_CONFIG_KEY, "HTTP_HOST", fallback="127.0.0.1")
+    server = publishMetrics.start_http_server(port, host)
+    app_logger.info("Metrics served on http://{}:{}/metrics".format(host, port))
+    return server
+
+
+# -----------------------------------------------------------
+# Watch spool directory until SIGINT or SIGTERM
+# -----------------------------------------------------------
+def run_daemon(spool_dir, max_concurrency, poll_interval=5, stop_event=None):
+    stop_event = stop_event or threading.Event()
+    for sub_dir in (spool_dir, os.path.join(spool_dir, DONE_DIR), os.path.join(spool_dir, FAILED_DIR)):
+        os.makedirs(sub_dir, exist_ok=True)
+
+    if threading.current_thread() is threading.main_thread():
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signal_number, lambda signum, frame: stop_event.set())
+
+    # keep the token warm for the whole lifetime of the daemon, with the publish cache enabled
+    # a manifest dropped again only publishes its new or changed file entries
+    publisher = Publisher(max_concurrency, keep_token_warm=True)
+    publisher.open()
+    metrics_server = start_metrics_server()
+    watcher = SpoolWatcher(spool_dir, poll_interval)
+    app_logger.info("Publisher daemon started, spool directory: {}".format(spool_dir))
+    try:
+        while not stop_event.is_set():
+            for manifest_file in _list_manifests(spool_dir):
+                if stop_event.is_set():
+                    break
+                app_logger.info("Publishing manifest {} . . .".format(manifest_file))
+                result = publish_manifest(manifest_file, publisher)
+                target_file = _move_manifest(manifest_file, result)
+                app_logger.info("Manifest {} {}, moved to {}".format(manifest_file, result["status"], target_file))
+            watcher.wait(stop_event)
+    finally:
+        watcher.close()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        publisher.close()
+        app_logger.info("Publisher daemon stopped")
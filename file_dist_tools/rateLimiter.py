@@ -0,0 +1,157 @@
+#=============================================================================
+# Adaptive rate limiter shared by all concurrent publish workers
+#   - token bucket: every bulk-publish call takes one token, tokens refill at the current rate
+#   - AIMD: rate is cut on 429 (multiplicative decrease) and grows back by a
+#     fixed step on each success (additive increase)
+#   - Retry-After and X-RateLimit-Remaining/X-RateLimit-Reset headers pause every worker
+#     until the server accepts requests again
+#=============================================================================
+import threading
+import time
+
+from exceptions import InvalidConfigurationException
+from globalConfig import GLOBAL_CONFIG_FILE, get_config
+from loggingFileDist import get_app_logger
+
+app_logger = get_app_logger("app_info")
+
+RATE_LIMIT_CONFIG_KEY = "RATE_LIMIT_CONFIG"
+
+_rate_limiter = None
+# configuration the shared rate limiter was created with
+_rate_limiter_config = None
+_rate_limiter_lock = threading.Lock()
+
+
+class RateLimiter:
+    def __init__(self, rate=20.0, min_rate=0.5, max_rate=100.0, burst=10, increase=1.0, decrease=0.5):
+        if min_rate <= 0 or min_rate > max_rate:
+            raise ValueError("Rate limit MIN_RATE should be above 0 and at most MAX_RATE, got MIN_RATE={} "
+                             "MAX_RATE={}".format(min_rate, max_rate))
+        if not min_rate <= rate <= max_rate:
+            app_logger.warning("Rate limit RATE={} is outside [{}, {}], using {}".format(
+                rate, min_rate, max_rate, min(max(rate, min_rate), max_rate)))
+        # a rate of 0 would wait forever for the first token
+        self.rate = min(max(rate, min_rate), max_rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self._tokens = burst
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    # -----------------------------------------------------------
+    # Take a token, return seconds the caller should wait before sending
+    # -----------------------------------------------------------
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            # tokens go negative, so waiting callers are served in order
+            self._tokens -= 1
+            bucket_wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(bucket_wait, self._paused_until - now)
+
+    def acquire(self):
+        wait_time = self.reserve()
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    async def acquire_async(self):
+        # asyncio is only imported by the asyncio engine
+        import asyncio
+
+        wait_time = self.reserve()
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+
+    # -----------------------------------------------------------
+    # Adjust the rate from response status code and rate limit headers
+    # -----------------------------------------------------------
+    def on_response(self, status_code, headers):
+        with self._lock:
+            now = time.monotonic()
+            pause_time = None
+            if status_code == 429:
+                old_rate = self.rate
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                pause_time = _parse_retry_after(headers.get("Retry-After"))
+                app_logger.warning("Too many requests, publish rate {:.2f} -> {:.2f} requests/s{}".format(
+                    old_rate, self.rate, "" if pause_time is None else ", paused {:.1f}s".format(pause_time)))
+            elif status_code < 500:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+            # quota used up, wait for the quota window to reset
+            if headers.get("X-RateLimit-Remaining") == "0":
+                reset_time = _parse_rate_limit_reset(headers.get("X-RateLimit-Reset"))
+                if reset_time is not None:
+                    pause_time = max(pause_time or 0.0, reset_time)
+
+            if pause_time is not None:
+                self._paused_until = max(self._paused_until, now + pause_time)
+                # drop saved up tokens, so workers do not stampede after the pause
+                self._tokens = min(self._tokens, 0)
+
+
+def _parse_retry_after(value):
+    # Retry-After is either delay in seconds or an HTTP date
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_rate_limit_reset(value):
+    # X-RateLimit-Reset is either delay in seconds or epoch time in seconds
+    if value is None:
+        return None
+    try:
+        reset_time = float(value)
+    except ValueError:
+        return None
+    if reset_time > 1000000000:
+        reset_time -= time.time()
+    return max(0.0, reset_time)
+
+
+# -----------------------------------------------------------
+# Get the shared rate limiter, create it on first use and when its settings changed
+# -----------------------------------------------------------
+def get_rate_limiter():
+    global _rate_limiter, _rate_limiter_config
+
+    config = get_config()
+    if _rate_limiter is None or _rate_limiter_config is not config:
+        with _rate_limiter_lock:
+            if _rate_limiter is None or _rate_limiter_config is not config:
+                settings = _load_rate_limit_config(config)
+                # other settings of global.ini do not reset the current rate
+                if _rate_limiter is None or settings != _load_rate_limit_config(_rate_limiter_config):
+                    try:
+                        _rate_limiter = RateLimiter(**settings)
+                    except ValueError as err:
+                        raise InvalidConfigurationException(GLOBAL_CONFIG_FILE, str(err))
+                _rate_limiter_config = config
+    return _rate_limiter
+
+
+def _load_rate_limit_config(config):
+    return {
+        "rate": config.getfloat(RATE_LIMIT_CONFIG_KEY, "RATE", fallback=20.0),
+        "min_rate": config.getfloat(RATE_LIMIT_CONFIG_KEY, "MIN_RATE", fallback=0.5),
+        "max_rate": config.getfloat(RATE_LIMIT_CONFIG_KEY, "MAX_RATE", fallback=100.0),
+        "burst": config.getint(RATE_LIMIT_CONFIG_KEY, "BURST", fallback=10),
+        "increase": config.getfloat(RATE_LIMIT_CONFIG_KEY, "INCREASE", fallback=1.0),
+        "decrease": config.getfloat(RATE_LIMIT_CONFIG_KEY, "DECREASE", fallback=0.5)
+    }
@@ -15,7 +15,11 @@
 #   and is provided AS IS with no warranty or guarantee of fit for purpose.
 #   Copyright (C) 2021 Refinitiv. All rights reserved.
 #=============================================================================
-import requests, json, time, getopt, sys, configparser, traceback
+import json, time, sys, threading
+import httpSession
+import globalConfig
+import publishMetrics
+from tokenStore import TokenStore
 from loggingFileDist import get_app_logger, get_error_logger
 
 app_logger = get_app_logger("app_info")
@@ -34,21 +38,37 @@ endpoint_URL = "/token"
 CLIENT_SECRET = ""
 SCOPE = "trapi"
 
-CREDENTIALS_FILE = "global.ini"
 TOKEN_FILE = "token.txt"
+USER_FILE = "current_user.json"
+# Token file shared by concurrent processes
+tokenStore = TokenStore(TOKEN_FILE, USER_FILE)
+
+# Process-wide token cache, token file is only read on a cache miss
+_tokenCache = None
+# Configuration the credentials were read from, read again when global.ini changes
+_credentialsConfig = None
+# Only one thread refreshes the token, the others wait for its result
+_tokenLock = threading.Lock()
+# Optional background thread renewing the token before it expires
+_tokenRefresher = None
+# Number of startTokenRefresher calls not stopped yet, the refresher stops with the last user
+_tokenRefresherUsers = 0
+TOKEN_CONFIG_KEY = "TOKEN_CONFIG"
 
 
 #==============================================
 def _loadCredentialsFromFile():
 #==============================================
-    global USERNAME, PASSWORD, CLIENT_ID
+    global USERNAME, PASSWORD, CLIENT_ID, _credentialsConfig
     try:
-        config = configparser.ConfigParser()
-        config.read(CREDENTIALS_FILE)
+        config = globalConfig.get_config()
+        if config.rdp is None:
+            raise KeyError(globalConfig.RDP_KEY)
 
-        USERNAME = config['RDP']['username']
-        PASSWORD = config['RDP']['password']
-        CLIENT_ID = config['RDP']['clientId']
+        USERNAME = config.rdp.username
+        PASSWORD = config.rdp.password
+        CLIENT_ID = config.rdp.client_id
+        _credentialsConfig = config
 
         app_logger.info("Read credentials from file")
     except Exception as e:
@@ -59,11 +79,20 @@ def _loadCredentialsFromFile():
     return USERNAME
 
 
+#==============================================
+def _loadCredentials():
+#==============================================
+    # parsed configuration is cached, credentials are only set again after global.ini changed
+    if _credentialsConfig is not globalConfig.get_config():
+        _loadCredentialsFromFile()
+    return USERNAME
+
+
 #==============================================
 def _requestNewToken(refreshToken):
 #==============================================
     # try to read user credentials from a file
-    _loadCredentialsFromFile()
+    _loadCredentials()
     TOKEN_ENDPOINT = base_URL + category_URL + RDP_version + endpoint_URL
 
     if refreshToken is None:
@@ -82,17 +111,19 @@ def _requestNewToken(refreshToken):
         }
 
     # Make a REST call to get latest access token
-    response = requests.post(
-        TOKEN_ENDPOINT,
-        headers={
-            "Accept": "application/json"
-        },
-        data=tData,
-        auth=(
-            CLIENT_ID,
-            CLIENT_SECRET
+    publishMetrics.inc("token_requests_total")
+    with publishMetrics.timer("token_request"):
+        response = httpSession.get_session().post(
+            TOKEN_ENDPOINT,
+            headers={
+                "Accept": "application/json"
+            },
+            data=tData,
+            auth=(
+                CLIENT_ID,
+                CLIENT_SECRET
+            )
         )
-    )
 
     if (response.status_code == 400) and ('invalid_grant' in response.text):
         app_logger.error("Sleep 5 seconds, Failed to get access token {0} - {1}".format(response.status_code, response.text))
@@ -113,37 +144,23 @@ def _requestNewToken(refreshToken):
 #==============================================
 def _saveToken(tknObject):
 #==============================================
-    tf = open(TOKEN_FILE, "w+")
     app_logger.info("Saving the new token")
     # append the expiry time to token
     tknObject["expiry_tm"] = time.time() + int(tknObject["expires_in"]) - 10
-    # store it in the file
-    json.dump(tknObject, tf, indent=4)
-    tf.close()
 
-    username = _loadCredentialsFromFile()
-    user_data = {
-        "username": username
-    }
-    user_file = open("current_user.json", "w+")
+    username = _loadCredentials()
     app_logger.info("Saving the current user: {}".format(username))
-    # store it in the file
-    json.dump(user_data, user_file, indent=2)
-    user_file.close()
+    # store token and user atomically, other processes pick up this token
+    tokenStore.write(tknObject, username)
 
 
 #==============================================
 def _loadToken():
 #==============================================
-    tknObject = None
-    try:
-        # read the token from a file
-        tf = open(TOKEN_FILE, "r+")
-        tknObject = json.load(tf)
-        tf.close()
+    # token file is replaced atomically, so it can be read without lock
+    tknObject = tokenStore.read()
+    if tknObject is not None:
         app_logger.info("Existing token read from: " + TOKEN_FILE)
-    except Exception:
-        pass
 
     return tknObject
 
@@ -151,6 +168,7 @@ def _loadToken():
 #==============================================
 def changePassword(user, oldPass, clientID, newPass):
 #==============================================
+    global _tokenCache
     TOKEN_ENDPOINT = base_URL + category_URL + RDP_version + endpoint_URL
 
     tData = {
@@ -163,7 +181,7 @@ def changePassword(user, oldPass, clientID, newPass):
     }
 
     # make a REST call to get latest access token
-    response = requests.post(
+    response = httpSession.get_session().post(
         TOKEN_ENDPOINT,
         headers = {
             "Accept": "application/json"
@@ -182,46 +200,201 @@ def changePassword(user, oldPass, clientID, newPass):
 
     tknObject = json.loads(response.text)
     # persist this token for future queries
-    _saveToken(tknObject)
+    with _tokenLock, tokenStore.lock():
+        _saveToken(tknObject)
+        _tokenCache = tknObject
     # return access token
     return tknObject["access_token"]
 
 
 #==============================================
+def _isTokenValid(tknObject):
+#==============================================
+    return tknObject is not None and tknObject["expiry_tm"] > time.time()
+
+
+#==============================================
+def invalidateToken():
+#==============================================
+    # drop cached token, next getToken call reads the token file again
+    global _tokenCache
+    with _tokenLock:
+        _tokenCache = None
+
+
+#==============================================
+@publishMetrics.timer("get_token")
 def getToken():
 #==============================================
-    tknObject = _loadToken()
+    global _tokenCache
 
-    if tknObject is not None:
-        # is access token valid
-        if tknObject["expiry_tm"] > time.time():
-            _loadCredentialsFromFile()
-            # return access token
+    # fast path: valid token in memory, no file I/O and no lock
+    tknObject = _tokenCache
+    if _isTokenValid(tknObject):
+        return tknObject["access_token"]
+
+    with _tokenLock:
+        # another thread may have refreshed the token while this one was waiting
+        tknObject = _tokenCache
+        if _isTokenValid(tknObject):
+            return tknObject["access_token"]
+
+        tknObject = _syncToken(tknObject)
+        _tokenCache = tknObject
+        # return access token
+        return tknObject["access_token"]
+
+
+#==============================================
+def renewRejectedToken(accessToken):
+#==============================================
+    # the API answered 401 to accessToken: revoked, or expired before its computed expiry
+    global _tokenCache
+
+    publishMetrics.inc("token_rejected_total")
+    with _tokenLock:
+        # another thread renewed the rejected token already
+        tknObject = _tokenCache
+        if _isTokenValid(tknObject) and tknObject["access_token"] != accessToken:
             return tknObject["access_token"]
 
-        app_logger.info("Token expired, refreshing a new one...")
+        app_logger.warning("Access token rejected, refreshing a new one...")
+        _tokenCache = None
+        tknObject = _syncToken(tknObject, rejectedAccessToken=accessToken)
+        _tokenCache = tknObject
+        return tknObject["access_token"]
+
 
-        # get a new token using refresh token
-        tknObject = _requestNewToken(tknObject["refresh_token"])
-        # if refresh grant failed
-        if tknObject is None:
-            app_logger.info("Refresh token expired, using Password Grant...")
-            # use password grant
+#==============================================
+def _syncToken(tknObject, refreshAhead=0, rejectedAccessToken=None):
+#==============================================
+    # caller holds _tokenLock, the store lock makes other processes wait for this refresh
+    with tokenStore.lock():
+        # another process may have renewed the token already
+        storedTknObject = _loadToken()
+        if storedTknObject is not None and storedTknObject["expiry_tm"] - refreshAhead > time.time() and \
+                storedTknObject["access_token"] != rejectedAccessToken:
+            _loadCredentials()
+            return storedTknObject
+
+        # use the newest refresh token
+        if storedTknObject is not None and \
+                (tknObject is None or storedTknObject.get("version", 0) >= tknObject.get("version", 0)):
+            tknObject = storedTknObject
+
+        if tknObject is not None:
+            app_logger.info("Token expired, refreshing a new one...")
+            tknObject = _renewToken(tknObject)
+        else:
+            app_logger.info("Getting a new token using Password Grant...")
             tknObject = _requestNewToken(None)
-    else:
-        app_logger.info("Getting a new token using Password Grant...")
-        tknObject = _requestNewToken(None)
 
-    # persist this token for future queries
-    _saveToken(tknObject)
-    # return access token
-    return tknObject["access_token"]
+        # persist this token for future queries
+        _saveToken(tknObject)
+        return tknObject
 
 
+#==============================================
+def _renewToken(tknObject):
+#==============================================
+    # get a new token using refresh token
+    newTknObject = _requestNewToken(tknObject["refresh_token"])
+    # if refresh grant failed
+    if newTknObject is None:
+        app_logger.info("Refresh token expired, using Password Grant...")
+        # use password grant
+        newTknObject = _requestNewToken(None)
+    return newTknObject
+
+
+#==============================================
+def _loadTokenConfig():
+#==============================================
+    config = globalConfig.get_config()
+    backgroundRefresh = config.getboolean(TOKEN_CONFIG_KEY, "BACKGROUND_REFRESH", fallback=False)
+    refreshAhead = config.getint(TOKEN_CONFIG_KEY, "REFRESH_AHEAD", fallback=60)
+    return backgroundRefresh, refreshAhead
+
+
+#==============================================
+class TokenRefresher(threading.Thread):
+#==============================================
+    """Renews the access token refreshAhead seconds before expiry_tm, so getToken always finds a valid token"""
+
+    def __init__(self, refreshAhead=60, retryInterval=5):
+        super().__init__(name="TokenRefresher", daemon=True)
+        self.refreshAhead = refreshAhead
+        self.retryInterval = retryInterval
+        self._stopEvent = threading.Event()
+
+    def run(self):
+        global _tokenCache
+
+        app_logger.info("Token refresher started, refresh {} seconds before expiry".format(self.refreshAhead))
+        waitTime = 0
+        while not self._stopEvent.wait(waitTime):
+            try:
+                tknObject = _tokenCache
+                if tknObject is None:
+                    getToken()
+                elif tknObject["expiry_tm"] - time.time() <= self.refreshAhead:
+                    with _tokenLock:
+                        # skip if getToken already renewed the token
+                        if _tokenCache is tknObject:
+                            app_logger.info("Token expires soon, refreshing a new one in background...")
+                            _tokenCache = _syncToken(tknObject, self.refreshAhead)
+
+                remaining = _tokenCache["expiry_tm"] - time.time()
+                # a token living shorter than refreshAhead is renewed half way to its expiry
+                waitTime = max(remaining - self.refreshAhead, remaining / 2, 1)
+            except Exception as e:
+                app_logger.error(e, exc_info=True)
+                error_logger.error(e, exc_info=True)
+                waitTime = self.retryInterval
+        app_logger.info("Token refresher stopped")
+
+    def stop(self):
+        self._stopEvent.set()
+
+
+#==============================================
+def startTokenRefresher(refreshAhead=None, force=False):
+#==============================================
+    # start background refresher if enabled on global configuration file
+    # every call returning a refresher is paired with one stopTokenRefresher call
+    global _tokenRefresher, _tokenRefresherUsers
+    backgroundRefresh, configRefreshAhead = _loadTokenConfig()
+    if not backgroundRefresh and not force:
+        return None
+
+    with _tokenLock:
+        if _tokenRefresher is None or not _tokenRefresher.is_alive():
+            _tokenRefresher = TokenRefresher(configRefreshAhead if refreshAhead is None else refreshAhead)
+            _tokenRefresher.start()
+        _tokenRefresherUsers += 1
+    return _tokenRefresher
+
+
+#==============================================
+def stopTokenRefresher():
+#==============================================
+    # the refresher keeps running while other users, e.g. other Publishers, need it
+    global _tokenRefresher, _tokenRefresherUsers
+    with _tokenLock:
+        _tokenRefresherUsers = max(0, _tokenRefresherUsers - 1)
+        if _tokenRefresherUsers > 0:
+            return
+        refresher = _tokenRefresher
+        _tokenRefresher = None
+    if refresher is not None:
+        refresher.stop()
+        refresher.join()
+
 
 #==============================================
 if __name__ == "__main__":	
 #==============================================
+    import getopt
     print("Getting OAuth access token...")
     try:
         opts, args = getopt.getopt(sys.argv[1:], "", ["user=", "password=", "client_id=", "auth_url=", "version="])
@@ -0,0 +1,121 @@
+#=============================================================================
+# Machine-readable publish results (--results)
+#   - one record per file, or per chunk, written as soon as its chunk completes,
+#     as JSON lines (.jsonl) or CSV (.csv)
+#   - files skipped by the journal (--resume) or the publish cache get a file record
+#     with status skipped, so every manifest row has a record
+#   - records are written through a buffer flushed every FLUSH_INTERVAL seconds by a
+#     background thread, also while no chunk completes, nothing is kept in memory,
+#     so a run of any size writes at the same speed
+#   - records are appended, the CSV header is written to new files only
+#=============================================================================
+import csv
+import json
+import threading
+import time
+
+from exceptions import InvalidConfigurationException
+
+RECORD_TYPES = ("file", "chunk")
+SKIPPED = "skipped"
+FILE_FIELDS = ["time", "fileset", "chunk", "filename", "fileset_id", "file_id", "status", "status_code", "attempts",
+               "latency_ms", "error"]
+CHUNK_FIELDS = ["time", "fileset", "chunk", "files", "fileset_id", "file_ids", "status", "status_code", "attempts",
+                "latency_ms", "error"]
+
+
+def _result_format(result_file):
+    result_format = result_file.lower().rsplit(".", 1)[-1]
+    if result_format not in ("jsonl", "csv"):
+        raise InvalidConfigurationException(result_file, "Result file should be a .jsonl or .csv file")
+    return result_format
+
+
+def _response_ids(json_response):
+    # bulk-publish response: {"filesetId": ..., "files": [file id of every file, in request order]}
+    if not isinstance(json_response, dict):
+        return None, []
+    file_ids = json_response.get("files")
+    return json_response.get("filesetId"), file_ids if isinstance(file_ids, list) else []
+
+
+class ResultSink:
+    def __init__(self, result_file, record="file", flush_interval=1.0, buffer_size=1024 * 1024):
+        if record not in RECORD_TYPES:
+            raise InvalidConfigurationException(result_file, "Result record should be {}".format(
+                " or ".join(RECORD_TYPES)))
+        self.result_file = result_file
+        self.format = _result_format(result_file)
+        self.record = record
+        self.fields = FILE_FIELDS if record == "file" else CHUNK_FIELDS
+        self.flush_interval = flush_interval
+        self.records = 0
+        self._file = open(result_file, "a", newline="", encoding="utf-8", buffering=buffer_size)
+        self._csv_writer = csv.writer(self._file) if self.format == "csv" else None
+        if self._csv_writer is not None and self._file.tell() == 0:
+            self._csv_writer.writerow(self.fields)
+        # chunks complete on the worker threads
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher = None
+        if flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_periodically, name="ResultSinkFlush", daemon=True)
+            self._flusher.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # -----------------------------------------------------------
+    # Write the records of a completed chunk, result is the chunk result of the publish report
+    # -----------------------------------------------------------
+    def add_chunk(self, filesetname, result, files, json_response=None):
+        now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        fileset_id, file_ids = _response_ids(json_response)
+        outcome = [result["status"], result.get("status_code"), result.get("attempts", 0),
+                   round(result["duration"] * 1000, 3), result["error"]]
+        if self.record == "chunk":
+            rows = [[now, filesetname, result["chunk"], len(files), fileset_id,
+                     " ".join(map(str, file_ids)) if self._csv_writer is not None else file_ids] + outcome]
+        else:
+            rows = [[now, filesetname, result["chunk"], file_input.filename, fileset_id,
+                     file_ids[index] if index < len(file_ids) else None] + outcome
+                    for index, file_input in enumerate(files)]
+
+        self._write(rows)
+
+    # -----------------------------------------------------------
+    # Write the record of a file not sent, reason is the filter which skipped it
+    # -----------------------------------------------------------
+    def add_skipped(self, filesetname, file_input, reason):
+        # a chunk record has no file names, skipped files are only counted by the publish report
+        if self.record != "file":
+            return
+        self._write([[time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), filesetname, None, file_input.filename,
+                      None, None, SKIPPED, None, 0, 0.0, reason]])
+
+    def _write(self, rows):
+        with self._lock:
+            if self._csv_writer is not None:
+                self._csv_writer.writerows(rows)
+            else:
+                self._file.write("".join(json.dumps(dict(zip(self.fields, row))) + "\n" for row in rows))
+            self.records += len(rows)
+            if self._flusher is None:
+                self._file.flush()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            with self._lock:
+                if not self._file.closed:
+                    self._file.flush()
+
+    def close(self):
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
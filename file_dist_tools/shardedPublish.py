@@ -0,0 +1,222 @@
+#=============================================================================
+# Publish a large manifest with worker processes (--workers)
+#   - the manifest is split into byte ranges of whole records, one shard per worker
+#   - workers parse their shard, compute local file digests and publish cache keys
+#     and encode the request body of every chunk, chunks are sent back on a
+#     bounded queue (pipe), so memory does not grow with the manifest size
+#   - the parent owns the token, the HTTP session, journal and publish cache and
+#     publishes the chunks with its thread pool, workers never call the API
+#   - workers are started with spawn: forked children would inherit locks held
+#     by the log listener and token refresher threads of the parent
+#=============================================================================
+import queue
+import time
+
+import publishMetrics
+import rdpToken
+from exceptions import ShardFailedException
+from fileEntry import FilesetRequest
+from loggingFileDist import get_app_logger
+from publishFile import (DIGEST_CONFIG_KEY, SKIPPED_BY_CACHE, SKIPPED_BY_JOURNAL, PublishReport,
+                         create_file_entry_key, create_payload_header, encode_body, get_publish_config, publish_chunk,
+                         record_skipped, split_chunks, update_report)
+from validator import read_manifest_shard, split_manifest
+
+app_logger = get_app_logger("app_info")
+
+# messages of the worker processes
+CHUNK = "chunk"
+DONE = "done"
+FAILED = "failed"
+# seconds between two checks of worker processes while waiting for chunks
+POLL_INTERVAL = 1.0
+
+
+# -----------------------------------------------------------
+# Worker process: parse, hash and encode the chunks of one shard
+# -----------------------------------------------------------
+def prepare_shard(shard_id, manifest_file, start, end, user_request, chunk_size, cache_keys, chunk_queue):
+    try:
+        start_time = time.perf_counter()
+        files = read_manifest_shard(manifest_file, start, end)
+        file_digests = None
+        if "localdir" in user_request:
+            file_digests = _create_file_digests(user_request["localdir"])
+            files = file_digests.apply(files)
+        payload_header = create_payload_header(user_request) if cache_keys else None
+
+        records = 0
+        chunks = 0
+        for files in split_chunks(files, chunk_size):
+            keys = [create_file_entry_key(payload_header, file_input) for file_input in files] if cache_keys else None
+            body = encode_body(FilesetRequest.from_user_request(user_request, files))
+            chunk_queue.put((CHUNK, shard_id, files, keys, body))
+            records += len(files)
+            chunks += 1
+
+        shard_result = {
+            "shard": shard_id,
+            "records": records,
+            "chunks": chunks,
+            "hashed": file_digests.hashed if file_digests is not None else 0,
+            "cached": file_digests.cached if file_digests is not None else 0,
+            "duration": time.perf_counter() - start_time,
+            # metrics of this process, added to the metrics of the parent
+            "metrics": publishMetrics.registry.snapshot()
+        }
+        if file_digests is not None:
+            file_digests.close()
+        chunk_queue.put((DONE, shard_id, shard_result))
+    except Exception as err:
+        chunk_queue.put((FAILED, shard_id, "{}: {}".format(type(err).__name__, str(err).splitlines()[0])))
+
+
+def _create_file_digests(local_dir):
+    import fileDigest
+    from globalConfig import get_config
+
+    config = get_config()
+    # one worker process per shard already, files of a shard are hashed in this process
+    return fileDigest.FileDigests(local_dir, cache_file=config.get(DIGEST_CONFIG_KEY, "CACHE_FILE",
+                                                                   fallback="digest_cache.db"),
+                                  workers=1,
+                                  batch_size=config.getint(DIGEST_CONFIG_KEY, "BATCH_SIZE", fallback=1000),
+                                  read_bytes=config.getint(DIGEST_CONFIG_KEY, "READ_BYTES",
+                                                           fallback=fileDigest.READ_BYTES))
+
+
+# -----------------------------------------------------------
+# Drop files published before, the body is encoded again when files were dropped
+# -----------------------------------------------------------
+def filter_chunk(files, keys, body, journal_run=None, publish_cache=None, on_journal_skipped=None,
+                 on_cache_skipped=None):
+    entries = list(zip(files, keys)) if keys is not None else [(file_input, None) for file_input in files]
+    if journal_run is not None:
+        kept = set(map(id, journal_run.filter_published(files, on_journal_skipped)))
+        entries = [entry for entry in entries if id(entry[0]) in kept]
+    if publish_cache is not None:
+        kept_entries = []
+        for entry in entries:
+            if publish_cache.should_publish(entry[1]):
+                kept_entries.append(entry)
+            elif on_cache_skipped is not None:
+                on_cache_skipped(entry[0])
+        entries = kept_entries
+    if len(entries) == len(files):
+        return files, keys, body
+    return [file_input for file_input, _ in entries], [key for _, key in entries] if keys is not None else None, None
+
+
+# -----------------------------------------------------------
+# Messages of worker processes, fails when a worker exits without result
+# -----------------------------------------------------------
+def _iter_messages(chunk_queue, processes):
+    running = set(processes)
+    while len(running) > 0:
+        try:
+            message = chunk_queue.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            for shard_id in list(running):
+                process = processes[shard_id]
+                if not process.is_alive() and chunk_queue.empty():
+                    raise ShardFailedException(shard_id, "worker process exited with code {}".format(
+                        process.exitcode))
+            continue
+        if message[0] != CHUNK:
+            running.discard(message[1])
+        yield message
+
+
+# -----------------------------------------------------------
+# Publish manifest chunks prepared by worker processes through a worker pool
+# -----------------------------------------------------------
+def publish_shards(user_request, workers, chunk_size=None, max_concurrency=None, journal_run=None,
+                   publish_cache=None, result_sink=None):
+    import multiprocessing
+    from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+    config_chunk_size, config_max_concurrency = get_publish_config()
+    chunk_size = chunk_size or config_chunk_size
+    max_concurrency = max_concurrency or config_max_concurrency
+    manifest_file = user_request["manifest"]
+
+    # the parent is the only token user, fetched before the workers start
+    rdpToken.getToken()
+
+    shards = split_manifest(manifest_file, workers)
+    app_logger.info("Manifest {} split into {} shards".format(manifest_file, len(shards)))
+    # file generator of the manifest is not sent to the workers
+    shard_request = {key: value for key, value in user_request.items() if key != "files"}
+    if publish_cache is not None:
+        publish_cache.start_run()
+    on_journal_skipped = record_skipped(user_request, result_sink, SKIPPED_BY_JOURNAL)
+    on_cache_skipped = record_skipped(user_request, result_sink, SKIPPED_BY_CACHE)
+
+    context = multiprocessing.get_context("spawn")
+    # bounded, workers wait while the thread pool is busy
+    chunk_queue = context.Queue(maxsize=max(max_concurrency, len(shards)) * 2)
+    processes = {}
+    for shard_id, (start, end) in enumerate(shards, start=1):
+        processes[shard_id] = context.Process(target=prepare_shard, daemon=True,
+                                              args=(shard_id, manifest_file, start, end, shard_request, chunk_size,
+                                                    publish_cache is not None, chunk_queue))
+        processes[shard_id].start()
+
+    report = PublishReport()
+    report.shards = 0
+    app_logger.info("Shard report {:<8} {:<8} {:<10} {:<10} {}".format("shard", "records", "chunks", "duration",
+                                                                      "digests"))
+    app_logger.info("Chunk report {:<8} {:<8} {:<10} {:<10} {}".format("chunk", "files", "status", "duration", "error"))
+    try:
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            pending = set()
+            chunk_id = 0
+            try:
+                for message in _iter_messages(chunk_queue, processes):
+                    if message[0] == FAILED:
+                        raise ShardFailedException(message[1], message[2])
+                    if message[0] == DONE:
+                        add_shard_result(report, message[2])
+                        continue
+
+                    files, keys, body = filter_chunk(*message[2:], journal_run=journal_run,
+                                                     publish_cache=publish_cache,
+                                                     on_journal_skipped=on_journal_skipped,
+                                                     on_cache_skipped=on_cache_skipped)
+                    if len(files) == 0:
+                        continue
+                    if len(pending) >= max_concurrency * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            report.add(future.result())
+                    chunk_id += 1
+                    if journal_run is not None:
+                        journal_run.add_chunk(chunk_id, files)
+                    pending.add(executor.submit(publish_chunk, chunk_id, user_request, files, journal_run,
+                                                publish_cache, body, keys, result_sink))
+            finally:
+                # let chunks in flight finish, also when a shard failed
+                done, pending = wait(pending)
+                for future in done:
+                    report.add(future.result())
+    finally:
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        chunk_queue.close()
+        update_report(report, journal_run, publish_cache)
+        report.print_report()
+    return report
+
+
+def add_shard_result(report, shard_result):
+    report.shards += 1
+    report.prepared_files += shard_result["records"]
+    publishMetrics.merge(shard_result["metrics"])
+    publishMetrics.observe("prepare_shard", shard_result["duration"])
+    app_logger.info("Shard report {:<8} {:<8} {:<10} {:<10} {}".format(
+        shard_result["shard"], shard_result["records"], shard_result["chunks"],
+        "{:.3f}s".format(shard_result["duration"]),
+        "{} hashed, {} cached".format(shard_result["hashed"], shard_result["cached"]) if shard_result["hashed"] or
+        shard_result["cached"] else ""))
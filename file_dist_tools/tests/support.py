@@ -0,0 +1,82 @@
+#=============================================================================
+# Shared fixtures of the tests, run from the file_dist_tools directory
+#   cd file_dist_tools
+#   python -m unittest discover -s tests -t .
+#   - every test runs in a temporary working directory with its own global.ini,
+#     token and log files, the API is the mock server of the benchmarks
+#=============================================================================
+import configparser
+import os
+import shutil
+import tempfile
+import unittest
+
+TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def create_files(count):
+    from fileEntry import FileEntry
+
+    return [FileEntry(filename="file_{}.csv".format(i), s3url="https://bucket.s3.amazonaws.com/file_{}.csv".format(i),
+                      filesizeinbytes=i * 7) for i in range(count)]
+
+
+class WorkDirTestCase(unittest.TestCase):
+    # global.ini settings of the test class, {section: {key: value}}
+    config_overrides = {}
+
+    def setUp(self):
+        import globalConfig
+
+        self.current_dir = os.getcwd()
+        self.work_dir = tempfile.mkdtemp(prefix="file_dist_test_")
+        self.write_config(self.config_overrides)
+        os.chdir(self.work_dir)
+        globalConfig.reload_config()
+        self._reset_shared_state()
+
+    def tearDown(self):
+        import globalConfig
+
+        os.chdir(self.current_dir)
+        globalConfig.reload_config()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def write_config(self, overrides):
+        config = configparser.ConfigParser()
+        config.optionxform = str
+        config.read(os.path.join(TOOLS_DIR, "global.ini"))
+        for section, options in overrides.items():
+            if not config.has_section(section):
+                config.add_section(section)
+            for key, value in options.items():
+                config[section][key] = str(value)
+        with open(os.path.join(self.work_dir, "global.ini"), "w") as gf:
+            config.write(gf)
+
+    def _reset_shared_state(self):
+        import circuitBreaker
+        import rateLimiter
+        import rdpToken
+
+        # created again from the global.ini of this test
+        rateLimiter._rate_limiter = None
+        circuitBreaker._guard_config = None
+        rdpToken.invalidateToken()
+
+    # -----------------------------------------------------------
+    # Mock API on a background thread, stopped at the end of the test
+    # -----------------------------------------------------------
+    def start_mock_server(self, **options):
+        import rdpToken
+        from benchmarks.mock_server import server_url, start_server
+
+        options.setdefault("verify_token", True)
+        options.setdefault("seed", 1)
+        server = start_server(**options)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        base_url = rdpToken.base_URL
+        rdpToken.base_URL = server_url(server)
+        self.addCleanup(setattr, rdpToken, "base_URL", base_url)
+        return server
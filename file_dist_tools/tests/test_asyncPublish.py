@@ -0,0 +1,46 @@
+import json
+import threading
+import unittest
+from unittest import mock
+
+from tests.support import WorkDirTestCase, create_files
+
+
+class AsyncPublishTest(WorkDirTestCase):
+    config_overrides = {"RATE_LIMIT_CONFIG": {"RATE": 1000, "MAX_RATE": 1000, "BURST": 1000},
+                        "CACHE_CONFIG": {"ENABLED": "true", "CACHE_FILE": "publish_cache.db"}}
+
+    def test_blocking_calls_run_off_the_event_loop(self):
+        import resultSink
+        from fileEntry import FilesetRequest
+        from publisher import Publisher
+
+        self.start_mock_server()
+        threads = set()
+        add_chunk = resultSink.ResultSink.add_chunk
+
+        def record_thread(sink, *args):
+            threads.add(threading.current_thread().name)
+            return add_chunk(sink, *args)
+
+        request = FilesetRequest("fileset", "bucket", "package", files=create_files(100))
+        with mock.patch.object(resultSink.ResultSink, "add_chunk", record_thread), \
+                Publisher(max_concurrency=4, chunk_size=10, engine="asyncio", journal_file="journal.db",
+                          result_file="results.jsonl") as publisher:
+            result = publisher.publish(request)
+            self.assertEqual((result.succeeded_chunks, result.published_files), (10, 100))
+            # second publish of the same files is skipped by the publish cache
+            result = publisher.publish(request)
+            self.assertEqual((result.chunks, result.cached_files), (0, 100))
+
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(next(iter(threads)).startswith("AsyncPublishWriter"))
+        with open("results.jsonl") as rf:
+            records = [json.loads(line) for line in rf]
+        # files of the second publish are written as skipped
+        self.assertEqual([record["status"] for record in records], ["success"] * 100 + ["skipped"] * 100)
+        self.assertEqual(records[100]["error"], "already published (publish cache)")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import time
+import unittest
+
+from tests.support import WorkDirTestCase, create_files
+
+# fast retries, and a rate limiter that does not slow the tests down
+FAST_RETRY_CONFIG = {
+    "RETRY_CONFIG": {"RETRY_LIMIT": 20, "RETRY_DELAY": 0, "RETRY_BACKOFF": 1},
+    "RATE_LIMIT_CONFIG": {"RATE": 1000, "MIN_RATE": 1000, "MAX_RATE": 1000, "BURST": 1000},
+    "CACHE_CONFIG": {"ENABLED": "false"}
+}
+
+
+class CircuitBreakerTest(WorkDirTestCase):
+    def test_opens_probes_and_closes(self):
+        import circuitBreaker
+
+        breaker = circuitBreaker.CircuitBreaker(failure_threshold=2, open_seconds=0.05)
+        breaker.on_response(503)
+        self.assertEqual(breaker.state, circuitBreaker.CLOSED)
+        breaker.on_response(None)
+        self.assertEqual(breaker.state, circuitBreaker.OPEN)
+        self.assertGreater(breaker.reserve(), 0)
+
+        time.sleep(0.06)
+        self.assertEqual(breaker.reserve(), 0)
+        self.assertEqual(breaker.state, circuitBreaker.HALF_OPEN)
+        # one probe at a time
+        self.assertGreater(breaker.reserve(), 0)
+        breaker.on_response(201)
+        self.assertEqual(breaker.state, circuitBreaker.CLOSED)
+
+    def test_open_circuit_fails_fast(self):
+        import circuitBreaker
+        from exceptions import CircuitOpenException
+
+        breaker = circuitBreaker.CircuitBreaker(failure_threshold=1, open_seconds=60)
+        breaker.on_failure()
+        self.assertRaises(CircuitOpenException, breaker.acquire)
+
+
+class RetryBudgetTest(WorkDirTestCase):
+    config_overrides = dict(FAST_RETRY_CONFIG, CIRCUIT_BREAKER_CONFIG={
+        "FAILURE_THRESHOLD": 0, "RETRY_BUDGET_RATIO": 0.01, "RETRY_BUDGET_TOKENS": 1})
+
+    def publish(self, engine, files):
+        from fileEntry import FilesetRequest
+        from publisher import Publisher
+
+        with Publisher(max_concurrency=4, chunk_size=10, engine=engine) as publisher:
+            return publisher.publish(FilesetRequest("fileset", "bucket", "package", files=files))
+
+    def test_throttled_retries_do_not_use_budget(self):
+        # 429 storm, every chunk is published once the rate limiter let it through
+        server = self.start_mock_server(error_rate_429=0.4, retry_after=0)
+        for engine in ("thread", "asyncio"):
+            with self.subTest(engine=engine):
+                result = self.publish(engine, create_files(1000))
+                self.assertEqual(result.failed_chunks, [])
+                self.assertEqual(result.succeeded_chunks, 100)
+                self.assertEqual(result.published_files, 1000)
+        self.assertGreater(server.stats["injected_429"], 100)
+
+    def test_server_errors_use_budget(self):
+        server = self.start_mock_server(error_rate_5xx=1.0)
+        result = self.publish("thread", create_files(100))
+        self.assertEqual(result.succeeded_chunks, 0)
+        self.assertIn("RetryBudgetExhaustedException", result.failed_chunks[-1]["error"])
+        # 10 first attempts and the retry of the one saved up token, instead of 20 attempts per chunk
+        self.assertEqual(server.stats["publish_requests"], 11)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+
+from tests.support import create_files
+
+
+class PublishRequestExceptionTest(unittest.TestCase):
+    def test_message_keeps_start_of_body(self):
+        from exceptions import MAX_MESSAGE_TEXT, CFSServerException
+        from fileEntry import FilesetRequest, get_encoder
+
+        request = FilesetRequest("fileset", "bucket", "package", files=create_files(1000))
+        body = get_encoder("json")(request)
+        error = CFSServerException("bulk-publish failed", request, result="x" * 10000, body=body)
+        self.assertIn("<1000 files, {} bytes, sha256 ".format(len(body)), error.message)
+        self.assertIn(body[:MAX_MESSAGE_TEXT].decode("utf-8"), error.message)
+        self.assertNotIn(body[:MAX_MESSAGE_TEXT + 1].decode("utf-8"), error.message)
+        self.assertIn("(10000 characters)", str(error))
+
+    def test_encoders_write_same_request(self):
+        import json
+
+        from fileEntry import FilesetRequest, get_encoder
+
+        request = FilesetRequest("fileset", "bucket", "package", files=create_files(3))
+        self.assertEqual(json.loads(get_encoder("json")(request)), request.to_dict())
+        self.assertEqual(json.loads(get_encoder("auto")(request)), request.to_dict())
+        with self.assertRaises(ValueError):
+            get_encoder("yaml")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import hashlib
+import os
+import unittest
+
+from tests.support import WorkDirTestCase, create_files
+
+
+class FileDigestsTest(WorkDirTestCase):
+    def write_local_files(self, files):
+        os.makedirs("data")
+        for file_entry in files:
+            with open(os.path.join("data", file_entry.filename), "w") as lf:
+                lf.write(file_entry.filename * 100)
+
+    def test_digests_on_process_pool(self):
+        import fileDigest
+
+        files = create_files(40)
+        self.write_local_files(files)
+        with fileDigest.FileDigests("data", cache_file="digest_cache.db", workers=2, batch_size=20) as file_digests:
+            files = list(file_digests.apply(files))
+        self.assertEqual(file_digests.hashed, 40)
+        for file_entry in files:
+            self.assertEqual(file_entry.md5, hashlib.md5(file_entry.filename.encode() * 100).hexdigest())
+            self.assertEqual(file_entry.filesizeinbytes, len(file_entry.filename) * 100)
+
+        # unchanged files are taken from the digest cache, closing without a process pool
+        with fileDigest.FileDigests("data", cache_file="digest_cache.db", workers=2) as file_digests:
+            list(file_digests.apply(create_files(40)))
+        self.assertEqual((file_digests.hashed, file_digests.cached), (0, 40))
+
+
+if __name__ == "__main__":
+    unittest.main()
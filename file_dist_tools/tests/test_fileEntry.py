@@ -0,0 +1,42 @@
+import json
+import pickle
+import unittest
+
+from tests.support import WorkDirTestCase
+
+
+class FileEntryTest(WorkDirTestCase):
+    def create_request(self):
+        from fileEntry import FileEntry, FilesetRequest
+
+        files = [FileEntry.from_row(["filename", "s3url", "description", "filesizeinbytes", "md5"],
+                                    ["résumé.csv", "https://bucket.s3.amazonaws.com/a.csv", "say \"hi\"",
+                                     "12", ""]),
+                 FileEntry("b.csv", "https://bucket.s3.amazonaws.com/b.csv",
+                           rolearn="arn:aws:iam::123456789012:role/role", filetype="file", position=42)]
+        return FilesetRequest("fileset", "bucket", "package", availablefrom="2024-01-01T00:00:00Z",
+                              attributes=[{"name": "DayOfWeek", "value": "1"}], files=files)
+
+    def test_json_writer_matches_json_dumps(self):
+        request = self.create_request()
+        self.assertEqual(request.to_json(), json.dumps(request.to_dict()))
+        # empty manifest values are omitted, the position is not sent
+        self.assertNotIn("md5", request.to_dict()["files"][0])
+        self.assertNotIn("42", request.to_json())
+
+    def test_pickle_keeps_every_field(self):
+        request = self.create_request()
+        files = pickle.loads(pickle.dumps(request.files))
+        self.assertEqual([repr(file_input) for file_input in files], [repr(file_input) for file_input in request.files])
+        self.assertEqual(files[1].position, 42)
+
+    def test_unknown_encoder_is_rejected(self):
+        from fileEntry import encode_json, get_encoder
+
+        self.assertIs(get_encoder("json"), encode_json)
+        with self.assertRaises(ValueError):
+            get_encoder("xml")
+
+
+if __name__ == "__main__":
+    unittest.main()
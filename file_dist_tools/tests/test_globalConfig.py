@@ -0,0 +1,41 @@
+import os
+import unittest
+from unittest import mock
+
+from tests.support import WorkDirTestCase
+
+
+class GlobalConfigTest(WorkDirTestCase):
+    config_overrides = {"PUBLISH_CONFIG": {"CHUNK_SIZE": "10"}}
+
+    def rewrite_config(self, chunk_size):
+        with open("global.ini") as cf:
+            text = cf.read()
+        with open("global.ini", "w") as cf:
+            cf.write(text.replace("CHUNK_SIZE = 10", "CHUNK_SIZE = {}".format(chunk_size)))
+        # a different modification time, also on file systems with a coarse timestamp
+        stat = os.stat("global.ini")
+        os.utime("global.ini", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    def test_config_is_cached(self):
+        import globalConfig
+
+        config = globalConfig.get_config()
+        self.assertIs(globalConfig.get_config(), config)
+        self.assertEqual(config.getint("PUBLISH_CONFIG", "CHUNK_SIZE"), 10)
+
+    def test_changed_file_is_read_again(self):
+        import globalConfig
+
+        config = globalConfig.get_config()
+        self.rewrite_config(20)
+        # the modification time is checked once per CHECK_INTERVAL
+        self.assertIs(globalConfig.get_config(), config)
+        with mock.patch.object(globalConfig, "_next_check", 0.0):
+            changed = globalConfig.get_config()
+        self.assertIsNot(changed, config)
+        self.assertEqual(changed.getint("PUBLISH_CONFIG", "CHUNK_SIZE"), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+from tests.support import WorkDirTestCase, create_files
+
+
+class HttpSessionTest(WorkDirTestCase):
+    config_overrides = {"CACHE_CONFIG": {"ENABLED": "false"}}
+
+    def setUp(self):
+        import httpSession
+
+        super().setUp()
+        httpSession.close_session()
+        self.addCleanup(httpSession.close_session)
+
+    def test_session_is_shared(self):
+        import httpSession
+
+        session = httpSession.get_session()
+        self.assertIs(httpSession.get_session(), session)
+        httpSession.close_session()
+        self.assertIsNot(httpSession.get_session(), session)
+
+    def test_token_and_publish_calls_reuse_one_connection(self):
+        from publishFile import publish_chunks
+        from fileEntry import FilesetRequest
+
+        server = self.start_mock_server()
+        user_request = FilesetRequest("fileset", "bucket", "package", files=create_files(30)).to_user_request()
+        report = publish_chunks(user_request, chunk_size=10, max_concurrency=1)
+        self.assertEqual(report.succeeded_chunks, 3)
+        self.assertEqual(server.stats["token_requests"] + server.stats["publish_requests"], 4)
+        self.assertEqual(server.stats["connections"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import json
+import unittest
+
+from tests.support import WorkDirTestCase
+
+
+class JsonLogTest(WorkDirTestCase):
+    config_overrides = {"LOG_CONFIG": {"FORMAT": "json"}}
+
+    def setUp(self):
+        import loggingFileDist
+
+        super().setUp()
+        # log configuration is read once per process, read the json format of this test
+        self.addCleanup(setattr, loggingFileDist, "_log_config", loggingFileDist._log_config)
+        loggingFileDist._log_config = None
+
+    def test_exception_is_a_structured_field(self):
+        import loggingFileDist
+
+        logger = loggingFileDist.setup_logger("test_json_log", "log/test.log", log_sys_type=None)
+        try:
+            raise ValueError("invalid value")
+        except ValueError:
+            logger.error("Failed to publish %s", "chunk 1", exc_info=True, extra={"chunk": 1})
+        listener = loggingFileDist._listeners.pop()
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+        with open("log/test.log") as lf:
+            lines = lf.read().splitlines()
+        self.assertEqual(len(lines), 1)
+        log_entry = json.loads(lines[0])
+        self.assertEqual(log_entry["message"], "Failed to publish chunk 1")
+        self.assertEqual(log_entry["chunk"], 1)
+        self.assertTrue(log_entry["exception"].startswith("Traceback"))
+        self.assertIn("ValueError: invalid value", log_entry["exception"])
+
+
+
+class RotatingFileTest(WorkDirTestCase):
+    def test_rollover_counts_bytes(self):
+        import logging
+        import os
+        import loggingFileDist
+
+        handler = loggingFileDist._create_file_handler("rotated.log", {"max_bytes": 1000, "backup_count": 2,
+                                                                       "buffer_size": 4096})
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        # 2 bytes per character in UTF-8
+        for _ in range(20):
+            handler.emit(logging.makeLogRecord({"msg": "\u00e9" * 99}))
+        handler.close()
+        for log_file in ("rotated.log", "rotated.log.1", "rotated.log.2"):
+            self.assertLessEqual(os.path.getsize(log_file), 1000)
+
+
+if __name__ == "__main__":
+    unittest.main()
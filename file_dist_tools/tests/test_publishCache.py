@@ -0,0 +1,42 @@
+import unittest
+
+from tests.support import WorkDirTestCase
+
+
+class PublishCacheTest(WorkDirTestCase):
+    def create_cache(self, **options):
+        from publishCache import PublishCache
+
+        cache = PublishCache("publish_cache.db", **options)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_repeated_key_is_sent_until_confirmed(self):
+        cache = self.create_cache()
+        cache.start_run()
+        self.assertTrue(cache.should_publish("key"))
+        # chunk of the first copy is not confirmed yet
+        self.assertTrue(cache.should_publish("key"))
+        cache.mark_published(["key"])
+        self.assertFalse(cache.should_publish("key"))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_filter_published_reports_skipped_items(self):
+        cache = self.create_cache()
+        cache.mark_published(["b"])
+        skipped = []
+        self.assertEqual(list(cache.filter_published(["a", "b", "c"], lambda item: item, skipped.append)),
+                         ["a", "c"])
+        self.assertEqual(skipped, ["b"])
+
+    def test_expired_and_forced_keys_are_sent(self):
+        cache = self.create_cache(ttl=0)
+        cache.mark_published(["key"])
+        self.assertTrue(cache.should_publish("key"))
+        forced = self.create_cache(force=True)
+        forced.mark_published(["key"])
+        self.assertTrue(forced.should_publish("key"))
+
+
+if __name__ == "__main__":
+    unittest.main()
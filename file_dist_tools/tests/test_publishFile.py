@@ -0,0 +1,40 @@
+import unittest
+
+from tests.support import WorkDirTestCase, create_files
+
+
+class PublishChunksTest(WorkDirTestCase):
+    config_overrides = {"CACHE_CONFIG": {"ENABLED": "false"},
+                        "RETRY_CONFIG": {"RETRY_LIMIT": 1, "RETRY_DELAY": 0},
+                        "RATE_LIMIT_CONFIG": {"RATE": 1000, "MAX_RATE": 1000, "BURST": 1000}}
+
+    def create_user_request(self, count):
+        from fileEntry import FilesetRequest
+
+        return FilesetRequest("fileset", "bucket", "package", files=create_files(count)).to_user_request()
+
+    def test_split_chunks(self):
+        from publishFile import split_chunks
+
+        self.assertEqual([len(chunk) for chunk in split_chunks(iter(range(25)), 10)], [10, 10, 5])
+        self.assertEqual(list(split_chunks([], 10)), [])
+
+    def test_chunks_are_published_concurrently(self):
+        from publishFile import publish_chunks
+
+        server = self.start_mock_server()
+        report = publish_chunks(self.create_user_request(25), chunk_size=10, max_concurrency=4)
+        self.assertEqual((report.chunks, report.succeeded_chunks, report.published_files), (3, 3, 25))
+        self.assertEqual(server.stats["publish_requests"], 3)
+
+    def test_failed_chunks_are_reported(self):
+        from publishFile import publish_chunks
+
+        self.start_mock_server(error_rate_5xx=1.0)
+        report = publish_chunks(self.create_user_request(25), chunk_size=10, max_concurrency=4)
+        self.assertEqual((report.chunks, report.succeeded_chunks), (3, 0))
+        self.assertEqual(sorted(result["files"] for result in report.failed_results), [5, 10, 10])
+
+
+if __name__ == "__main__":
+    unittest.main()
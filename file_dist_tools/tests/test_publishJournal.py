@@ -0,0 +1,70 @@
+import sqlite3
+import unittest
+
+from tests.support import WorkDirTestCase, create_files
+
+USER_REQUEST = {"bucketname": "bucket", "packageid": "package", "filesetname": "fileset"}
+
+
+class PublishJournalTest(WorkDirTestCase):
+    def test_repeated_file_keeps_own_state(self):
+        from publishJournal import FAILED, PUBLISHED, PublishJournal
+
+        first, second, third = create_files(3)
+        repeated = create_files(1)[0]
+        with PublishJournal("journal.db") as journal:
+            run = journal.start_run(USER_REQUEST)
+            files = list(run.filter_published([first, second, repeated, third]))
+            run.add_chunk(1, files[:2])
+            run.add_chunk(2, files[2:])
+            run.update_chunk(1, FAILED)
+            run.update_chunk(2, PUBLISHED)
+
+            # the failed first occurrence is sent again, the published second one is not
+            resumed = journal.start_run(USER_REQUEST, resume=True)
+            files = [(file_input.filename, file_input.s3url) for file_input in
+                     resumed.filter_published(create_files(3)[:2] + create_files(1) + create_files(3)[2:])]
+        self.assertEqual(files, [("file_0.csv", first.s3url), ("file_1.csv", second.s3url)])
+        self.assertEqual(resumed.skipped_files, 2)
+
+    def test_repeated_file_is_matched_by_manifest_position(self):
+        from publishJournal import FAILED, PUBLISHED, PublishJournal
+
+        first, repeated = create_files(1) + create_files(1)
+        first.position, repeated.position = 100, 900
+        with PublishJournal("journal.db") as journal:
+            run = journal.start_run(USER_REQUEST)
+            files = list(run.filter_published([first, repeated]))
+            run.add_chunk(1, files[:1])
+            run.add_chunk(2, files[1:])
+            run.update_chunk(1, FAILED)
+            run.update_chunk(2, PUBLISHED)
+
+            # shards of --workers may send the records in another order
+            resumed = journal.start_run(USER_REQUEST, resume=True)
+            files = [file_input.position for file_input in resumed.filter_published([repeated, first])]
+        self.assertEqual(files, [100])
+
+    def test_journal_without_position_is_migrated(self):
+        from publishJournal import PUBLISHED, PublishJournal
+
+        connection = sqlite3.connect("journal.db")
+        connection.executescript("""
+CREATE TABLE files (run_key TEXT NOT NULL, filename TEXT NOT NULL, s3url TEXT NOT NULL, run_id INTEGER NOT NULL,
+    chunk_no INTEGER NOT NULL, state TEXT NOT NULL, updated_at REAL NOT NULL,
+    PRIMARY KEY (run_key, filename, s3url));
+CREATE INDEX files_chunk ON files (run_id, chunk_no);
+""")
+        file_input = create_files(1)[0]
+        with connection:
+            connection.execute("INSERT INTO files VALUES (?, ?, ?, 1, 1, ?, 0)",
+                               ("bucket/package/fileset", file_input.filename, file_input.s3url, PUBLISHED))
+        connection.close()
+
+        with PublishJournal("journal.db") as journal:
+            resumed = journal.start_run(USER_REQUEST, resume=True)
+            self.assertEqual(list(resumed.filter_published(create_files(1))), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+import urllib.request
+
+from tests.support import WorkDirTestCase
+
+
+class MetricsRegistryTest(WorkDirTestCase):
+    def test_render_counters_and_phases(self):
+        from publishMetrics import MetricsRegistry
+
+        registry = MetricsRegistry()
+        registry.inc("published_files_total", 10)
+        registry.set("circuit_breaker_state", 2)
+        registry.observe("http_request", 0.02)
+        registry.observe("http_request", 100)
+        text = registry.render()
+        self.assertIn("file_dist_published_files_total 10\n", text)
+        self.assertIn("file_dist_circuit_breaker_state 2\n", text)
+        self.assertIn('file_dist_phase_duration_seconds_bucket{phase="http_request",le="0.025"} 1\n', text)
+        self.assertIn('file_dist_phase_duration_seconds_bucket{phase="http_request",le="+Inf"} 2\n', text)
+        self.assertIn('file_dist_phase_duration_seconds_count{phase="http_request"} 2\n', text)
+
+    def test_merge_snapshot_of_another_process(self):
+        from publishMetrics import MetricsRegistry
+
+        worker = MetricsRegistry()
+        worker.inc("files_hashed_total", 3)
+        worker.observe("prepare_shard", 0.5)
+        registry = MetricsRegistry()
+        registry.inc("files_hashed_total", 1)
+        registry.merge(worker.snapshot())
+        registry.merge(worker.snapshot())
+        self.assertEqual(registry.counters["files_hashed_total"], 7)
+        self.assertEqual(registry.phases["prepare_shard"].count, 2)
+        self.assertEqual(sum(registry.phases["prepare_shard"].bucket_counts), 2)
+
+    def test_metrics_endpoint(self):
+        import publishMetrics
+
+        server = publishMetrics.start_http_server(0)
+        self.addCleanup(server.shutdown)
+        publishMetrics.inc("publish_requests_total", 0)
+        with urllib.request.urlopen("http://127.0.0.1:{}/metrics".format(server.server_address[1])) as response:
+            self.assertIn("# TYPE file_dist_publish_requests_total counter", response.read().decode("utf-8"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+import os
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import publishMetrics
+import publishProfiler
+from tests.support import WorkDirTestCase
+
+
+class PublishProfilerTest(WorkDirTestCase):
+    def profile_thread_pool(self):
+        with publishProfiler.PublishProfiler("profile") as profiler:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                list(executor.map(lambda value: publishMetrics.observe("test", value), [0.1] * 8))
+        return profiler
+
+    def test_worker_threads_are_profiled(self):
+        # per thread profiles up to Python 3.11, one profile seeing every thread from 3.12
+        for profile_per_thread in (True, False) if publishProfiler.PROFILE_PER_THREAD else (False,):
+            with self.subTest(profile_per_thread=profile_per_thread), \
+                    mock.patch("publishProfiler.PROFILE_PER_THREAD", profile_per_thread):
+                profiler = self.profile_thread_pool()
+                self.assertEqual(len(profiler.output_files), 3)
+                for output_file in profiler.output_files:
+                    self.assertTrue(os.path.getsize(output_file) > 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+from tests.support import WorkDirTestCase, create_files
+
+
+class PublisherTest(WorkDirTestCase):
+    config_overrides = {"CACHE_CONFIG": {"ENABLED": "false"}}
+
+    def test_publish_many_returns_results(self):
+        from fileEntry import FilesetRequest
+        from publisher import Publisher
+
+        server = self.start_mock_server()
+        requests = [FilesetRequest("fileset_{}".format(i), "bucket", "package", files=create_files(5))
+                    for i in range(3)]
+        with Publisher(chunk_size=10) as publisher:
+            results = publisher.publish_many(requests)
+        self.assertEqual([result.filesetname for result in results], ["fileset_0", "fileset_1", "fileset_2"])
+        self.assertTrue(all(result.success for result in results))
+        self.assertEqual(server.stats["published_files"], 15)
+
+    def test_validated_manifest_can_be_published_twice(self):
+        from publisher import Publisher
+
+        server = self.start_mock_server()
+        with open("files.csv", "w") as mf:
+            mf.write("FileName,S3Url\n")
+            for file_input in create_files(15):
+                mf.write("{},{}\n".format(file_input.filename, file_input.s3url))
+        with Publisher(chunk_size=10) as publisher:
+            validation = publisher.validate(manifest="files.csv", filesetname="fileset")
+            self.assertTrue(validation.valid)
+            results = [publisher.publish(validation.request) for _ in range(2)]
+        self.assertEqual([result.published_files for result in results], [15, 15])
+        self.assertEqual(server.stats["published_files"], 30)
+
+    def test_token_refresher_is_shared(self):
+        import rdpToken
+        from publisher import Publisher
+
+        self.start_mock_server()
+        first = Publisher(keep_token_warm=True)
+        second = Publisher(keep_token_warm=True)
+        first.open()
+        second.open()
+        refresher = rdpToken._tokenRefresher
+        first.close()
+        # still needed by the second publisher
+        self.assertTrue(refresher.is_alive())
+        second.close()
+        self.assertFalse(refresher.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
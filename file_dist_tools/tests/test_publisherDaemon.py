@@ -0,0 +1,34 @@
+import threading
+import time
+import unittest
+
+from tests.support import WorkDirTestCase
+
+
+class SpoolWatcherTest(WorkDirTestCase):
+    def create_watcher(self, poll_interval):
+        from publisherDaemon import SpoolWatcher
+
+        watcher = SpoolWatcher(".", poll_interval)
+        self.addCleanup(watcher.close)
+        # polling, as on systems without inotify
+        watcher.close()
+        return watcher
+
+    def test_directory_is_polled_every_poll_interval(self):
+        watcher = self.create_watcher(2.5)
+        start_time = time.monotonic()
+        watcher.wait(threading.Event())
+        self.assertGreaterEqual(time.monotonic() - start_time, 2.4)
+
+    def test_wait_ends_when_stopped(self):
+        watcher = self.create_watcher(30)
+        stop_event = threading.Event()
+        threading.Timer(0.1, stop_event.set).start()
+        start_time = time.monotonic()
+        watcher.wait(stop_event)
+        self.assertLess(time.monotonic() - start_time, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+import unittest
+
+from tests.support import WorkDirTestCase
+
+
+class RateLimiterTest(WorkDirTestCase):
+    def test_rate_is_clamped(self):
+        import rateLimiter
+
+        self.assertEqual(rateLimiter.RateLimiter(rate=500, min_rate=1, max_rate=100).rate, 100)
+        self.assertEqual(rateLimiter.RateLimiter(rate=0, min_rate=1, max_rate=100).rate, 1)
+        self.assertEqual(rateLimiter.RateLimiter(rate=20, min_rate=1, max_rate=100).rate, 20)
+
+    def test_invalid_range_is_rejected(self):
+        import globalConfig
+        import rateLimiter
+        from exceptions import InvalidConfigurationException
+
+        self.assertRaises(ValueError, rateLimiter.RateLimiter, min_rate=0)
+        self.assertRaises(ValueError, rateLimiter.RateLimiter, min_rate=10, max_rate=5)
+        self.write_config({"RATE_LIMIT_CONFIG": {"MIN_RATE": 10, "MAX_RATE": 5}})
+        globalConfig.reload_config()
+        self.assertRaises(InvalidConfigurationException, rateLimiter.get_rate_limiter)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import threading
+import time
+import unittest
+
+from tests.support import WorkDirTestCase, create_files
+
+
+class TokenCacheTest(WorkDirTestCase):
+    def test_concurrent_callers_share_one_token_request(self):
+        import rdpToken
+
+        server = self.start_mock_server()
+        tokens = []
+        threads = [threading.Thread(target=lambda: tokens.append(rdpToken.getToken())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(tokens)), 1)
+        self.assertEqual(rdpToken.getToken(), tokens[0])
+        self.assertEqual(server.stats["token_requests"], 1)
+
+
+class TokenRefresherTest(WorkDirTestCase):
+    def test_token_is_renewed_before_expiry(self):
+        import rdpToken
+
+        # expiry_tm is 10 seconds before the token expires
+        server = self.start_mock_server(token_expires_in=13)
+        first_token = rdpToken.getToken()
+        self.assertIsNotNone(rdpToken.startTokenRefresher(refreshAhead=2, force=True))
+        self.addCleanup(rdpToken.stopTokenRefresher)
+        deadline = time.monotonic() + 10
+        while rdpToken.getToken() == first_token and time.monotonic() < deadline:
+            time.sleep(0.05)
+        # renewed by the refresher thread, callers never asked for a token
+        self.assertNotEqual(rdpToken.getToken(), first_token)
+        self.assertEqual(server.stats["token_requests"], 2)
+
+
+class RejectedTokenTest(WorkDirTestCase):
+    config_overrides = {"CACHE_CONFIG": {"ENABLED": "false"}}
+
+    def test_revoked_token_is_renewed_once(self):
+        import rdpToken
+        from fileEntry import FilesetRequest
+        from publisher import Publisher
+
+        server = self.start_mock_server()
+        for engine in ("thread", "asyncio"):
+            with self.subTest(engine=engine):
+                with Publisher(max_concurrency=4, chunk_size=10, engine=engine) as publisher:
+                    rdpToken.getToken()
+                    token_requests = server.stats["token_requests"]
+                    # server side revocation, the cached token looks valid for minutes
+                    for access_token in server._tokens:
+                        server._tokens[access_token] = 0
+                    result = publisher.publish(FilesetRequest("fileset", "bucket", "package",
+                                                              files=create_files(100)))
+                self.assertEqual(result.failed_chunks, [])
+                self.assertEqual(result.published_files, 100)
+                # the concurrent 401 responses share one refresh
+                self.assertEqual(server.stats["token_requests"], token_requests + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import json
+import time
+import unittest
+
+from tests.support import WorkDirTestCase, create_files
+
+
+class ResultSinkTest(WorkDirTestCase):
+    config_overrides = {"CACHE_CONFIG": {"ENABLED": "false"}}
+
+    def test_records_are_flushed_without_new_chunks(self):
+        from resultSink import ResultSink
+
+        result = {"chunk": 1, "status": "success", "status_code": 200, "attempts": 1, "duration": 0.1, "error": ""}
+        with ResultSink("results.jsonl", flush_interval=0.05) as sink:
+            sink.add_chunk("fileset", result, create_files(3))
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                with open("results.jsonl") as rf:
+                    if len(rf.readlines()) == 3:
+                        break
+                time.sleep(0.01)
+            else:
+                self.fail("result records were not flushed")
+
+    def test_resumed_files_are_written_as_skipped(self):
+        from fileEntry import FilesetRequest
+        from publisher import Publisher
+
+        self.start_mock_server()
+        request = FilesetRequest("fileset", "bucket", "package", files=create_files(20))
+        with Publisher(chunk_size=10, journal_file="journal.db") as publisher:
+            publisher.publish(request)
+        with Publisher(chunk_size=10, journal_file="journal.db", resume=True, result_file="results.jsonl") as publisher:
+            result = publisher.publish(request)
+        self.assertEqual((result.chunks, result.skipped_files), (0, 20))
+
+        with open("results.jsonl") as rf:
+            records = [json.loads(line) for line in rf]
+        self.assertEqual([record["filename"] for record in records], [f.filename for f in create_files(20)])
+        self.assertTrue(all(record["status"] == "skipped" for record in records))
+        self.assertEqual(records[0]["error"], "already published (journal)")
+
+
+if __name__ == "__main__":
+    unittest.main()
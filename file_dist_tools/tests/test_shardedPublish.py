@@ -0,0 +1,31 @@
+import unittest
+
+from tests.support import WorkDirTestCase, create_files
+
+
+class ShardedPublishTest(WorkDirTestCase):
+    config_overrides = {"CACHE_CONFIG": {"ENABLED": "false"},
+                        "RATE_LIMIT_CONFIG": {"RATE": 1000, "MAX_RATE": 1000, "BURST": 1000}}
+
+    def test_workers_publish_every_record_once(self):
+        from publisher import Publisher
+
+        server = self.start_mock_server()
+        with open("files.csv", "w") as mf:
+            mf.write("FileName,S3Url\n")
+            for file_input in create_files(250):
+                mf.write("{},{}\n".format(file_input.filename, file_input.s3url))
+        with Publisher(chunk_size=10, workers=3, journal_file="journal.db") as publisher:
+            validation = publisher.validate(manifest="files.csv", filesetname="fileset")
+            result = publisher.publish(validation.request)
+            self.assertEqual((result.status, result.published_files), ("success", 250))
+            self.assertEqual(server.stats["published_files"], 250)
+
+        # a resumed run, with or without workers, finds every record in the journal
+        with Publisher(chunk_size=10, journal_file="journal.db", resume=True) as publisher:
+            result = publisher.publish(validation.request)
+        self.assertEqual((result.chunks, result.skipped_files), (0, 250))
+
+
+if __name__ == "__main__":
+    unittest.main()
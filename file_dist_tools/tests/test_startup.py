@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+import unittest
+
+from tests.support import TOOLS_DIR, WorkDirTestCase
+
+
+class StartupTest(WorkDirTestCase):
+    def test_import_has_no_side_effects(self):
+        # a fresh interpreter, the modules are imported from the working directory
+        code = "import sys; sys.path.insert(0, {!r}); import publishFile; " \
+               "print(','.join(name for name in ('requests', 'asyncio') if name in sys.modules))".format(TOOLS_DIR)
+        before = sorted(os.listdir("."))
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "")
+        self.assertEqual(sorted(os.listdir(".")), before)
+
+    def test_help_does_not_read_token(self):
+        completed = subprocess.run([sys.executable, os.path.join(TOOLS_DIR, "publishFile.py"), "-h"],
+                                   capture_output=True, text=True)
+        self.assertEqual(completed.returncode, 0)
+        self.assertFalse(os.path.exists("log"))
+
+
+if __name__ == "__main__":
+    unittest.main()
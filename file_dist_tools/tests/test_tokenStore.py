@@ -0,0 +1,46 @@
+import multiprocessing
+import os
+import unittest
+
+from tests.support import WorkDirTestCase
+
+
+def write_tokens(token_file, user_file, count):
+    from tokenStore import TokenStore
+
+    store = TokenStore(token_file, user_file)
+    for i in range(count):
+        store.write({"access_token": "token-{}-{}".format(os.getpid(), i)}, "user")
+
+
+class TokenStoreTest(WorkDirTestCase):
+    def test_write_bumps_version(self):
+        from tokenStore import TokenStore
+
+        store = TokenStore("token.txt", "current_user.json")
+        self.assertIsNone(store.read())
+        self.assertEqual(store.write({"access_token": "first"}, "user"), 1)
+        self.assertEqual(store.write({"access_token": "second"}, "user"), 2)
+        self.assertEqual(store.read()["access_token"], "second")
+        self.assertEqual(store.readUser(), "user")
+        # files are replaced, no temporary file is left behind
+        self.assertEqual(sorted(name for name in os.listdir(".") if name.endswith(".tmp")), [])
+        store.remove()
+        self.assertIsNone(store.read())
+
+    def test_processes_do_not_lose_versions(self):
+        from tokenStore import TokenStore
+
+        context = multiprocessing.get_context("spawn")
+        processes = [context.Process(target=write_tokens, args=("token.txt", "current_user.json", 10))
+                     for _ in range(3)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual([process.exitcode for process in processes], [0, 0, 0])
+        self.assertEqual(TokenStore("token.txt", "current_user.json").read()["version"], 30)
+
+
+if __name__ == "__main__":
+    unittest.main()
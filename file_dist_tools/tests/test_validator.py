@@ -0,0 +1,80 @@
+import unittest
+
+from tests.support import WorkDirTestCase
+
+HEADER = "FileName,S3Url,FileSizeInBytes\n"
+
+
+def write_manifest(manifest_file, rows, invalid_rows=()):
+    with open(manifest_file, "w") as mf:
+        mf.write(HEADER)
+        for i in range(rows):
+            s3url = "not-an-url" if i in invalid_rows else "https://bucket.s3.amazonaws.com/file_{}.csv".format(i)
+            mf.write("file_{0}.csv,{1},{0}\n".format(i, s3url))
+
+
+class ValidatorTest(WorkDirTestCase):
+    def test_parallel_validation(self):
+        import validator
+
+        write_manifest("files.csv", 2000)
+        self.assertEqual(validator.validate_manifest("files.csv", workers=2, batch_size=100, parallel_min_bytes=0),
+                         2000)
+
+    def test_parallel_validation_reports_every_invalid_record(self):
+        import validator
+        from exceptions import ManifestValidationException
+
+        write_manifest("files.csv", 2000, invalid_rows=(10, 1500))
+        with self.assertRaises(ManifestValidationException) as context:
+            validator.validate_manifest("files.csv", workers=2, batch_size=100, parallel_min_bytes=0)
+        self.assertEqual([record_number for record_number, _ in context.exception.errors], [11, 1501])
+
+    def test_shards_and_full_read_have_the_same_positions(self):
+        import validator
+
+        write_manifest("files.csv", 100)
+        positions = [file_input.position for file_input in validator.read_manifest("files.csv")]
+        self.assertEqual(positions[0], len(HEADER))
+        shard_positions = [file_input.position for start, end in validator.split_manifest("files.csv", 3)
+                           for file_input in validator.read_manifest_shard("files.csv", start, end)]
+        self.assertEqual(shard_positions, positions)
+
+
+
+class ManifestReaderTest(WorkDirTestCase):
+    def test_csv_manifest(self):
+        import validator
+
+        with open("files.csv", "w") as mf:
+            mf.write("# comment\nFileName,S3Url,Description,FileSizeInBytes\n\n"
+                     "a.csv,https://bucket.s3.amazonaws.com/a.csv,\"two\nlines, quoted\",12\n"
+                     "# skipped\nb.csv,https://bucket.s3.amazonaws.com/b.csv,,\n")
+        files = list(validator.read_manifest("files.csv"))
+        self.assertEqual([(f.filename, f.description, f.filesizeinbytes) for f in files],
+                         [("a.csv", "two\nlines, quoted", 12), ("b.csv", None, None)])
+
+    def test_jsonl_manifest(self):
+        import validator
+
+        with open("files.jsonl", "w") as mf:
+            mf.write('{"FileName": "a.csv", "S3Url": "https://bucket.s3.amazonaws.com/a.csv", "Md5": null}\n'
+                     '\n{"FileName": "b.csv", "S3Url": "https://bucket.s3.amazonaws.com/b.csv", '
+                     '"FileSizeInBytes": 7}\n')
+        files = list(validator.read_manifest("files.jsonl"))
+        self.assertEqual([(f.filename, f.md5, f.filesizeinbytes) for f in files],
+                         [("a.csv", None, None), ("b.csv", None, 7)])
+
+    def test_records_are_read_one_at_a_time(self):
+        import validator
+
+        write_manifest("files.csv", 10, invalid_rows=(5,))
+        files = validator.read_manifest("files.csv")
+        # the invalid record is only reached after the valid ones were used
+        self.assertEqual(next(files).filename, "file_0.csv")
+        with self.assertRaises(Exception):
+            list(files)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+#=============================================================================
+# Token store shared by concurrent publishFile.py processes
+#   - token and current user files are replaced atomically (write temp file + rename),
+#     so readers never see a partially written file and do not need a lock
+#   - writers hold an exclusive fcntl lock on <token file>.lock, so only one process
+#     renews the token and the others pick up the renewed token from the file
+#   - every saved token gets a version counter to tell which token is the newest
+#=============================================================================
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # file locking is not available (Windows), only threads of this process are synchronized
+    fcntl = None
+
+
+class TokenStore:
+    def __init__(self, token_file, user_file):
+        self.token_file = token_file
+        self.user_file = user_file
+        self.lock_file = token_file + ".lock"
+        self._thread_lock = threading.RLock()
+        self._lock_depth = 0
+        self._lock_fd = None
+
+    # -----------------------------------------------------------
+    # Hold exclusive lock across processes, re-entrant within a thread
+    # -----------------------------------------------------------
+    @contextmanager
+    def lock(self):
+        with self._thread_lock:
+            if self._lock_depth == 0:
+                self._lock_fd = open(self.lock_file, "a+")
+                if fcntl is not None:
+                    fcntl.flock(self._lock_fd.fileno(), fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield self
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    if fcntl is not None:
+                        fcntl.flock(self._lock_fd.fileno(), fcntl.LOCK_UN)
+                    self._lock_fd.close()
+                    self._lock_fd = None
+
+    # -----------------------------------------------------------
+    # Read token object, None if there is no token file
+    # -----------------------------------------------------------
+    def read(self):
+        return _readJson(self.token_file)
+
+    def readUser(self):
+        user_object = _readJson(self.user_file)
+        return None if user_object is None else user_object.get("username")
+
+    # -----------------------------------------------------------
+    # Save token and current user, bump version of the token
+    # -----------------------------------------------------------
+    def write(self, tknObject, username):
+        with self.lock():
+            current = self.read()
+            tknObject["version"] = (current.get("version", 0) if current is not None else 0) + 1
+            _writeJsonAtomic(self.token_file, tknObject, indent=4)
+            _writeJsonAtomic(self.user_file, {"username": username}, indent=2)
+        return tknObject["version"]
+
+    def remove(self):
+        with self.lock():
+            if os.path.exists(self.token_file):
+                os.remove(self.token_file)
+
+
+def _readJson(file_name):
+    try:
+        with open(file_name, "r") as jf:
+            return json.load(jf)
+    except (OSError, ValueError):
+        return None
+
+
+def _writeJsonAtomic(file_name, data, indent=None):
+    import tempfile
+
+    directory = os.path.dirname(os.path.abspath(file_name))
+    fd, temp_file = tempfile.mkstemp(prefix=os.path.basename(file_name) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as tf:
+            json.dump(data, tf, indent=indent)
+            tf.flush()
+            os.fsync(tf.fileno())
+        os.replace(temp_file, file_name)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
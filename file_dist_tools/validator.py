@@ -1,6 +1,12 @@
 import configparser
+import csv
+import json
+import os
 import re
 
+import publishMetrics
+from fileEntry import FileEntry
+from globalConfig import get_config
 from loggingFileDist import get_app_logger, get_error_logger
 from exceptions import *
 
@@ -17,28 +23,37 @@ S3_URL_REGEX = "^https:\/\/(s3\.?[a-zA-Z0-9-]*|[a-zA-Z0-9-]*\.s3\.?[a-zA-Z0-9-]*
                "a-zA-Z0-9-]*\.mrap\.accesspoint\.s3-global)\.amazonaws\.com\/.*$"
 ROLEARN_REGEX = "^arn:aws:iam::[0-9]+:role\/.+$"
 CFS_FILES_FIELD_LIST = ["filename", "filetype", "description", "filesizeinbytes", "md5", "s3url", "rolearn"]
+# compiled once, validate_field_value runs for every field of every file
+S3_URL_PATTERN = re.compile(S3_URL_REGEX)
+ROLEARN_PATTERN = re.compile(ROLEARN_REGEX)
+CFS_FILES_FIELDS = frozenset(CFS_FILES_FIELD_LIST)
+
+VALIDATION_CONFIG_KEY = "VALIDATION_CONFIG"
+# maximum number of errors kept in ManifestValidationException
+MAX_REPORTED_ERRORS = 1000
 
 
 # -----------------------------------------------------------
 # Validate user input from global configuration file (global.ini)
 # -----------------------------------------------------------
+@publishMetrics.timer("validate_global_config")
 def validate_global_config(user_request):
-    config = configparser.ConfigParser()
-    config.read(GLOBAL_CONFIG_FILE)
+    config = get_config()
 
     # Check Require field
-    if "username" not in config[RDP_KEY] or "password" not in config[RDP_KEY] or "clientId" not in config[RDP_KEY]:
+    if config.rdp is None or config.rdp.username is None or config.rdp.password is None \
+            or config.rdp.client_id is None:
         raise InvalidConfigurationException(GLOBAL_CONFIG_FILE,
                                             "Please specify 'username', 'password' and 'clientId' on your "
                                             "global configuration file")
 
     # Check Require field
-    if "bucketName" not in config[GLOBAL_KEY] or "packageId" not in config[GLOBAL_KEY]:
+    if "bucketname" not in config.cfs_global or "packageid" not in config.cfs_global:
         raise InvalidConfigurationException(GLOBAL_CONFIG_FILE,
                                             "Please specify 'bucketName' and 'packageId' on your "
                                             "global configuration file")
 
-    for key, value in config[GLOBAL_KEY].items():
+    for key, value in config.cfs_global.items():
         user_request[key] = value
         if value is None or value == "":
             raise InvalidConfigurationException(GLOBAL_CONFIG_FILE,
@@ -56,6 +71,7 @@ def validate_global_config(user_request):
 # -----------------------------------------------------------
 # Validate user input from configuration file (config.ini)
 # -----------------------------------------------------------
+@publishMetrics.timer("validate_config")
 def validate_config(config_file, user_request):
     config = configparser.ConfigParser(allow_no_value=True)
     config.read(config_file)
@@ -67,39 +83,357 @@ def validate_config(config_file, user_request):
     for key, value in config[CONFIG_KEY].items():
         user_request[key] = value
 
-    files = []
-
     cfs_file_config = list(config[CFS_FILE_KEY].items())
-    if len(cfs_file_config) > 11:
+    if len(cfs_file_config) < 2:
         raise InvalidConfigurationException(config_file, f"Please check [{CFS_FILE_KEY}], "
-                                                         f"This tools support only 10 files per config")
+                                                         f"at least one file should be specified")
 
     column_list = map_column_list(cfs_file_config[0][0])
-    for key, value in cfs_file_config[1:]:
-        file_raw = key + ":" + value
-        # use regex to split comma value ignoring double quote values
-        file_list = re.split(r",(?=(?:[^\"]*\"[^\"]*\")*[^\"]*$)", file_raw)
-        file_input = {}
+    # csv splits comma value ignoring double quote values
+    rows = csv.reader(key + ":" + value for key, value in cfs_file_config[1:])
+    files, errors = validate_rows(config_file, column_list, rows)
+    if len(errors) > 0:
+        raise ManifestValidationException(config_file, errors[:MAX_REPORTED_ERRORS], len(errors))
+    user_request["files"] = files
 
+
+# -----------------------------------------------------------
+# Validate rows of one file list and collect every error
+# -----------------------------------------------------------
+def validate_rows(config_file, column_list, rows, first_record=1):
+    files = []
+    errors = []
+    filename_index = column_list.index("filename")
+    for record_number, file_list in enumerate(rows, start=first_record):
         try:
-            file_name = file_list[column_list.index("filename")]
-            for i in range(0, len(file_list)):
-                field_name = column_list[i]
-                field_value = file_list[i].replace("\"", "")
+            files.append(validate_file_row(config_file, column_list, file_list, filename_index))
+        except (InvalidConfigurationException, InvalidFieldValueException, UnrecognizedFieldException) as err:
+            errors.append((record_number, str(err)))
+    return files, errors
+
+
+# -----------------------------------------------------------
+# Check rows of one file list without building file entries
+#   - field checks are resolved once per column mapping
+#   - every invalid field of every row is reported
+# -----------------------------------------------------------
+def check_rows(config_file, column_list, rows, first_record=1):
+    errors = []
+    filename_index = column_list.index("filename")
+    column_count = len(column_list)
+    column_checks = [(index, field_name, FIELD_CHECKS[field_name])
+                     for index, field_name in enumerate(column_list) if field_name in FIELD_CHECKS]
+    for record_number, file_list in enumerate(rows, start=first_record):
+        field_count = len(file_list)
+        if field_count <= filename_index or field_count > column_count:
+            file_name = file_list[filename_index] if field_count > filename_index else None
+            errors.append((record_number, str(InvalidConfigurationException(
+                config_file, f"Input has invalid column mapping on file: {file_name}"))))
+            continue
+
+        file_name = file_list[filename_index]
+        for index, field_name, check_field in column_checks:
+            if index < field_count:
+                field_value = file_list[index].replace("\"", "")
+                message = check_field(field_value)
+                if message is not None:
+                    errors.append((record_number, str(InvalidFieldValueException(
+                        file_name, field_name, field_value, message))))
+    return errors
+
+
+# -----------------------------------------------------------
+# Validate a file row against the column mapping
+# -----------------------------------------------------------
+def validate_file_row(config_file, column_list, file_list, filename_index=None, validate=True):
+    file_name = None
+    if filename_index is None:
+        filename_index = column_list.index("filename")
+    try:
+        file_name = file_list[filename_index]
+        field_values = [field_value.replace("\"", "") for field_value in file_list]
+        if validate:
+            for field_name, field_value in zip(column_list, field_values):
                 validate_field_value(file_name, field_name, field_value)
-                # omit empty field value
-                if len(field_value) > 0:
-                    file_input[field_name] = field_value
-            files.append(file_input)
-        except IndexError:
-            raise InvalidConfigurationException(config_file, f"Input has invalid column mapping on file: {file_name}")
-    user_request["files"] = files
+        if len(file_list) > len(column_list):
+            raise IndexError(len(file_list))
+    except IndexError:
+        raise InvalidConfigurationException(config_file, f"Input has invalid column mapping on file: {file_name}")
+    # empty field values are omitted
+    return FileEntry.from_row(column_list, field_values)
+
+
+# -----------------------------------------------------------
+# Read file records from manifest file (csv or jsonl) one at a time
+# -----------------------------------------------------------
+#   every entry has the byte offset of its record in position, the same with or without --workers
+# -----------------------------------------------------------
+def read_manifest(manifest_file, validate=True):
+    return _read_manifest_records(manifest_file, 0, None, validate, header=True)
+
+
+def _manifest_type(manifest_file):
+    manifest_type = manifest_file.lower().rsplit(".", 1)[-1]
+    if manifest_type not in ("csv", "jsonl"):
+        raise InvalidConfigurationException(manifest_file, "Manifest file should be a .csv or .jsonl file")
+    return manifest_type
+
+
+def _read_manifest_lines(manifest_file):
+    with open(manifest_file, "r", newline="") as mf:
+        for line in mf:
+            # skip empty line and comment line
+            stripped_line = line.lstrip()
+            if len(stripped_line) == 0 or stripped_line[0] == "#":
+                continue
+            yield line
+
+
+def _read_csv_header(manifest_file, lines):
+    return _map_csv_header(manifest_file, next(csv.reader(lines), None))
+
+
+def _map_csv_header(manifest_file, header):
+    if header is None:
+        raise InvalidConfigurationException(manifest_file, "Manifest file is empty")
+    # first row defines the field mapping like [CFS_FILES] config
+    return map_column_list(",".join(column.strip() for column in header))
+
+
+# -----------------------------------------------------------
+# Files of a validated manifest, read again from the file on every iteration
+# -----------------------------------------------------------
+class ManifestFiles:
+    def __init__(self, manifest_file):
+        self.manifest_file = manifest_file
+
+    def __iter__(self):
+        return read_manifest(self.manifest_file, validate=False)
+
+    def __repr__(self):
+        return "ManifestFiles({!r})".format(self.manifest_file)
+
+
+def _read_manifest_records(manifest_file, start, end, validate=True, header=False):
+    lines = _read_shard_lines(manifest_file, start, end)
+    if _manifest_type(manifest_file) == "csv":
+        records = _read_csv_records(lines)
+        if header:
+            column_list = _map_csv_header(manifest_file, next(records, (None, None))[1])
+        else:
+            # shards hold data records only, the header is read from the start of the file
+            column_list = _read_csv_header(manifest_file, _read_manifest_lines(manifest_file))
+        filename_index = column_list.index("filename")
+        for position, file_list in records:
+            file_input = validate_file_row(manifest_file, column_list, file_list, filename_index, validate)
+            file_input.position = position
+            yield file_input
+    else:
+        for line_number, (position, line) in enumerate(lines, start=1):
+            file_input = _parse_jsonl_record(manifest_file, line_number, line, validate)
+            file_input.position = position
+            yield file_input
+
+
+def _read_csv_records(lines):
+    # a quoted field may span lines, a record starts at its first line
+    positions = []
+
+    def read_lines():
+        for position, line in lines:
+            positions.append(position)
+            yield line
+
+    for file_list in csv.reader(read_lines()):
+        yield positions[0], file_list
+        positions.clear()
+
+
+def _parse_jsonl_record(manifest_file, line_number, line, validate=True):
+    try:
+        record = json.loads(line)
+    except ValueError:
+        raise InvalidConfigurationException(manifest_file, f"Invalid JSON on record {line_number}")
+    if not isinstance(record, dict):
+        raise InvalidConfigurationException(manifest_file, f"Record {line_number} should be a JSON object")
+
+    # omit null field value
+    fields = [(key, value) for key, value in record.items() if value is not None]
+    column_list = map_column_list(",".join(key for key, _ in fields))
+    return validate_file_row(manifest_file, column_list, [str(value) for _, value in fields], validate=validate)
+
+
+# -----------------------------------------------------------
+# Split manifest file into byte ranges of whole records, one per worker process
+# -----------------------------------------------------------
+def split_manifest(manifest_file, shard_count):
+    manifest_type = _manifest_type(manifest_file)
+    file_size = os.path.getsize(manifest_file)
+    with open(manifest_file, "rb") as mf:
+        start = 0
+        if manifest_type == "csv":
+            # the header is read by every shard, shards hold data records only
+            while True:
+                line = mf.readline()
+                stripped_line = line.lstrip()
+                if len(line) == 0 or (len(stripped_line) > 0 and stripped_line[:1] != b"#"):
+                    break
+            start = mf.tell()
+
+        boundaries = [start]
+        for shard in range(1, shard_count):
+            # move to the start of the next record
+            mf.seek(max(start + (file_size - start) * shard // shard_count - 1, boundaries[-1]))
+            mf.readline()
+            if mf.tell() >= file_size:
+                break
+            if mf.tell() > boundaries[-1]:
+                boundaries.append(mf.tell())
+    boundaries.append(file_size)
+    return [(shard_start, shard_end) for shard_start, shard_end in zip(boundaries, boundaries[1:])
+            if shard_end > shard_start]
+
+
+# -----------------------------------------------------------
+# Read file records of one manifest byte range, records are validated before
+# -----------------------------------------------------------
+def read_manifest_shard(manifest_file, start, end):
+    return _read_manifest_records(manifest_file, start, end, validate=False)
+
+
+# -----------------------------------------------------------
+# Lines of a manifest byte range with their byte offset, end None reads to the end of the file
+# -----------------------------------------------------------
+def _read_shard_lines(manifest_file, start, end):
+    # deferred, only --workers runs read byte ranges
+    import locale
+
+    # same encoding as the text mode reads of _read_manifest_lines
+    encoding = locale.getpreferredencoding(False)
+    with open(manifest_file, "rb") as mf:
+        mf.seek(start)
+        position = start
+        while end is None or position < end:
+            line = mf.readline()
+            if len(line) == 0:
+                break
+            line_position = position
+            position += len(line)
+            line = line.decode(encoding)
+            # skip empty line and comment line
+            stripped_line = line.lstrip()
+            if len(stripped_line) == 0 or stripped_line[0] == "#":
+                continue
+            yield line_position, line
+
+
+# -----------------------------------------------------------
+# Validate every record of manifest file before publishing
+#   - records are validated in batches, on a process pool for large manifests
+#   - every invalid record is reported at once with ManifestValidationException
+# -----------------------------------------------------------
+@publishMetrics.timer("validate_manifest")
+def validate_manifest(manifest_file, workers=None, batch_size=None, parallel_min_bytes=None):
+    config_workers, config_batch_size, config_parallel_min_bytes = _load_validation_config()
+    workers = config_workers if workers is None else workers
+    batch_size = config_batch_size if batch_size is None else batch_size
+    parallel_min_bytes = config_parallel_min_bytes if parallel_min_bytes is None else parallel_min_bytes
+    if workers < 1:
+        workers = os.cpu_count() or 1
+
+    manifest_type = _manifest_type(manifest_file)
+    lines = _read_manifest_lines(manifest_file)
+    column_list = _read_csv_header(manifest_file, lines) if manifest_type == "csv" else None
+    batches = _split_batches(lines, batch_size)
+
+    if workers > 1 and os.path.getsize(manifest_file) >= parallel_min_bytes:
+        record_count, error_count, errors = _validate_batches_parallel(manifest_file, column_list, batches, workers)
+    else:
+        record_count, error_count, errors = 0, 0, []
+        for first_record, batch in batches:
+            batch_count, batch_errors = _validate_batch(manifest_file, column_list, first_record, batch)
+            record_count += batch_count
+            error_count += len(batch_errors)
+            errors.extend(batch_errors[:MAX_REPORTED_ERRORS - len(errors)])
+
+    if error_count > 0:
+        raise ManifestValidationException(manifest_file, sorted(errors), error_count)
+    app_logger.info("Manifest {} validated, {} records".format(manifest_file, record_count))
+    return record_count
+
+
+def _validate_batches_parallel(manifest_file, column_list, batches, workers):
+    # deferred, process pool is only needed for large manifests
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+    record_count, error_count, errors = 0, 0, []
+    # spawn as with --workers, forked children would inherit locks held by the log listener threads
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        pending = set()
+        for first_record, batch in batches:
+            # keep a bounded number of batches in memory
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch_count, batch_errors = future.result()
+                    record_count += batch_count
+                    error_count += len(batch_errors)
+                    errors.extend(batch_errors)
+            pending.add(executor.submit(_validate_batch, manifest_file, column_list, first_record, batch))
+        for future in pending:
+            batch_count, batch_errors = future.result()
+            record_count += batch_count
+            error_count += len(batch_errors)
+            errors.extend(batch_errors)
+    # batches complete out of order, keep the first errors of the manifest
+    return record_count, error_count, sorted(errors)[:MAX_REPORTED_ERRORS]
+
+
+def _validate_batch(manifest_file, column_list, first_record, lines):
+    # csv batch shares the header mapping, jsonl records carry their own field names
+    if column_list is not None:
+        return len(lines), check_rows(manifest_file, column_list, csv.reader(lines), first_record)
+
+    errors = []
+    for record_number, line in enumerate(lines, start=first_record):
+        try:
+            _parse_jsonl_record(manifest_file, record_number, line)
+        except (InvalidConfigurationException, InvalidFieldValueException, UnrecognizedFieldException) as err:
+            errors.append((record_number, str(err)))
+    return len(lines), errors
+
+
+def _split_batches(lines, batch_size):
+    batch = []
+    first_record = 1
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= batch_size:
+            yield first_record, batch
+            first_record += len(batch)
+            batch = []
+    if len(batch) > 0:
+        yield first_record, batch
+
+
+def _load_validation_config():
+    config = get_config()
+    workers = config.getint(VALIDATION_CONFIG_KEY, "WORKERS", fallback=0)
+    batch_size = config.getint(VALIDATION_CONFIG_KEY, "BATCH_SIZE", fallback=20000)
+    parallel_min_bytes = config.getint(VALIDATION_CONFIG_KEY, "PARALLEL_MIN_BYTES", fallback=16 * 1024 * 1024)
+    return workers, batch_size, parallel_min_bytes
 
 
 def map_column_list(header_column):
     columns = header_column.split(",")
     formatted_columns = list(map(lambda value: value.lower(), columns))
 
+    # unknown columns are rejected once per mapping instead of once per row
+    for column in formatted_columns:
+        if column not in CFS_FILES_FIELDS:
+            raise UnrecognizedFieldException(column)
+
     if "filename" not in formatted_columns:
         raise InvalidConfigurationException(GLOBAL_CONFIG_FILE, "Required \"filename\" field is missing")
 
@@ -111,6 +445,7 @@ def map_column_list(header_column):
 # -----------------------------------------------------------
 # Validate user input from python argument
 # -----------------------------------------------------------
+@publishMetrics.timer("validate_argument")
 def validate_argument(args, user_request):
     # Require field
     if args.filesetname is not None:
@@ -129,6 +464,48 @@ def validate_argument(args, user_request):
     else:
         raise Exception("ERROR: Please specify  -s3url <S3 Url> or --s3url <S3 Url> ")
 
+    validate_fileset_argument(args, user_request)
+
+    # Optional field
+    if args.rolearn is not None:
+        user_request["roleArn"] = args.rolearn
+
+    # Optional field
+    if args.description is not None:
+        user_request["description"] = args.description
+
+    # Optional field
+    if args.filesizeinbytes is not None:
+        try:
+            user_request["filesizeinbytes"] = int(args.filesizeinbytes)
+        except ValueError:
+            raise InvalidFieldValueException(None, "filesizeinbytes", args.filesizeinbytes, "value should be numeric value")
+
+
+# -----------------------------------------------------------
+# Validate user input from python argument with manifest file
+# -----------------------------------------------------------
+@publishMetrics.timer("validate_manifest_argument")
+def validate_manifest_argument(args, user_request):
+    # Require field
+    if args.filesetname is not None:
+        user_request["filesetname"] = args.filesetname
+    else:
+        raise Exception("ERROR: Please specify -fs <file-set name> or --filesetname <file-set name> ")
+
+    validate_fileset_argument(args, user_request)
+
+    # every record is validated first, so nothing is published from an invalid manifest
+    validate_manifest(args.manifest)
+    # files are read one by one while publishing, or by worker processes with --workers
+    user_request["manifest"] = args.manifest
+    user_request["files"] = ManifestFiles(args.manifest)
+
+
+# -----------------------------------------------------------
+# Validate file-set level fields from python argument
+# -----------------------------------------------------------
+def validate_fileset_argument(args, user_request):
     # Optional field
     if args.attributes is not None:
         # overide global config
@@ -140,10 +517,6 @@ def validate_argument(args, user_request):
             attributes.append(attribute_dict)
         user_request["attributes"] = attributes
 
-    # Optional field
-    if args.rolearn is not None:
-        user_request["roleArn"] = args.rolearn
-
     # Optional field
     if args.contentfrom is not None:
         # overide global config
@@ -162,41 +535,47 @@ def validate_argument(args, user_request):
     if args.availableto is not None:
         user_request["availableto"] = args.availableto
 
-    # Optional field
-    if args.description is not None:
-        user_request["description"] = args.description
-
-    # Optional field
-    if args.filesizeinbytes is not None:
-        try:
-            user_request["filesizeinbytes"] = int(args.filesizeinbytes)
-        except ValueError:
-            raise InvalidFieldValueException(None, "filesizeinbytes", args.filesizeinbytes, "value should be numeric value")
-
 
 def validate_field_value(file_name, field_name, field_value):
-    if field_name not in CFS_FILES_FIELD_LIST:
+    if field_name not in CFS_FILES_FIELDS:
         raise UnrecognizedFieldException(field_name)
 
-    if field_name == "filename":
-        if len(field_value) < 1:
-            raise InvalidFieldValueException(file_name, field_name, field_value, "should not be empty")
+    check_field = FIELD_CHECKS.get(field_name)
+    if check_field is not None:
+        message = check_field(field_value)
+        if message is not None:
+            raise InvalidFieldValueException(file_name, field_name, field_value, message)
 
-    if field_name == "filesizeinbytes":
-        try:
-            if len(field_value) > 0:
-                int(field_value)
-        except ValueError:
-            raise InvalidFieldValueException(file_name, field_name, field_value, "value should be numeric value")
-
-    if field_name == "s3url":
-        if re.match(S3_URL_REGEX, field_value) is None:
-            raise InvalidFieldValueException(file_name,field_name, field_value,
-                                             "value should be valid s3 object url (eg. "
-                                             "https://bucket.s3.amazonaws.com/key)")
-
-    if field_name == "rolearn":
-        if re.match(ROLEARN_REGEX, field_value) is None and len(field_value) > 0:
-            raise InvalidFieldValueException(file_name, field_name, field_value,
-                                             "value should be valid (eg. "
-                                             "arn:aws:iam::123456789012:role/EdsCfsS3Access_role)")
+
+# -----------------------------------------------------------
+# Field value checks, return the error message of an invalid value
+# -----------------------------------------------------------
+def _check_filename(field_value):
+    if len(field_value) < 1:
+        return "should not be empty"
+
+
+def _check_filesizeinbytes(field_value):
+    try:
+        if len(field_value) > 0:
+            int(field_value)
+    except ValueError:
+        return "value should be numeric value"
+
+
+def _check_s3url(field_value):
+    if S3_URL_PATTERN.match(field_value) is None:
+        return "value should be valid s3 object url (eg. https://bucket.s3.amazonaws.com/key)"
+
+
+def _check_rolearn(field_value):
+    if len(field_value) > 0 and ROLEARN_PATTERN.match(field_value) is None:
+        return "value should be valid (eg. arn:aws:iam::123456789012:role/EdsCfsS3Access_role)"
+
+
+FIELD_CHECKS = {
+    "filename": _check_filename,
+    "filesizeinbytes": _check_filesizeinbytes,
+    "s3url": _check_s3url,
+    "rolearn": _check_rolearn
+}